@@ -115,6 +115,11 @@ is a tripleton. We do not have any 0-tons or doubletons:
 
 Always use the first representation (a counts vector) with this module.
 
+Matrices of counts can also be provided as ``scipy.sparse`` matrices (e.g.,
+CSR or CSC), which is often much more memory efficient for large studies
+where most OTUs are absent from most samples. The phylogenetic metrics work
+directly on the sparse representation.
+
 Specifying a diversity metric
 -----------------------------
 
@@ -161,12 +166,22 @@ Functions
    :toctree: generated/
 
     alpha_diversity
+    alpha_diversity_table
     beta_diversity
     partial_beta_diversity
     block_beta_diversity
+    rarefaction_curve
     get_alpha_diversity_metrics
     get_beta_diversity_metrics
 
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   PreparedTree
+
 Examples
 --------
 
@@ -401,12 +416,16 @@ Faith PD            0.939336  1.000000
 
 from skbio.util import TestRunner
 
-from ._driver import (alpha_diversity, beta_diversity, partial_beta_diversity,
-                      get_alpha_diversity_metrics, get_beta_diversity_metrics)
+from ._driver import (alpha_diversity, alpha_diversity_table, beta_diversity,
+                      partial_beta_diversity, get_alpha_diversity_metrics,
+                      get_beta_diversity_metrics)
 from ._block import block_beta_diversity
+from ._util import PreparedTree
+from ._rarefaction import rarefaction_curve
 
-__all__ = ["alpha_diversity", "beta_diversity", "get_alpha_diversity_metrics",
-           "get_beta_diversity_metrics", "partial_beta_diversity",
-           "block_beta_diversity"]
+__all__ = ["alpha_diversity", "alpha_diversity_table", "beta_diversity",
+           "get_alpha_diversity_metrics", "get_beta_diversity_metrics",
+           "partial_beta_diversity", "block_beta_diversity",
+           "rarefaction_curve", "PreparedTree"]
 
 test = TestRunner(__file__).test
@@ -6,12 +6,28 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import functools
+import itertools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+import scipy.sparse
 
 from skbio.util._decorator import experimental
+from skbio.util._parallel import (_resolve_n_jobs, _to_shared_array,
+                                  _from_shared_array)
 from skbio.diversity._driver import partial_beta_diversity
+from skbio.diversity.beta._unifrac import (
+    _unweighted_unifrac_condensed, _weighted_unifrac_condensed,
+    _generalized_unifrac_condensed, _variance_adjusted_unifrac_condensed,
+    _validate_alpha, _normalize_weighted_unifrac_by_default,
+    _generalized_unifrac_alpha_by_default, _unifrac_metrics)
 from skbio.stats.distance import DistanceMatrix
-from skbio.diversity._util import _validate_counts_matrix
+from skbio.diversity._util import (_validate_counts_matrix,
+                                   _validate_otu_ids_and_tree,
+                                   _get_phylogenetic_kwargs,
+                                   _prepare_tree, _counts_by_node_subset)
 
 
 def _generate_id_blocks(ids, k=64):
@@ -71,7 +87,7 @@ def _block_party(counts=None, row_ids=None, col_ids=None, **kwargs):
 
     Parameters
     ----------
-    counts : 2D array_like of ints or floats
+    counts : 2D array_like of ints or floats, or scipy.sparse.csr_matrix
         Matrix containing count/abundance data where each row contains counts
         of OTUs in a given sample.
     row_ids : 1D np.ndarray of int
@@ -87,8 +103,17 @@ def _block_party(counts=None, row_ids=None, col_ids=None, **kwargs):
     -------
     dict
         kwargs that describe the block to compute. A filtered ``counts`` matrix
-        is stored in kwargs. If applicable, a filtered ``tree`` and ``otu_ids``
-        are also stored.
+        is stored in kwargs. If applicable, filtered ``otu_ids`` and
+        ``otu_indices`` are also stored.
+
+    Notes
+    -----
+    UniFrac metrics resolved by scikit-bio operate on the array
+    representation of the tree (``tree_index``), and only visit the ancestors
+    of the OTUs observed in the block, so the tree isn't sheared for them, as
+    this requires copying and traversing the entire tree for every block. A
+    ``tree`` passed to any other metric (e.g., a callable) is sheared to the
+    OTUs of the block.
     """
     ids_to_keep = np.unique(np.hstack([row_ids, col_ids]))
 
@@ -97,15 +122,25 @@ def _block_party(counts=None, row_ids=None, col_ids=None, **kwargs):
 
     # remove from the block any empty observations
     # NOTE: this will perform an implicit copy
-    nonzero_cols = (counts_block != 0).any(axis=0)
-    counts_block = counts_block[:, nonzero_cols]
+    if scipy.sparse.issparse(counts_block):
+        # the counts of a block are small enough to be made dense once their
+        # empty columns are removed
+        nonzero_cols = np.asarray((counts_block != 0).sum(axis=0)).ravel() > 0
+        counts_block = counts_block[:, np.flatnonzero(nonzero_cols)].toarray()
+    else:
+        nonzero_cols = (counts_block != 0).any(axis=0)
+        counts_block = counts_block[:, nonzero_cols]
 
     kwargs['counts'] = counts_block
     kwargs['ids'] = ids_to_keep
 
-    if 'tree' in kwargs and 'otu_ids' in kwargs:
+    if 'otu_ids' in kwargs:
         kwargs['otu_ids'] = np.asarray(kwargs['otu_ids'])[nonzero_cols]
-        kwargs['tree'] = kwargs['tree'].shear(kwargs['otu_ids'])
+        if 'tree' in kwargs:
+            kwargs['tree'] = kwargs['tree'].shear(kwargs['otu_ids'])
+
+    if 'otu_indices' in kwargs:
+        kwargs['otu_indices'] = kwargs['otu_indices'][nonzero_cols]
 
     return kwargs
 
@@ -152,7 +187,8 @@ def _block_kwargs(**kwargs):
         The parameters for the block of the distance matrix to compute.
     """
     valid_block_keys = {'counts', 'ids', 'tree', 'otu_ids', 'metric',
-                        'id_pairs', 'validate'}
+                        'id_pairs', 'validate', 'normalized', 'alpha',
+                        'tree_index', 'otu_indices'}
     for row_ids, col_ids in _generate_id_blocks(kwargs['ids'], kwargs['k']):
         id_pairs = _pairs_to_compute(row_ids, col_ids)
         if id_pairs:
@@ -170,8 +206,9 @@ def _block_compute(**kwargs):
     Notes
     -----
     This method encapsulates the two expensive operations to perform for each
-    block, namely, the "shearing" of the phylogenetic tree to correspond to
-    only the OTUs of interest, and the actual beta diversity calculations.
+    block, namely, the subsetting of the counts (and phylogenetic tree) to
+    correspond to only the OTUs of interest, and the actual beta diversity
+    calculations.
 
     Returns
     -------
@@ -179,9 +216,92 @@ def _block_compute(**kwargs):
     """
     block_kw = _block_party(**kwargs)
 
+    if 'tree_index' in block_kw:
+        return _block_unifrac(row_ids=kwargs['row_ids'],
+                              col_ids=kwargs['col_ids'], **block_kw)
     return partial_beta_diversity(**block_kw)
 
 
+def _block_unifrac(metric, counts, ids, row_ids, col_ids, tree_index,
+                   otu_indices,
+                   normalized=_normalize_weighted_unifrac_by_default,
+                   alpha=_generalized_unifrac_alpha_by_default, **kwargs):
+    """Compute UniFrac for a block using the array representation of the tree
+
+    Parameters
+    ----------
+    metric : {'unweighted_unifrac', 'weighted_unifrac', \
+              'generalized_unifrac', 'variance_adjusted_unifrac'}
+        The UniFrac variant to compute.
+    counts : 2D np.array
+        The counts of the samples in the block, as filtered by
+        ``_block_party``.
+    ids : 1D np.array of int
+        The IDs of the samples in ``counts``.
+    row_ids : 1D np.array of int
+        The block row IDs.
+    col_ids : 1D np.array of int
+        The block column IDs. If they differ from ``row_ids``, only the
+        distances between the row and column samples are computed.
+    tree_index : dict
+        The tree vectorized by ``_vectorize_tree``.
+    otu_indices : 1D np.array of int
+        The node ID of each column in ``counts``.
+    normalized : bool, optional
+        Whether to normalize weighted UniFrac.
+    alpha : float, optional
+        The weight given to abundant lineages by generalized UniFrac.
+    kwargs : dict
+        Other block arguments, which are ignored.
+
+    Returns
+    -------
+    DistanceMatrix
+        Distances between the pairs of samples of the block. All other
+        distances are 0.0, as with ``partial_beta_diversity``.
+    """
+    # a block on the diagonal compares its samples with each other, while
+    # other blocks only compare their row samples with their column samples,
+    # which are placed first and last in the counts
+    n_rows = None
+    if len(row_ids) != len(col_ids) or (row_ids != col_ids).any():
+        rows = np.searchsorted(ids, row_ids)
+        cols = np.searchsorted(ids, col_ids)
+        counts = counts[np.concatenate([rows, cols])]
+        n_rows = len(rows)
+
+    counts_by_node, nodes = _counts_by_node_subset(counts, otu_indices,
+                                                   tree_index)
+    branch_lengths = tree_index['length'][nodes]
+
+    if metric == 'unweighted_unifrac':
+        distances = _unweighted_unifrac_condensed(counts_by_node,
+                                                  branch_lengths, n_rows)
+    elif metric == 'generalized_unifrac':
+        distances = _generalized_unifrac_condensed(
+            counts_by_node, counts.sum(axis=1), branch_lengths, alpha,
+            n_rows)
+    elif metric == 'variance_adjusted_unifrac':
+        distances = _variance_adjusted_unifrac_condensed(
+            counts_by_node, counts.sum(axis=1), branch_lengths, n_rows)
+    else:
+        node_to_root_distances = None
+        if normalized:
+            node_to_root_distances = (tree_index['node_to_root'][nodes] *
+                                      tree_index['is_tip'][nodes])
+        distances = _weighted_unifrac_condensed(
+            counts_by_node, counts.sum(axis=1), branch_lengths,
+            node_to_root_distances, n_rows)
+
+    if n_rows is None:
+        return DistanceMatrix(distances, ids)
+
+    dm = np.zeros((len(ids), len(ids)), dtype=float)
+    dm[np.ix_(rows, cols)] = distances
+    dm[np.ix_(cols, rows)] = distances.T
+    return DistanceMatrix(dm, ids)
+
+
 def _map(func, kw_gen):
     """Map a function over arguments
 
@@ -196,7 +316,92 @@ def _map(func, kw_gen):
         yield func(**kwargs)
 
 
-def _reduce(blocks):
+# The keys of the block kwargs which differ between blocks. All other keys are
+# shared by every block and only need to be sent to a worker once.
+_block_specific_keys = {'row_ids', 'col_ids', 'id_pairs'}
+
+# The shared block kwargs within a worker process, installed by
+# _block_worker_init.
+_worker_state = {}
+
+
+def _block_worker_init(func, shared_kwargs, shared_counts):
+    """Install the kwargs shared by all blocks in a worker process"""
+    shared_kwargs = dict(shared_kwargs)
+    if shared_counts is not None:
+        shared_kwargs['counts'] = _from_shared_array(shared_counts)
+    _worker_state['func'] = func
+    _worker_state['kwargs'] = shared_kwargs
+
+
+def _block_worker(block):
+    """Compute a single block in a worker process"""
+    row_ids, col_ids = block
+    kwargs = dict(_worker_state['kwargs'])
+    kwargs['row_ids'] = row_ids
+    kwargs['col_ids'] = col_ids
+    kwargs['id_pairs'] = _pairs_to_compute(row_ids, col_ids)
+    return _worker_state['func'](**kwargs)
+
+
+def _parallel_map(func, kw_gen, n_jobs, backend='processes'):
+    """Map a function over block arguments using a pool of workers
+
+    Parameters
+    ----------
+    func : function
+        The function to apply to each set of block kwargs.
+    kw_gen : Iterable of dict
+        The kwargs describing each block, as generated by ``_block_kwargs``.
+    n_jobs : int
+        The number of workers.
+    backend : {'processes', 'threads'}, optional
+        Whether to use a pool of processes or a pool of threads. Threads avoid
+        any data transfer but only help if the metric releases the GIL.
+
+    Notes
+    -----
+    With the process backend, the counts matrix is copied once into shared
+    memory (unless it is sparse), and the remaining kwargs common to all
+    blocks (e.g., the tree and the metric) are sent to each worker a single
+    time when the pool starts. Only the row and column IDs of a block are
+    sent per task. Results are yielded as they complete, in arbitrary order.
+    """
+    kw_gen = iter(kw_gen)
+    try:
+        first = next(kw_gen)
+    except StopIteration:
+        return
+
+    if backend == 'threads':
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            kw_gen = itertools.chain([first], kw_gen)
+            for result in executor.map(lambda kw: func(**kw), kw_gen):
+                yield result
+    elif backend == 'processes':
+        shared_kwargs = {k: v for k, v in first.items()
+                         if k not in _block_specific_keys}
+        # a sparse counts matrix is sent along with the other kwargs
+        shared_counts = None
+        if not scipy.sparse.issparse(shared_kwargs['counts']):
+            shared_counts = _to_shared_array(shared_kwargs.pop('counts'))
+        blocks = ((kw['row_ids'], kw['col_ids'])
+                  for kw in itertools.chain([first], kw_gen))
+
+        pool = multiprocessing.Pool(n_jobs, initializer=_block_worker_init,
+                                    initargs=(func, shared_kwargs,
+                                              shared_counts))
+        try:
+            for result in pool.imap_unordered(_block_worker, blocks):
+                yield result
+        finally:
+            pool.terminate()
+    else:
+        raise ValueError("Unknown backend: %r. Supported backends are "
+                         "'processes' and 'threads'." % backend)
+
+
+def _reduce(blocks, n_ids=None, out=None):
     """Reduce an iterable of partial distance matrices into a full matrix
 
     Note, the reduce doesn't actually care about what pairs are computed
@@ -204,38 +409,93 @@ def _reduce(blocks):
     added. as such, this reduction is only safe to perform if by
     the block_beta_diversity method which assures that distances are not
     computed multiple times.
+
+    Distances are accumulated into a preallocated condensed vector, so only a
+    single square matrix is constructed for the result. If ``n_ids`` is
+    provided, blocks are consumed as they are produced; otherwise all blocks
+    are collected first to determine the size of the result.
+
+    If ``out`` is provided, distances are accumulated into it instead (e.g.,
+    a memory-mapped file allocated by ``_allocate_condensed``), and the
+    resulting distance matrix is stored in condensed form backed by ``out``.
     """
-    all_blocks = list(blocks)
+    if n_ids is None:
+        blocks = list(blocks)
+        # Determine the maximum integer ID observed in the blocks. There
+        # exists a 1-1 mapping between the integer ID and a sample ID. We
+        # increment by 1 as the integer ID space begins with zero, and we'll
+        # be using this value to determine the size of the resulting full
+        # distance matrix.
+        n_ids = max(map(lambda x: max(x.ids), blocks)) + 1
+
+    if out is None:
+        condensed = np.zeros(n_ids * (n_ids - 1) // 2, dtype=float)
+    else:
+        condensed = out
 
-    # Determine the maximum integer ID observed in the blocks. There exists a
-    # 1-1 mapping between the integer ID and a sample ID. We increment by 1
-    # as the integer ID space begins with zero, and we'll be using this value
-    # to determine the size of the resulting full distance matrix.
-    n_ids = max(map(lambda x: max(x.ids), all_blocks)) + 1
+    for block in blocks:
+        block_ids = np.asarray(block.ids)
 
-    mat = np.zeros((n_ids, n_ids), dtype=float)
+        # get the coordinates of the upper triangle within the current block
+        # and the corresponding coordinates in the master matrix
+        b_i, b_j = np.triu_indices(len(block_ids), 1)
+        m_i = block_ids[b_i]
+        m_j = block_ids[b_j]
+        m_i, m_j = np.minimum(m_i, m_j), np.maximum(m_i, m_j)
 
-    # TODO: something smarter.
-    for block in all_blocks:
-        n_blk_ids = len(block.ids)
+        # the position of (m_i, m_j) in the condensed form. pairs are unique
+        # within a block, so there are no repeated indices to accumulate
+        positions = n_ids * m_i - m_i * (m_i + 1) // 2 + m_j - m_i - 1
+        condensed[positions] += block.data[b_i, b_j]
 
-        # get the corresponding coordinates in the master matrix
-        master_idx = [(i, j) for row, i in enumerate(block.ids)
-                      for j in block.ids[row+1:]]
+    if out is None:
+        return DistanceMatrix(condensed, list(range(n_ids)))
 
-        # get the corresponding coordinates within the current block
-        block_idx = [(i, j) for row, i in enumerate(range(n_blk_ids))
-                     for j in range(row+1, n_blk_ids)]
+    if isinstance(out, np.memmap):
+        out.flush()
+    return DistanceMatrix.from_condensed(out, list(range(n_ids)),
+                                         validate=False)
 
-        for (m_i, m_j), (b_i, b_j) in zip(master_idx, block_idx):
-            mat[m_i, m_j] += block.data[b_i, b_j]
 
-    return DistanceMatrix(mat + mat.T, list(range(n_ids)))
+def _allocate_condensed(n_ids, filename=None, dtype=np.double):
+    """Allocate zeroed condensed distances, optionally backed by a file
+
+    Parameters
+    ----------
+    n_ids : int
+        The number of samples.
+    filename : str, optional
+        The path of the file to memory-map. The file is created, or
+        overwritten if it exists. If ``None``, the distances are allocated in
+        memory.
+    dtype : np.dtype, optional
+        The floating point data type of the distances.
+
+    Returns
+    -------
+    np.ndarray or np.memmap
+        Vector of zeros with a position for each pair of samples.
+    """
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError("`dtype` must be a floating point type, not %r."
+                         % dtype.name)
+
+    size = n_ids * (n_ids - 1) // 2
+    if filename is None:
+        return np.zeros(size, dtype=dtype)
+    if size == 0:
+        # an empty file can't be memory-mapped
+        open(filename, 'wb').close()
+        return np.zeros(size, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='w+', shape=(size,))
 
 
 @experimental(as_of="0.5.1")
 def block_beta_diversity(metric, counts, ids, validate=True, k=64,
-                         reduce_f=None, map_f=None, **kwargs):
+                         reduce_f=None, map_f=None, n_jobs=1,
+                         backend='processes', filename=None, dtype=np.double,
+                         **kwargs):
     """Perform a block-decomposition beta diversity calculation
 
     Parameters
@@ -244,9 +504,10 @@ def block_beta_diversity(metric, counts, ids, validate=True, k=64,
         The pairwise distance function to apply. If ``metric`` is a string, it
         must be resolvable by scikit-bio (e.g., UniFrac methods), or must be
         callable.
-    counts : 2D array_like of ints or floats
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
         Matrix containing count/abundance data where each row contains counts
-        of OTUs in a given sample.
+        of OTUs in a given sample. The counts of each block are made dense,
+        but a sparse matrix is never made dense as a whole.
     ids : iterable of strs
         Identifiers for each sample in ``counts``.
     validate : bool, optional
@@ -267,6 +528,25 @@ def block_beta_diversity(metric, counts, ids, validate=True, k=64,
         able to pass around `**kwargs``.
     k : int, optional
         The blocksize used when computing distances
+    n_jobs : int, optional
+        The number of workers used to compute blocks concurrently. ``-1``
+        uses all CPUs. Defaults to ``1``, in which case blocks are computed
+        serially. Cannot be combined with ``map_f``.
+    backend : {'processes', 'threads'}, optional
+        The kind of pool used when ``n_jobs`` is not ``1``. A pool of
+        processes is used by default, with the counts matrix placed in shared
+        memory so it is not copied for every block. A pool of threads avoids
+        starting processes altogether, but only speeds up metrics which
+        release the GIL.
+    filename : str, optional
+        If provided, the distances are written to a memory-mapped file at
+        this path as blocks are computed, and the returned ``DistanceMatrix``
+        is backed by that file. The file is created, or overwritten if it
+        exists. Cannot be combined with ``reduce_f``.
+    dtype : np.dtype, optional
+        The floating point data type used to store the distances (e.g.,
+        ``np.float32`` to halve the memory or disk space they need). Cannot
+        be combined with ``reduce_f``.
     kwargs : kwargs, optional
         Metric-specific parameters.
 
@@ -276,6 +556,12 @@ def block_beta_diversity(metric, counts, ids, validate=True, k=64,
         A distance matrix relating all samples represented by counts to each
         other.
 
+    Raises
+    ------
+    ValueError
+        If ``reduce_f`` is provided along with ``filename`` or ``dtype``, or
+        if ``dtype`` is not a floating point type.
+
     Note
     ----
     This method is designed to facilitate computing beta diversity in parallel.
@@ -285,6 +571,14 @@ def block_beta_diversity(metric, counts, ids, validate=True, k=64,
     the Earth Microbiome Project [1]_ dataset which at the time spanned over
     25,000 samples and 7.5 million open reference OTUs.
 
+    With ``filename`` or ``dtype``, the distances are stored in condensed
+    form, i.e. only the upper triangle of the distance matrix is stored, as
+    described for ``scipy.spatial.distance.squareform``. The file contains
+    these distances as raw values of type ``dtype`` without a header, so it
+    can later be opened with ``np.memmap``. Blocks are accumulated into it as
+    they are computed, so the square distance matrix is never constructed
+    in memory unless ``DistanceMatrix.data`` is accessed.
+
     See Also
     --------
     skbio.diversity.beta_diversity
@@ -296,16 +590,48 @@ def block_beta_diversity(metric, counts, ids, validate=True, k=64,
     """
     if validate:
         counts = _validate_counts_matrix(counts, ids=ids)
-
-    if reduce_f is None:
-        reduce_f = _reduce
+    elif scipy.sparse.issparse(counts):
+        # the rows of the blocks are selected from a CSR matrix
+        counts = scipy.sparse.csr_matrix(counts)
+
+    n_jobs = _resolve_n_jobs(n_jobs)
+    if map_f is not None and n_jobs != 1:
+        raise ValueError("`n_jobs` cannot be used with a custom `map_f`.")
+    if backend not in ('processes', 'threads'):
+        raise ValueError("Unknown backend: %r. Supported backends are "
+                         "'processes' and 'threads'." % backend)
+
+    if filename is not None or np.dtype(dtype) != np.double:
+        if reduce_f is not None:
+            raise ValueError("`reduce_f` cannot be used with `filename` or "
+                             "`dtype`.")
+        out = _allocate_condensed(counts.shape[0], filename, dtype)
+        reduce_f = functools.partial(_reduce, n_ids=counts.shape[0], out=out)
+    elif reduce_f is None:
+        reduce_f = functools.partial(_reduce, n_ids=counts.shape[0])
 
     if map_f is None:
-        map_f = _map
+        if n_jobs == 1:
+            map_f = _map
+        else:
+            map_f = functools.partial(_parallel_map, n_jobs=n_jobs,
+                                      backend=backend)
+
+    if metric in _unifrac_metrics:
+        if metric == 'generalized_unifrac' and 'alpha' in kwargs:
+            _validate_alpha(kwargs['alpha'])
+        # index the tree a single time, rather than once per block
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        if validate:
+            _validate_otu_ids_and_tree(counts[0], otu_ids, tree)
+        prepared = _prepare_tree(otu_ids, tree)
+        kwargs['tree_index'] = prepared.tree_arrays
+        kwargs['otu_ids'] = prepared.otu_ids
+        kwargs['otu_indices'] = prepared.otu_node_indices
 
     # The block method uses numeric IDs to take advantage of fancy indexing
     # with numpy.
-    tmp_ids = np.arange(len(counts))
+    tmp_ids = np.arange(counts.shape[0])
     kwargs['ids'] = tmp_ids
 
     kwargs['metric'] = metric
@@ -6,18 +6,27 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import collections
 import functools
 import itertools
 
 import numpy as np
+import scipy.sparse
 import scipy.spatial.distance
 import pandas as pd
 
 import skbio
-from skbio.diversity.alpha._faith_pd import _faith_pd, _setup_faith_pd
+from skbio.diversity.alpha._faith_pd import _multiple_faith_pd
+from skbio.diversity.alpha._vectorized import (
+    _CountsSummary, _get_vectorized_alpha_diversity_metric_map)
 from skbio.diversity.beta._unifrac import (
     _setup_multiple_unweighted_unifrac, _setup_multiple_weighted_unifrac,
-    _normalize_weighted_unifrac_by_default)
+    _setup_multiple_generalized_unifrac,
+    _setup_multiple_variance_adjusted_unifrac,
+    _multiple_unweighted_unifrac, _multiple_weighted_unifrac,
+    _multiple_generalized_unifrac, _multiple_variance_adjusted_unifrac,
+    _normalize_weighted_unifrac_by_default,
+    _generalized_unifrac_alpha_by_default, _unifrac_metrics)
 from skbio.util._decorator import experimental, deprecated
 from skbio.stats.distance import DistanceMatrix
 from skbio.diversity._util import (_validate_counts_matrix,
@@ -108,7 +117,8 @@ def get_beta_diversity_metrics():
     ``scipy.spatial.distance.pdist`` for more details.
 
     """
-    return sorted(['unweighted_unifrac', 'weighted_unifrac'])
+    return sorted(['unweighted_unifrac', 'weighted_unifrac',
+                   'generalized_unifrac', 'variance_adjusted_unifrac'])
 
 
 @experimental(as_of="0.4.1")
@@ -120,10 +130,14 @@ def alpha_diversity(metric, counts, ids=None, validate=True, **kwargs):
     metric : str, callable
         The alpha diversity metric to apply to the sample(s). Passing metric as
         a string is preferable as this often results in an optimized version of
-        the metric being used.
-    counts : 1D or 2D array_like of ints or floats
+        the metric being used. Many metrics (e.g., ``'shannon'``,
+        ``'observed_otus'`` or ``'chao1'``) are then computed for all samples
+        at once.
+    counts : 1D or 2D array_like of ints or floats, or scipy.sparse.spmatrix
         Vector or matrix containing count/abundance data. If a matrix, each row
-        should contain counts of OTUs in a given sample.
+        should contain counts of OTUs in a given sample. Sparse matrices are
+        never densified as a whole; each sample is expanded only while its
+        value is computed.
     ids : iterable of strs, optional
         Identifiers for each sample in ``counts``. By default, samples will be
         assigned integer identifiers in the order that they were provided.
@@ -159,17 +173,134 @@ def alpha_diversity(metric, counts, ids=None, validate=True, **kwargs):
     skbio.diversity.beta_diversity
 
     """
-    metric_map = _get_alpha_diversity_metric_map()
+    if validate:
+        counts = _validate_counts_matrix(counts, ids=ids)
+
+    results = _alpha_diversity(metric, counts, _CountsSummary(counts),
+                               validate, **kwargs)
+    return pd.Series(results, index=ids)
+
+
+@experimental(as_of="0.5.1")
+def alpha_diversity_table(metrics, counts, ids=None, validate=True,
+                          otu_ids=None, tree=None, metric_kwargs=None):
+    """ Compute several alpha diversity metrics for one or more samples
+
+    Parameters
+    ----------
+    metrics : iterable of strs
+        The alpha diversity metrics to apply to the sample(s). See
+        ``skbio.diversity.get_alpha_diversity_metrics`` for the available
+        metrics.
+    counts : 1D or 2D array_like of ints or floats, or scipy.sparse.spmatrix
+        Vector or matrix containing count/abundance data. If a matrix, each row
+        should contain counts of OTUs in a given sample.
+    ids : iterable of strs, optional
+        Identifiers for each sample in ``counts``. By default, samples will be
+        assigned integer identifiers in the order that they were provided.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed. See
+        ``skbio.diversity.alpha_diversity`` for details.
+    otu_ids : list, np.array, optional
+        Vector of OTU ids corresponding to tip names in ``tree``. Required if
+        a phylogenetic diversity metric is requested, unless ``tree`` is a
+        ``PreparedTree``.
+    tree : skbio.TreeNode or skbio.diversity.PreparedTree, optional
+        Tree relating the OTUs in ``otu_ids``. Required if a phylogenetic
+        diversity metric is requested.
+    metric_kwargs : dict, optional
+        Metric-specific parameters, as a dict mapping metric names to dicts of
+        parameters (e.g., ``{'shannon': {'base': 10}}``).
+
+    Returns
+    -------
+    pd.DataFrame
+        Values of each of ``metrics`` (columns, in the order provided) for all
+        vectors provided in ``counts`` (rows). The index will be ``ids``, if
+        provided.
+
+    Raises
+    ------
+    ValueError, MissingNodeError, DuplicateNodeError
+        If validation fails, if a metric is unknown or provided more than
+        once, or if ``metric_kwargs`` refers to a metric that is not in
+        ``metrics``.
+    TypeError
+        If invalid method-specific parameters are provided.
+
+    See Also
+    --------
+    skbio.diversity.alpha_diversity
+    skbio.diversity.get_alpha_diversity_metrics
+
+    Notes
+    -----
+    This is equivalent to calling ``alpha_diversity`` for each metric and
+    concatenating the results, but the counts are validated a single time
+    and per-sample intermediate results that several metrics depend on
+    (e.g., total counts, the number of observed OTUs, singletons, doubletons,
+    or Shannon entropy) are only computed once.
+
+    Examples
+    --------
+    >>> from skbio.diversity import alpha_diversity_table
+    >>> counts = [[1, 3, 0, 1, 0], [0, 2, 0, 4, 4], [0, 0, 6, 2, 1]]
+    >>> alpha_diversity_table(['observed_otus', 'singles', 'chao1'], counts,
+    ...                       ids=['A', 'B', 'C'])
+       observed_otus  singles  chao1
+    A              3        2    4.0
+    B              3        0    3.0
+    C              3        1    3.0
+
+    """
+    metrics = list(metrics)
+    if len(set(metrics)) != len(metrics):
+        raise ValueError("Each metric can only be provided once.")
+    metric_kwargs = {} if metric_kwargs is None else metric_kwargs
+    unknown = set(metric_kwargs) - set(metrics)
+    if unknown:
+        raise ValueError("``metric_kwargs`` contains parameters for metrics "
+                         "that were not requested: %s."
+                         % ', '.join(map(repr, sorted(unknown))))
 
     if validate:
         counts = _validate_counts_matrix(counts, ids=ids)
 
+    summary = _CountsSummary(counts)
+    results = collections.OrderedDict()
+    for metric in metrics:
+        kwargs = dict(metric_kwargs.get(metric, {}))
+        if metric == 'faith_pd':
+            if otu_ids is not None:
+                kwargs['otu_ids'] = otu_ids
+            if tree is not None:
+                kwargs['tree'] = tree
+        results[metric] = _alpha_diversity(metric, counts, summary, validate,
+                                           **kwargs)
+
+    return pd.DataFrame(results, index=ids, columns=metrics)
+
+
+def _alpha_diversity(metric, counts, summary, validate, **kwargs):
+    """Compute an alpha diversity metric for all samples in ``counts``
+
+    ``summary`` is the ``_CountsSummary`` of ``counts``, which can be shared
+    by several calls so that intermediate results are only computed once.
+
+    """
+    metric_map = _get_alpha_diversity_metric_map()
+    vectorized_metric_map = _get_vectorized_alpha_diversity_metric_map()
+
+    if isinstance(metric, str) and metric in vectorized_metric_map:
+        # undefined values (e.g., for samples without any counts) are
+        # returned as nan or inf, like the per-sample implementations do
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return vectorized_metric_map[metric](summary, **kwargs)
+
     if metric == 'faith_pd':
         otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
-        counts_by_node, branch_lengths = _setup_faith_pd(
-            counts, otu_ids, tree, validate, single_sample=False)
-        counts = counts_by_node
-        metric = functools.partial(_faith_pd, branch_lengths=branch_lengths)
+        return _multiple_faith_pd(counts, otu_ids=otu_ids, tree=tree,
+                                  validate=validate, **kwargs)
     elif callable(metric):
         metric = functools.partial(metric, **kwargs)
     elif metric in metric_map:
@@ -178,8 +309,18 @@ def alpha_diversity(metric, counts, ids=None, validate=True, **kwargs):
         raise ValueError('Unknown metric provided: %r.' % metric)
 
     # kwargs is provided here so an error is raised on extra kwargs
-    results = [metric(c, **kwargs) for c in counts]
-    return pd.Series(results, index=ids)
+    return [metric(c, **kwargs) for c in _iter_rows(counts)]
+
+
+def _iter_rows(counts):
+    """Iterate over the rows of a dense or sparse matrix as dense vectors"""
+    if scipy.sparse.issparse(counts):
+        counts = scipy.sparse.csr_matrix(counts)
+        for i in range(counts.shape[0]):
+            yield counts[i].toarray()[0]
+    else:
+        for c in counts:
+            yield c
 
 
 @deprecated(as_of='0.5.0', until='0.5.2',
@@ -235,6 +376,8 @@ def partial_beta_diversity(metric, counts, ids, id_pairs, validate=True,
     """
     if validate:
         counts = _validate_counts_matrix(counts, ids=ids)
+    if scipy.sparse.issparse(counts):
+        counts = counts.toarray()
 
     id_pairs = list(id_pairs)
     all_ids_in_pairs = set(itertools.chain.from_iterable(id_pairs))
@@ -260,6 +403,18 @@ def partial_beta_diversity(metric, counts, ids, id_pairs, validate=True,
                 counts, otu_ids=otu_ids, tree=tree, normalized=normalized,
                 validate=validate)
         counts = counts_by_node
+    elif metric == 'generalized_unifrac':
+        alpha = kwargs.pop('alpha', _generalized_unifrac_alpha_by_default)
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        metric, counts_by_node = _setup_multiple_generalized_unifrac(
+                counts, otu_ids=otu_ids, tree=tree, alpha=alpha,
+                validate=validate)
+        counts = counts_by_node
+    elif metric == 'variance_adjusted_unifrac':
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        metric, counts_by_node = _setup_multiple_variance_adjusted_unifrac(
+                counts, otu_ids=otu_ids, tree=tree, validate=validate)
+        counts = counts_by_node
     elif callable(metric):
         metric = functools.partial(metric, **kwargs)
         # remove all values from kwargs, since they have already been provided
@@ -291,9 +446,11 @@ def beta_diversity(metric, counts, ids=None, validate=True, pairwise_func=None,
         and the scikit-bio functions linked under *See Also* for available
         metrics. Passing metrics as a strings is preferable as this often
         results in an optimized version of the metric being used.
-    counts : 2D array_like of ints or floats
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
         Matrix containing count/abundance data where each row contains counts
-        of OTUs in a given sample.
+        of OTUs in a given sample. Sparse matrices are used as-is by the
+        UniFrac metrics, and are converted to dense arrays for all other
+        metrics and when ``pairwise_func`` is provided.
     ids : iterable of strs, optional
         Identifiers for each sample in ``counts``. By default, samples will be
         assigned integer identifiers in the order that they were provided
@@ -342,6 +499,16 @@ def beta_diversity(metric, counts, ids=None, validate=True, pairwise_func=None,
     if validate:
         counts = _validate_counts_matrix(counts, ids=ids)
 
+    if metric in _unifrac_metrics and pairwise_func is None:
+        # the optimized UniFrac implementations compute all pairwise
+        # distances at once, so they bypass the per-pair pdist machinery
+        distances = _beta_diversity_unifrac(metric, counts, validate,
+                                            **kwargs)
+        return DistanceMatrix(distances, ids)
+
+    if scipy.sparse.issparse(counts):
+        counts = counts.toarray()
+
     if metric == 'unweighted_unifrac':
         otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
         metric, counts_by_node = _setup_multiple_unweighted_unifrac(
@@ -357,6 +524,18 @@ def beta_diversity(metric, counts, ids=None, validate=True, pairwise_func=None,
                 counts, otu_ids=otu_ids, tree=tree, normalized=normalized,
                 validate=validate)
         counts = counts_by_node
+    elif metric == 'generalized_unifrac':
+        alpha = kwargs.pop('alpha', _generalized_unifrac_alpha_by_default)
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        metric, counts_by_node = _setup_multiple_generalized_unifrac(
+                counts, otu_ids=otu_ids, tree=tree, alpha=alpha,
+                validate=validate)
+        counts = counts_by_node
+    elif metric == 'variance_adjusted_unifrac':
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        metric, counts_by_node = _setup_multiple_variance_adjusted_unifrac(
+                counts, otu_ids=otu_ids, tree=tree, validate=validate)
+        counts = counts_by_node
     elif callable(metric):
         metric = functools.partial(metric, **kwargs)
         # remove all values from kwargs, since they have already been provided
@@ -372,3 +551,31 @@ def beta_diversity(metric, counts, ids=None, validate=True, pairwise_func=None,
 
     distances = pairwise_func(counts, metric=metric, **kwargs)
     return DistanceMatrix(distances, ids)
+
+
+def _beta_diversity_unifrac(metric, counts, validate, **kwargs):
+    """Compute condensed UniFrac distances between all pairs of samples"""
+    if metric == 'unweighted_unifrac':
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        return _multiple_unweighted_unifrac(counts, otu_ids=otu_ids,
+                                            tree=tree, validate=validate,
+                                            **kwargs)
+    elif metric == 'weighted_unifrac':
+        normalized = kwargs.pop('normalized',
+                                _normalize_weighted_unifrac_by_default)
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        return _multiple_weighted_unifrac(counts, otu_ids=otu_ids, tree=tree,
+                                          normalized=normalized,
+                                          validate=validate, **kwargs)
+    elif metric == 'generalized_unifrac':
+        alpha = kwargs.pop('alpha', _generalized_unifrac_alpha_by_default)
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        return _multiple_generalized_unifrac(counts, otu_ids=otu_ids,
+                                             tree=tree, alpha=alpha,
+                                             validate=validate, **kwargs)
+    else:
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        return _multiple_variance_adjusted_unifrac(counts, otu_ids=otu_ids,
+                                                   tree=tree,
+                                                   validate=validate,
+                                                   **kwargs)
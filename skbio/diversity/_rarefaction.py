@@ -0,0 +1,236 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from scipy.special import gammaln
+
+from skbio.util._decorator import experimental
+from skbio.stats._subsample import _sample_seeds, _subsample_rows
+from skbio.diversity._driver import (_alpha_diversity, _CountsSummary,
+                                     _iter_rows)
+from skbio.diversity._util import (_validate_counts_matrix,
+                                   _get_phylogenetic_kwargs, PreparedTree)
+
+
+@experimental(as_of="0.5.1")
+def rarefaction_curve(metric, counts, depths, ids=None, iterations=10,
+                      expected=False, seed=None, validate=True, **kwargs):
+    r""" Compute an alpha diversity metric at several subsampling depths
+
+    Parameters
+    ----------
+    metric : str, callable
+        The alpha diversity metric to apply to the subsampled sample(s). See
+        ``skbio.diversity.alpha_diversity``.
+    counts : 1D or 2D array_like of ints, or scipy.sparse.spmatrix
+        Vector or matrix containing count data. If a matrix, each row should
+        contain counts of OTUs in a given sample.
+    depths : iterable of ints
+        The subsampling depths at which ``metric`` is computed. Depths that
+        are greater than the total count of a sample are skipped for that
+        sample.
+    ids : iterable of strs, optional
+        Identifiers for each sample in ``counts``. By default, samples will be
+        assigned integer identifiers in the order that they were provided.
+    iterations : int, optional
+        Number of times each sample is subsampled.
+    expected : bool, optional
+        If ``True``, compute the expected number of observed OTUs at each
+        depth analytically instead of subsampling. Only supported when
+        ``metric`` is ``'observed_otus'``.
+    seed : int or 1-D array_like of int, optional
+        Seed for the random number generators. See ``skbio.stats.rarefy``.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed. See
+        ``skbio.diversity.alpha_diversity`` for details.
+    kwargs : kwargs, optional
+        Metric-specific parameters.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per sample, depth and iteration, with the columns
+        ``'sample_id'``, ``'depth'``, ``'iteration'`` and the value of the
+        metric, named after the metric. If ``expected`` is ``True``, there is
+        one row per sample and depth, and no ``'iteration'`` column.
+
+    Raises
+    ------
+    ValueError, MissingNodeError, DuplicateNodeError
+        If validation fails, if ``depths`` is empty or contains values less
+        than one, if ``iterations`` is less than one, or if ``expected`` is
+        ``True`` and ``metric`` is not ``'observed_otus'``.
+    TypeError
+        If invalid method-specific parameters are provided.
+
+    See Also
+    --------
+    skbio.diversity.alpha_diversity
+    skbio.stats.rarefy
+
+    Notes
+    -----
+    Within an iteration, the subsamples of a sample are nested: the reads
+    drawn at a depth are a subset of the reads drawn at every greater depth,
+    as if the reads of the sample were randomly permuted once and each depth
+    took a prefix of that permutation. Each subsample is therefore drawn
+    from the subsample at the next greater depth rather than from the whole
+    sample, and reads are never expanded individually. The subsamples of all
+    depths and iterations of a sample are then given to the metric at once,
+    so that metrics computed for all samples at once by ``alpha_diversity``
+    (e.g., ``'observed_otus'``, ``'shannon'`` or ``'faith_pd'``) are
+    evaluated with a single call per sample.
+
+    With ``expected=True``, the expected number of OTUs observed in a
+    subsample of :math:`n` reads is computed as in [1]_:
+
+    .. math::
+
+       E[S_n] = \sum_i 1 - \frac{\binom{N - N_i}{n}}{\binom{N}{n}}
+
+    where :math:`N` is the total count of the sample and :math:`N_i` is the
+    count of OTU :math:`i`.
+
+    References
+    ----------
+    .. [1] Hurlbert, S. H. The nonconcept of species diversity: a critique
+       and alternative parameters. Ecology 52, 577-586 (1971).
+
+    Examples
+    --------
+    >>> from skbio.diversity import rarefaction_curve
+    >>> counts = [[4, 5, 0, 2, 1], [0, 3, 3, 0, 9]]
+    >>> curve = rarefaction_curve('observed_otus', counts, [1, 5, 10],
+    ...                           ids=['A', 'B'], iterations=3, seed=42)
+    >>> curve.shape
+    (18, 4)
+    >>> list(curve.columns)
+    ['sample_id', 'depth', 'iteration', 'observed_otus']
+
+    The expected number of observed OTUs can be computed without subsampling:
+
+    >>> rarefaction_curve('observed_otus', counts, [1, 5, 10], ids=['A', 'B'],
+    ...                   expected=True).round(2)
+      sample_id  depth  observed_otus
+    0         A      1           1.00
+    1         A      5           3.00
+    2         A     10           3.82
+    3         B      1           1.00
+    4         B      5           2.47
+    5         B     10           2.96
+
+    """
+    depths = np.unique(np.asarray(depths, dtype=int))
+    if depths.size == 0:
+        raise ValueError("At least one depth must be provided.")
+    if depths[0] < 1:
+        raise ValueError("Depths must be greater than zero.")
+    if iterations < 1:
+        raise ValueError("iterations must be at least 1.")
+    if expected and metric != 'observed_otus':
+        raise ValueError("Expected values can only be computed for "
+                         "'observed_otus', not %r." % metric)
+
+    if validate:
+        counts = _validate_counts_matrix(counts, ids=ids)
+    n_samples = counts.shape[0]
+    if ids is None:
+        ids = range(n_samples)
+    name = metric if isinstance(metric, str) else metric.__name__
+
+    if expected:
+        if kwargs:
+            raise TypeError("Unexpected parameters: %s."
+                            % ', '.join(sorted(kwargs)))
+        return _expected_curve(counts, depths, ids, name)
+
+    if metric == 'faith_pd':
+        # prepare the tree once rather than for every sample
+        otu_ids, tree, kwargs = _get_phylogenetic_kwargs(counts, **kwargs)
+        if not isinstance(tree, PreparedTree):
+            tree = PreparedTree(tree, otu_ids, validate=validate)
+        kwargs['otu_ids'] = otu_ids
+        kwargs['tree'] = tree
+
+    seeds = _sample_seeds(seed, n_samples)
+    frames = []
+    for sample_id, sample, sample_seed in zip(ids, _iter_rows(counts),
+                                              seeds):
+        sample = np.asarray(sample).astype(int)
+        sample_depths = depths[depths <= sample.sum()]
+        if sample_depths.size == 0:
+            continue
+
+        subsamples = _nested_subsamples(sample, sample_depths, iterations,
+                                        np.random.RandomState(sample_seed))
+        subsamples = subsamples.reshape(-1, len(sample))
+        values = _alpha_diversity(metric, subsamples,
+                                  _CountsSummary(subsamples), False, **kwargs)
+        frames.append(pd.DataFrame({
+            'sample_id': sample_id,
+            'depth': np.repeat(sample_depths, iterations),
+            'iteration': np.tile(np.arange(iterations), sample_depths.size),
+            name: values}, columns=['sample_id', 'depth', 'iteration', name]))
+
+    return _concat_frames(frames, ['sample_id', 'depth', 'iteration', name])
+
+
+def _nested_subsamples(counts, depths, iterations, random_state):
+    """Draw nested subsamples of a vector of counts at increasing depths
+
+    Returns an array of shape ``(len(depths), iterations, len(counts))``.
+
+    """
+    result = np.empty((depths.size, iterations, len(counts)), dtype=int)
+    current = np.tile(counts, (iterations, 1))
+    for i in range(depths.size - 1, -1, -1):
+        current = _subsample_rows(current, depths[i], random_state)
+        result[i] = current
+    return result
+
+
+def _expected_curve(counts, depths, ids, name):
+    """Tabulate the expected number of observed OTUs of each sample"""
+    frames = []
+    for sample_id, sample in zip(ids, _iter_rows(counts)):
+        sample = np.asarray(sample)
+        sample_depths = depths[depths <= sample.sum()]
+        if sample_depths.size == 0:
+            continue
+
+        frames.append(pd.DataFrame({
+            'sample_id': sample_id,
+            'depth': sample_depths,
+            name: _expected_observed_otus(sample, sample_depths)},
+            columns=['sample_id', 'depth', name]))
+
+    return _concat_frames(frames, ['sample_id', 'depth', name])
+
+
+def _expected_observed_otus(counts, depths):
+    """Expected number of OTUs observed in subsamples of `depths` reads"""
+    counts = counts[counts > 0]
+    total = counts.sum()
+    others = (total - counts)[np.newaxis, :]
+    depths = depths[:, np.newaxis]
+
+    # the probability that an OTU is absent from a subsample is the ratio of
+    # binomial coefficients C(total - count, depth) / C(total, depth), which
+    # is zero when fewer than `depth` reads belong to the other OTUs
+    with np.errstate(invalid='ignore'):
+        log_absent = (gammaln(others + 1) - gammaln(others - depths + 1) -
+                      gammaln(total + 1) + gammaln(total - depths + 1))
+    absent = np.where(others >= depths, np.exp(log_absent), 0.0)
+    return (1 - absent).sum(axis=1)
+
+
+def _concat_frames(frames, columns):
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
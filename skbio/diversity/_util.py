@@ -9,9 +9,11 @@
 import collections
 
 import numpy as np
+import scipy.sparse
 
 from skbio.tree import DuplicateNodeError, MissingNodeError
-from skbio.diversity._phylogenetic import _nodes_by_counts
+from skbio.util._decorator import experimental
+from skbio.diversity._phylogenetic import _nodes_by_counts, _tip_distances
 
 
 def _validate_counts_vector(counts, suppress_cast=False):
@@ -19,7 +21,12 @@ def _validate_counts_vector(counts, suppress_cast=False):
 
     Note: may not always return a copy of `counts`!
 
+    A sparse matrix with a single row is accepted and converted into a dense
+    vector.
+
     """
+    if scipy.sparse.issparse(counts) and counts.shape[0] == 1:
+        counts = counts.toarray()[0]
     counts = np.asarray(counts)
 
     if not suppress_cast:
@@ -34,6 +41,10 @@ def _validate_counts_vector(counts, suppress_cast=False):
 
 
 def _validate_counts_matrix(counts, ids=None, suppress_cast=False):
+    if scipy.sparse.issparse(counts):
+        return _validate_sparse_counts_matrix(counts, ids=ids,
+                                              suppress_cast=suppress_cast)
+
     results = []
 
     # handle case of where counts is a single vector by making it a matrix.
@@ -62,16 +73,63 @@ def _validate_counts_matrix(counts, ids=None, suppress_cast=False):
     return np.asarray(results)
 
 
+def _validate_sparse_counts_matrix(counts, ids=None, suppress_cast=False):
+    """Validate a sparse counts matrix and convert it to CSR format
+
+    The same conditions are verified as for dense input, but only the stored
+    (nonzero) entries of the matrix are inspected and no dense copy of the
+    matrix is ever made.
+
+    """
+    counts = scipy.sparse.csr_matrix(counts)
+
+    if ids is not None and counts.shape[0] != len(ids):
+        raise ValueError(
+            "Number of rows in ``counts`` must be equal to number of provided "
+            "``ids``.")
+
+    if not suppress_cast:
+        if not np.can_cast(counts.dtype, int, casting='safe'):
+            raise TypeError("Cannot cast array from %r to %r according to "
+                            "the rule 'safe'" % (counts.dtype, np.dtype(int)))
+        counts = counts.astype(int)
+
+    if (counts.data < 0).any():
+        raise ValueError("Counts vector cannot contain negative values.")
+
+    return counts
+
+
 def _validate_otu_ids_and_tree(counts, otu_ids, tree):
-    len_otu_ids = len(otu_ids)
-    set_otu_ids = set(otu_ids)
-    if len_otu_ids != len(set_otu_ids):
+    if isinstance(tree, PreparedTree):
+        # the OTU ids and tree were validated when the tree was prepared
+        otu_ids = tree._check_otu_ids(otu_ids)
+        _validate_counts_length(counts, otu_ids)
+        return
+
+    _validate_unique_otu_ids(otu_ids)
+    _validate_counts_length(counts, otu_ids)
+    _validate_tree(otu_ids, tree)
+
+
+def _validate_unique_otu_ids(otu_ids):
+    if len(otu_ids) != len(set(otu_ids)):
         raise ValueError("``otu_ids`` cannot contain duplicated ids.")
 
-    if len(counts) != len_otu_ids:
+
+def _validate_counts_length(counts, otu_ids):
+    if scipy.sparse.issparse(counts):
+        len_counts = counts.shape[1]
+    else:
+        len_counts = len(counts)
+    if len_counts != len(otu_ids):
         raise ValueError("``otu_ids`` must be the same length as ``counts`` "
                          "vector(s).")
 
+
+def _validate_tree(otu_ids, tree):
+    set_otu_ids = set(otu_ids)
+
     if len(tree.root().children) == 0:
         raise ValueError("``tree`` must contain more than just a root node.")
 
@@ -108,28 +166,405 @@ def _validate_otu_ids_and_tree(counts, otu_ids, tree):
 
 def _vectorize_counts_and_tree(counts, otu_ids, tree):
     """ Index tree and convert counts to np.array in corresponding order
+
+    If ``counts`` is a sparse matrix, the counts of the nodes are returned as
+    a sparse CSR matrix.
     """
-    tree_index = tree.to_array(nan_length_value=0.0)
-    otu_ids = np.asarray(otu_ids)
-    counts = np.atleast_2d(counts)
-    counts_by_node = _nodes_by_counts(counts, otu_ids, tree_index)
+    prepared = _prepare_tree(otu_ids, tree)
+    tree_index = prepared.tree_index
     branch_lengths = tree_index['length']
 
+    if scipy.sparse.issparse(counts):
+        counts = scipy.sparse.csr_matrix(counts, dtype=np.int64)
+        return counts.dot(prepared.ancestry), tree_index, branch_lengths
+
+    counts = np.atleast_2d(counts)
+    counts_by_node = _nodes_by_counts(counts, prepared.otu_ids, tree_index)
+
     # branch_lengths is just a reference to the array inside of tree_index,
     # but it's used so much that it's convenient to just pull it out here.
     return counts_by_node.T, tree_index, branch_lengths
 
 
+def _parent_index(child_index, n_nodes):
+    """ Determine the parent of each node from a child index
+
+    Parameters
+    ----------
+    child_index : np.array of int
+        As described in ``TreeNode.index_tree``.
+    n_nodes : int
+        The number of nodes in the tree.
+
+    Returns
+    -------
+    np.array of int
+        The ID of the parent of each node, or ``-1`` for the root.
+
+    """
+    parent = np.full(n_nodes, -1, dtype=np.int64)
+    for node, start, end in child_index.reshape(-1, 3):
+        parent[start:end + 1] = node
+    return parent
+
+
+def _otu_ancestry(otu_ids, tree_index):
+    """ Relate OTUs to the nodes of a tree that they are counted in
+
+    Parameters
+    ----------
+    otu_ids : np.array
+        The tip names corresponding to the columns of a counts matrix.
+    tree_index : dict
+        The result of ``TreeNode.to_array``.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        An OTU-by-node matrix which is one where a node (column, in node ID
+        order) is the OTU's tip or one of its ancestors, and zero elsewhere.
+
+    Notes
+    -----
+    The product of a sparse counts matrix with this matrix gives the counts
+    of every node in each sample, including the counts of all descendants of
+    the node. This expresses the postorder reduction of the dense
+    implementation as a sparse product, so the number of stored elements in
+    the result is bounded by the number of stored counts times the depth of
+    the tree, instead of the number of samples times the number of nodes.
+
+    """
+    names = tree_index['name']
+    n_nodes = len(names)
+    parent = _parent_index(tree_index['child_index'], n_nodes)
+
+    is_tip = np.ones(n_nodes, dtype=bool)
+    is_tip[parent[parent >= 0]] = False
+    tip_lookup = {names[i]: i for i in np.flatnonzero(is_tip)}
+
+    # walk from every OTU to the root, one level of the tree at a time,
+    # recording each (OTU, ancestor) pair
+    nodes = np.array([tip_lookup[otu_id] for otu_id in otu_ids],
+                     dtype=np.int64)
+    otus = np.arange(len(otu_ids))
+    rows = []
+    cols = []
+    while len(nodes):
+        rows.append(otus)
+        cols.append(nodes)
+        nodes = parent[nodes]
+        is_child = nodes >= 0
+        nodes = nodes[is_child]
+        otus = otus[is_child]
+
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.array([], dtype=np.int64)
+    return scipy.sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+        shape=(len(otu_ids), n_nodes))
+
+
+def _vectorize_tree(tree):
+    """ Index tree into postorder arrays which can be reused across samples
+
+    Parameters
+    ----------
+    tree : skbio.TreeNode
+        The tree to index.
+
+    Returns
+    -------
+    dict of np.array
+        Arrays in node ID order (i.e., the postorder IDs assigned by
+        ``TreeNode.assign_ids``):
+
+        - ``name``: the name of each node
+        - ``length``: the branch length of each node, with missing lengths
+          set to zero
+        - ``parent``: the ID of the parent of each node, or ``-1`` for the root
+        - ``child_index``: as described in ``TreeNode.index_tree``
+        - ``height``: the number of edges on the longest path from each node
+          to a tip, so that every node has a greater height than all of its
+          descendants
+        - ``is_tip``: whether each node is a tip
+        - ``node_to_root``: the sum of the branch lengths from each node to
+          the root, including the branch length of the root
+        - ``tip_lookup``: a ``dict`` mapping tip names to node IDs
+
+    Notes
+    -----
+    Unlike ``TreeNode.to_array``, the result does not reference any
+    ``TreeNode`` objects, so it can be cheaply masked to subsets of the tree
+    (see ``_counts_by_node_subset``) or sent to other processes.
+
+    """
+    tree_index = tree.to_array(nan_length_value=0.0)
+    # a tree consisting of only a root node has an empty child index
+    child_index = tree_index['child_index'].reshape(-1, 3)
+    n_nodes = len(tree_index['length'])
+
+    parent = _parent_index(child_index, n_nodes)
+    height = np.zeros(n_nodes, dtype=np.int64)
+    is_tip = np.ones(n_nodes, dtype=bool)
+    # child_index is in postorder, so all descendants of a node are
+    # processed before the node itself
+    for node, start, end in child_index:
+        height[node] = height[start:end + 1].max() + 1
+        is_tip[node] = False
+
+    # the root is the last node, so reversed postorder is a preorder over
+    # the internal nodes
+    node_to_root = tree_index['length'].copy()
+    for node, start, end in child_index[::-1]:
+        node_to_root[start:end + 1] += node_to_root[node]
+
+    names = tree_index['name']
+    tip_lookup = {names[i]: i for i in np.flatnonzero(is_tip)}
+
+    return {'name': names,
+            'length': tree_index['length'],
+            'parent': parent,
+            'child_index': child_index,
+            'height': height,
+            'is_tip': is_tip,
+            'node_to_root': node_to_root,
+            'tip_lookup': tip_lookup}
+
+
+def _otu_node_indices(otu_ids, tree_arrays):
+    """ Find the node ID of each OTU in a tree indexed by ``_vectorize_tree``
+    """
+    tip_lookup = tree_arrays['tip_lookup']
+    return np.array([tip_lookup[otu_id] for otu_id in otu_ids],
+                    dtype=np.int64)
+
+
+def _counts_by_node_subset(counts, otu_indices, tree_arrays):
+    """ Compute counts of only the nodes ancestral to the provided OTUs
+
+    Parameters
+    ----------
+    counts : 2D np.array
+        Matrix of counts where each row is a sample and each column is an OTU.
+    otu_indices : 1D np.array of int
+        The node ID (see ``_otu_node_indices``) of each column in ``counts``.
+    tree_arrays : dict
+        The result of ``_vectorize_tree``.
+
+    Returns
+    -------
+    2D np.array
+        Counts of each node (columns) in each sample (rows), including the
+        counts of all descendants of the node.
+    1D np.array of int
+        The node IDs corresponding to the columns of the counts, in postorder.
+
+    Notes
+    -----
+    This is equivalent to computing the counts of every node on a tree
+    sheared to the OTUs in ``otu_indices``, but is performed on the arrays of
+    the full tree so no ``TreeNode`` objects are created. Nodes that are not
+    ancestors of any of the OTUs are omitted, which never affects phylogenetic
+    diversity metrics, as those nodes can only have counts of zero.
+
+    """
+    parent = tree_arrays['parent']
+    otu_indices = np.asarray(otu_indices, dtype=np.int64)
+
+    # collect the ancestors of the OTUs, one level of the tree at a time
+    in_subset = np.zeros(len(parent), dtype=bool)
+    in_subset[otu_indices] = True
+    frontier = otu_indices
+    while len(frontier):
+        frontier = parent[frontier]
+        frontier = np.unique(frontier[frontier >= 0])
+        frontier = frontier[~in_subset[frontier]]
+        in_subset[frontier] = True
+    nodes = np.flatnonzero(in_subset)
+
+    counts = np.atleast_2d(counts)
+    counts_by_node = np.zeros((len(nodes), counts.shape[0]),
+                              dtype=counts.dtype)
+    counts_by_node[np.searchsorted(nodes, otu_indices)] = counts.T
+
+    # push the counts of each node into its parent. all children of a node
+    # have a smaller height than the node, so processing nodes by increasing
+    # height guarantees a node's counts are complete before they are pushed
+    node_parents = parent[nodes]
+    node_heights = tree_arrays['height'][nodes]
+    parent_positions = np.searchsorted(nodes, node_parents)
+    for h in np.unique(node_heights):
+        at_height = np.flatnonzero((node_heights == h) & (node_parents >= 0))
+        np.add.at(counts_by_node, parent_positions[at_height],
+                  counts_by_node[at_height])
+
+    return counts_by_node.T, nodes
+
+
 def _get_phylogenetic_kwargs(counts, **kwargs):
-    try:
-        otu_ids = kwargs.pop('otu_ids')
-    except KeyError:
-        raise ValueError("``otu_ids`` is required for phylogenetic diversity "
-                         "metrics.")
-    try:
-        tree = kwargs.pop('tree')
-    except KeyError:
+    otu_ids = kwargs.pop('otu_ids', None)
+    tree = kwargs.pop('tree', None)
+    if otu_ids is None:
+        if isinstance(tree, PreparedTree):
+            otu_ids = tree.otu_ids
+        else:
+            raise ValueError("``otu_ids`` is required for phylogenetic "
+                             "diversity metrics.")
+    if tree is None:
         raise ValueError("``tree`` is required for phylogenetic diversity "
                          "metrics.")
 
     return otu_ids, tree, kwargs
+
+
+class PreparedTree:
+    r"""A phylogenetic tree prepared for repeated diversity calculations
+
+    Phylogenetic diversity metrics (e.g., UniFrac and Faith PD) index the
+    tree and relate it to the OTU ids before any sample can be processed.
+    When many tables are analyzed with the same tree and OTU ids (e.g.,
+    rarefaction replicates), this preparation can be done once by creating a
+    ``PreparedTree``, which is then passed as the ``tree`` of the
+    phylogenetic diversity metrics in place of a ``TreeNode``.
+
+    Parameters
+    ----------
+    tree : skbio.TreeNode
+        Tree relating the OTUs in ``otu_ids``. The set of tip names in the
+        tree can be a superset of ``otu_ids``, but not a subset.
+    otu_ids : list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``, in the order
+        of the columns of the counts that will be analyzed.
+    validate : bool, optional
+        If `False`, validation of ``tree`` and ``otu_ids`` won't be performed.
+        Phylogenetic diversity metrics given a ``PreparedTree`` only verify
+        that their counts match ``otu_ids``, so this should only be disabled
+        if the inputs are known to be valid.
+
+    Raises
+    ------
+    ValueError, MissingNodeError, DuplicateNodeError
+        If validation fails. Exact error will depend on what was invalid.
+
+    See Also
+    --------
+    skbio.diversity.alpha_diversity
+    skbio.diversity.beta_diversity
+
+    Notes
+    -----
+    ``tree`` is copied, so modifying it after preparation has no effect on
+    the ``PreparedTree``. Intermediate results that are only needed by some
+    metrics, such as the distance of each tip to the root, are computed the
+    first time that they are needed and reused afterwards.
+
+    Examples
+    --------
+    >>> from io import StringIO
+    >>> from skbio import TreeNode
+    >>> from skbio.diversity import PreparedTree, beta_diversity
+    >>> tree = TreeNode.read(StringIO(
+    ...     '(((OTU1:0.5,OTU2:0.5):0.5,OTU3:1.0):1.0,OTU4:0.75)root;'))
+    >>> prepared = PreparedTree(tree, ['OTU1', 'OTU2', 'OTU3', 'OTU4'])
+
+    The prepared tree is then used in place of the tree and OTU ids:
+
+    >>> dm = beta_diversity('unweighted_unifrac', [[1, 0, 3, 0], [0, 2, 0, 1]],
+    ...                     tree=prepared)
+    >>> print(round(dm[0, 1], 2))
+    0.65
+
+    """
+
+    @experimental(as_of="0.5.1")
+    def __init__(self, tree, otu_ids, validate=True):
+        if validate:
+            _validate_unique_otu_ids(otu_ids)
+            _validate_tree(otu_ids, tree)
+        self._setup(tree.copy(), otu_ids)
+
+    @classmethod
+    def _from_tree(cls, tree, otu_ids):
+        """Prepare a tree for a single use, without copying or validation"""
+        prepared = cls.__new__(cls)
+        prepared._setup(tree, otu_ids)
+        return prepared
+
+    def _setup(self, tree, otu_ids):
+        self._tree = tree
+        self._otu_ids = np.asarray(otu_ids)
+        self._otu_ids.flags.writeable = False
+        self._cache = {}
+
+    @property
+    @experimental(as_of="0.5.1")
+    def tree(self):
+        """The (copied) tree relating the OTUs. It should not be modified."""
+        return self._tree
+
+    @property
+    @experimental(as_of="0.5.1")
+    def otu_ids(self):
+        """The OTU ids, in the order of the columns of the counts"""
+        return self._otu_ids
+
+    def _cached(self, name, compute):
+        try:
+            return self._cache[name]
+        except KeyError:
+            result = self._cache[name] = compute()
+            return result
+
+    @property
+    def tree_index(self):
+        """The result of ``TreeNode.to_array``"""
+        return self._cached(
+            'tree_index', lambda: self._tree.to_array(nan_length_value=0.0))
+
+    @property
+    def tip_indices(self):
+        """The node IDs of all tips in the tree"""
+        return self._cached('tip_indices', lambda: np.array(
+            [n.id for n in self.tree_index['id_index'].values()
+             if n.is_tip()]))
+
+    @property
+    def node_to_root_distances(self):
+        """Distance of each tip to the root, and zero for internal nodes"""
+        return self._cached('node_to_root_distances', lambda: _tip_distances(
+            self.tree_index['length'], self._tree, self.tip_indices))
+
+    @property
+    def ancestry(self):
+        """See ``_otu_ancestry``"""
+        return self._cached('ancestry', lambda: _otu_ancestry(
+            self._otu_ids, self.tree_index))
+
+    @property
+    def tree_arrays(self):
+        """See ``_vectorize_tree``"""
+        return self._cached('tree_arrays', lambda: _vectorize_tree(
+            self._tree))
+
+    @property
+    def otu_node_indices(self):
+        """See ``_otu_node_indices``"""
+        return self._cached('otu_node_indices', lambda: _otu_node_indices(
+            self._otu_ids, self.tree_arrays))
+
+    def _check_otu_ids(self, otu_ids):
+        """Verify that ``otu_ids`` are the OTU ids of the prepared tree"""
+        if otu_ids is None or otu_ids is self._otu_ids:
+            return self._otu_ids
+        if not np.array_equal(np.asarray(otu_ids), self._otu_ids):
+            raise ValueError("``otu_ids`` must be the same as the OTU ids "
+                             "of the prepared ``tree``.")
+        return self._otu_ids
+
+
+def _prepare_tree(otu_ids, tree):
+    """Get a ``PreparedTree`` for ``otu_ids`` and a tree or prepared tree"""
+    if isinstance(tree, PreparedTree):
+        tree._check_otu_ids(otu_ids)
+        return tree
+    return PreparedTree._from_tree(tree, otu_ids)
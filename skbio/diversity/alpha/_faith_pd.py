@@ -6,6 +6,9 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import numpy as np
+import scipy.sparse
+
 from skbio.util._decorator import experimental
 from skbio.diversity._util import (_validate_counts_vector,
                                    _validate_otu_ids_and_tree,
@@ -13,6 +16,8 @@ from skbio.diversity._util import (_validate_counts_vector,
 
 
 def _faith_pd(counts_by_node, branch_lengths):
+    if scipy.sparse.issparse(counts_by_node):
+        return (counts_by_node > 0).dot(branch_lengths).sum()
     return (branch_lengths * (counts_by_node > 0)).sum()
 
 
@@ -23,13 +28,15 @@ def faith_pd(counts, otu_ids, tree, validate=True):
     Parameters
     ----------
     counts : 1-D array_like, int
-        Vectors of counts/abundances of OTUs for one sample.
+        Vectors of counts/abundances of OTUs for one sample. A
+        ``scipy.sparse`` matrix with a single row is also accepted.
     otu_ids: list, np.array
         Vector of OTU ids corresponding to tip names in ``tree``. Must be the
         same length as ``counts``.
-    tree: skbio.TreeNode
+    tree: skbio.TreeNode or skbio.diversity.PreparedTree
         Tree relating the OTUs in otu_ids. The set of tip names in the tree can
-        be a superset of ``otu_ids``, but not a subset.
+        be a superset of ``otu_ids``, but not a subset. A ``PreparedTree``
+        avoids indexing the tree again when it is used repeatedly.
     validate: bool, optional
         If `False`, validation of the input won't be performed. This step can
         be slow, so if validation is run elsewhere it can be disabled here.
@@ -125,6 +132,76 @@ def faith_pd(counts, otu_ids, tree, validate=True):
     return _faith_pd(counts_by_node, branch_lengths)
 
 
+# The approximate number of elements of the dense presence/absence matrix that
+# are materialized at once by _faith_pd_matrix.
+_faith_pd_block_elements = 2 ** 22
+
+
+def _faith_pd_matrix(counts_by_node, branch_lengths):
+    """ Compute Faith PD of all samples at once
+
+    Parameters
+    ----------
+    counts_by_node : 2D np.array or scipy.sparse.spmatrix
+        Counts of all nodes in the tree (columns) for each sample (rows).
+    branch_lengths : np.array
+        Vector of branch lengths of all nodes (tips and internal nodes) in
+        postorder representation of their tree.
+
+    Returns
+    -------
+    1D np.array of floats
+        Faith PD of each sample.
+
+    Notes
+    -----
+    PD is the product of the node presence/absence matrix and the vector of
+    branch lengths. For dense input the product is computed for blocks of
+    samples so that only a bounded part of the presence/absence matrix is
+    converted to floating point at once.
+
+    """
+    branch_lengths = np.asarray(branch_lengths, dtype=np.double)
+    if scipy.sparse.issparse(counts_by_node):
+        return np.asarray((counts_by_node > 0).dot(branch_lengths)).ravel()
+
+    n_samples = counts_by_node.shape[0]
+    result = np.zeros(n_samples, dtype=np.double)
+    step = max(1, _faith_pd_block_elements // max(len(branch_lengths), 1))
+    for start in range(0, n_samples, step):
+        present = (counts_by_node[start:start + step] > 0).astype(np.double)
+        result[start:start + step] = present.dot(branch_lengths)
+    return result
+
+
+def _multiple_faith_pd(counts, otu_ids, tree, validate):
+    """ Compute Faith PD of every sample in a matrix of counts
+
+    Parameters
+    ----------
+    counts : 2D array_like of ints, or scipy.sparse.spmatrix
+        Matrix containing count/abundance data where each row contains counts
+        of OTUs in a given sample.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as the rows of ``counts``.
+    tree: skbio.TreeNode
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset.
+    validate: bool
+        If `False`, validation of ``otu_ids`` and ``tree`` won't be performed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Faith PD of each sample.
+
+    """
+    counts_by_node, branch_lengths = _setup_faith_pd(
+        counts, otu_ids, tree, validate, single_sample=False)
+    return _faith_pd_matrix(counts_by_node, branch_lengths)
+
+
 def _setup_faith_pd(counts, otu_ids, tree, validate, single_sample):
     if validate:
         if single_sample:
@@ -135,7 +212,7 @@ def _setup_faith_pd(counts, otu_ids, tree, validate, single_sample):
         else:
             _validate_otu_ids_and_tree(counts[0], otu_ids, tree)
 
-    counts_by_node, tree_index, branch_lengths = \
+    counts_by_node, _, branch_lengths = \
         _vectorize_counts_and_tree(counts, otu_ids, tree)
 
     return counts_by_node, branch_lengths
@@ -0,0 +1,260 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import scipy.sparse
+from scipy.special import gammaln
+
+
+class _CountsSummary:
+    """Per-sample reductions of a counts matrix, computed on first use
+
+    Parameters
+    ----------
+    counts : 2D np.array or scipy.sparse.spmatrix
+        Matrix of counts where each row is a sample and each column is an OTU.
+
+    Notes
+    -----
+    All of the reductions are sums over OTUs of elementwise functions that
+    map zero counts to zero. For sparse input they are therefore computed
+    from the stored (nonzero) values only.
+
+    """
+
+    def __init__(self, counts):
+        if scipy.sparse.issparse(counts):
+            counts = scipy.sparse.csr_matrix(counts)
+            self._values = counts.data
+            self._rows = np.repeat(np.arange(counts.shape[0]),
+                                   np.diff(counts.indptr))
+        else:
+            counts = np.asarray(counts)
+            if counts.ndim == 1:
+                counts = counts[np.newaxis, :]
+            self._values = counts
+            self._rows = None
+        self.counts = counts
+        self.n_samples = counts.shape[0]
+        self._cache = {}
+
+    def _row_sum(self, values):
+        if self._rows is None:
+            return values.sum(axis=1)
+        # np.bincount always returns floats
+        return np.bincount(self._rows, weights=values,
+                           minlength=self.n_samples)
+
+    def _cached(self, name, compute):
+        try:
+            return self._cache[name]
+        except KeyError:
+            result = self._cache[name] = compute()
+            return result
+
+    @property
+    def totals(self):
+        return self._cached('totals', lambda: self._row_sum(self._values))
+
+    @property
+    def observed(self):
+        return self._cached(
+            'observed', lambda: self._row_count(self._values != 0))
+
+    @property
+    def singles(self):
+        return self._cached(
+            'singles', lambda: self._row_count(self._values == 1))
+
+    @property
+    def doubles(self):
+        return self._cached(
+            'doubles', lambda: self._row_count(self._values == 2))
+
+    @property
+    def sum_of_squares(self):
+        return self._cached(
+            'sum_of_squares',
+            lambda: self._row_sum(self._values * self._values))
+
+    @property
+    def maximum(self):
+        return self._cached('maximum', self._maximum)
+
+    @property
+    def log_factorial_sum(self):
+        return self._cached(
+            'log_factorial_sum', lambda: self._row_sum(
+                gammaln(self._values + 1)))
+
+    @property
+    def entropy(self):
+        """Shannon entropy of each sample in nats"""
+        return self._cached('entropy', self._entropy)
+
+    def _row_count(self, mask):
+        if self._rows is None:
+            return mask.sum(axis=1)
+        return np.bincount(self._rows[mask], minlength=self.n_samples)
+
+    def _maximum(self):
+        if self.counts.shape[1] == 0:
+            return np.zeros(self.n_samples, dtype=self._values.dtype)
+        if self._rows is None:
+            return self._values.max(axis=1)
+        return self.counts.max(axis=1).toarray().ravel()
+
+    def _entropy(self):
+        # H = log(N) - sum(x * log(x)) / N, where N is the total count of the
+        # sample and 0 * log(0) is taken to be zero
+        values = self._values
+        if (np.issubdtype(values.dtype, np.integer) and values.size and
+                0 <= values.min() and values.max() < values.size):
+            # integer counts are typically small, so look up x * log(x)
+            # rather than computing a logarithm for every element
+            table = np.arange(values.max() + 1, dtype=np.double)
+            table[1:] *= np.log(table[1:])
+            x_log_x = table[values]
+        else:
+            values = values.astype(np.double)
+            x_log_x = values * np.log(values, out=np.zeros(values.shape),
+                                      where=values > 0)
+
+        totals = self.totals
+        entropy = np.full(self.n_samples, np.nan)
+        nonempty = totals > 0
+        n = totals[nonempty]
+        # samples without any counts have an undefined entropy, like in the
+        # per-sample implementation
+        entropy[nonempty] = np.log(n) - self._row_sum(x_log_x)[nonempty] / n
+        # a single observed OTU has an entropy of exactly zero, which the
+        # subtraction above only reproduces up to round-off
+        entropy[self.observed == 1] = 0.0
+        return entropy
+
+
+def _berger_parker_d(summary):
+    return summary.maximum / summary.totals
+
+
+def _brillouin_d(summary):
+    n = summary.totals
+    return (gammaln(n + 1) - summary.log_factorial_sum) / n
+
+
+def _chao1(summary, bias_corrected=True):
+    o, s, d = summary.observed, summary.singles, summary.doubles
+    corrected = o + s * (s - 1) / (2 * (d + 1))
+    if bias_corrected:
+        return corrected
+    uncorrected = (s != 0) & (d != 0)
+    # avoid dividing by zero for the samples that use the corrected form
+    d = np.where(uncorrected, d, 1)
+    return np.where(uncorrected, o + s ** 2 / (d * 2), corrected)
+
+
+def _dominance(summary):
+    totals = summary.totals
+    return summary.sum_of_squares / (totals * totals)
+
+
+def _doubles(summary):
+    return summary.doubles
+
+
+def _enspie(summary):
+    return 1 / _dominance(summary)
+
+
+def _goods_coverage(summary):
+    return 1 - (summary.singles / summary.totals)
+
+
+def _heip_e(summary):
+    return (np.exp(summary.entropy) - 1) / (summary.observed - 1)
+
+
+def _margalef(summary):
+    return (summary.observed - 1) / np.log(summary.totals)
+
+
+def _mcintosh_d(summary):
+    u = np.sqrt(summary.sum_of_squares)
+    n = summary.totals
+    return (n - u) / (n - np.sqrt(n))
+
+
+def _mcintosh_e(summary):
+    numerator = np.sqrt(summary.sum_of_squares)
+    n = summary.totals
+    s = summary.observed
+    denominator = np.sqrt((n - s + 1) ** 2 + s - 1)
+    return numerator / denominator
+
+
+def _menhinick(summary):
+    return summary.observed / np.sqrt(summary.totals)
+
+
+def _observed_otus(summary):
+    return summary.observed
+
+
+def _pielou_e(summary):
+    return summary.entropy / np.log(summary.observed)
+
+
+def _robbins(summary):
+    return summary.singles / summary.totals
+
+
+def _shannon(summary, base=2):
+    return summary.entropy / np.log(base)
+
+
+def _simpson(summary):
+    return 1 - _dominance(summary)
+
+
+def _simpson_e(summary):
+    return _enspie(summary) / summary.observed
+
+
+def _singles(summary):
+    return summary.singles
+
+
+def _get_vectorized_alpha_diversity_metric_map():
+    """Matrix implementations of alpha diversity metrics
+
+    Each function takes a ``_CountsSummary`` and the metric-specific
+    parameters of the corresponding per-sample function in
+    ``skbio.diversity.alpha``, and returns the value of the metric for every
+    sample as a 1D np.array.
+
+    """
+    return {
+        'berger_parker_d': _berger_parker_d,
+        'brillouin_d': _brillouin_d,
+        'chao1': _chao1,
+        'dominance': _dominance,
+        'doubles': _doubles,
+        'enspie': _enspie,
+        'goods_coverage': _goods_coverage,
+        'heip_e': _heip_e,
+        'margalef': _margalef,
+        'mcintosh_d': _mcintosh_d,
+        'mcintosh_e': _mcintosh_e,
+        'menhinick': _menhinick,
+        'observed_otus': _observed_otus,
+        'pielou_e': _pielou_e,
+        'robbins': _robbins,
+        'shannon': _shannon,
+        'simpson': _simpson,
+        'simpson_e': _simpson_e,
+        'singles': _singles}
@@ -11,12 +11,17 @@ from io import StringIO
 import os
 
 import numpy as np
+import numpy.testing as npt
 import pandas as pd
+import scipy.sparse
 
 from skbio import TreeNode
 from skbio.util import get_data_path
 from skbio.tree import DuplicateNodeError, MissingNodeError
 from skbio.diversity.alpha import faith_pd
+from skbio.diversity.alpha import _faith_pd
+from skbio.diversity.alpha._faith_pd import (_multiple_faith_pd,
+                                             _faith_pd_matrix)
 
 
 class FaithPDTests(TestCase):
@@ -203,5 +208,43 @@ class FaithPDTests(TestCase):
         otu_ids = ['OTU1', 'OTU2', 'OTU42']
         self.assertRaises(MissingNodeError, faith_pd, counts, otu_ids, t)
 
+    def test_multiple_faith_pd(self):
+        expected = [faith_pd(c, self.oids1, self.t1) for c in self.b1]
+        for counts in (self.b1, scipy.sparse.csr_matrix(self.b1),
+                       scipy.sparse.csc_matrix(self.b1)):
+            actual = _multiple_faith_pd(counts, self.oids1, self.t1, True)
+            npt.assert_almost_equal(actual, expected)
+
+    def test_multiple_faith_pd_extra_tips(self):
+        expected = [faith_pd(c, self.oids1, self.t1_w_extra_tips)
+                    for c in self.b1]
+        actual = _multiple_faith_pd(self.b1, self.oids1,
+                                    self.t1_w_extra_tips, True)
+        npt.assert_almost_equal(actual, expected)
+
+    def test_faith_pd_matrix_blocks(self):
+        counts_by_node = np.array([[0, 1, 2, 0], [1, 1, 0, 0],
+                                   [0, 0, 0, 0]])
+        branch_lengths = np.array([0.5, 1.0, 2.0, 0.0])
+        expected = [3.0, 1.5, 0.0]
+        block_elements = _faith_pd._faith_pd_block_elements
+        try:
+            for n in (1, 8, 2 ** 22):
+                _faith_pd._faith_pd_block_elements = n
+                npt.assert_almost_equal(
+                    _faith_pd_matrix(counts_by_node, branch_lengths),
+                    expected)
+        finally:
+            _faith_pd._faith_pd_block_elements = block_elements
+
+        npt.assert_almost_equal(
+            _faith_pd_matrix(scipy.sparse.csr_matrix(counts_by_node),
+                             branch_lengths), expected)
+
+    def test_multiple_faith_pd_empty(self):
+        actual = _multiple_faith_pd(np.zeros((2, 0), dtype=int), [], self.t1,
+                                    True)
+        npt.assert_almost_equal(actual, [0.0, 0.0])
+
 if __name__ == "__main__":
     main()
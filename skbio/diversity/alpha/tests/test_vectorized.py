@@ -0,0 +1,84 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+import numpy as np
+import numpy.testing as npt
+import scipy.sparse
+
+from skbio.diversity import alpha
+from skbio.diversity.alpha._vectorized import (
+    _CountsSummary, _get_vectorized_alpha_diversity_metric_map)
+
+
+class VectorizedTests(TestCase):
+    def setUp(self):
+        self.counts = np.array([[0, 1, 1, 4, 2, 5, 2, 4, 1, 2],
+                                [1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                                [0, 0, 0, 7, 0, 0, 0, 0, 0, 0],
+                                [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                                [3, 3, 3, 3, 3, 3, 3, 3, 3, 3],
+                                [1, 2, 0, 0, 0, 0, 0, 0, 2, 0],
+                                [0, 0, 6, 0, 0, 1, 0, 80, 0, 1]])
+        self.metric_kwargs = {'chao1': [{}, {'bias_corrected': False}],
+                              'shannon': [{}, {'base': np.e}, {'base': 10}]}
+
+    def _expected(self, name, kwargs):
+        metric = getattr(alpha, name)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.array([metric(c, **kwargs) for c in self.counts],
+                            dtype=float)
+
+    def test_matches_per_sample_metrics(self):
+        metric_map = _get_vectorized_alpha_diversity_metric_map()
+        for fmt in (np.asarray, scipy.sparse.csr_matrix,
+                    scipy.sparse.csc_matrix):
+            summary = _CountsSummary(fmt(self.counts))
+            for name, f in metric_map.items():
+                for kwargs in self.metric_kwargs.get(name, [{}]):
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        obs = f(summary, **kwargs)
+                    self.assertEqual(obs.shape, (len(self.counts),))
+                    npt.assert_almost_equal(obs, self._expected(name, kwargs),
+                                            err_msg=name)
+
+    def test_metric_names(self):
+        for name in _get_vectorized_alpha_diversity_metric_map():
+            self.assertTrue(callable(getattr(alpha, name)))
+
+    def test_integer_results(self):
+        summary = _CountsSummary(scipy.sparse.csr_matrix(self.counts))
+        for name in ('observed_otus', 'singles', 'doubles'):
+            f = _get_vectorized_alpha_diversity_metric_map()[name]
+            self.assertTrue(np.issubdtype(f(summary).dtype, np.integer))
+
+    def test_float_counts(self):
+        summary = _CountsSummary(np.array([[0.5, 1.5, 0.0], [2.0, 2.0, 0.0]]))
+        npt.assert_almost_equal(summary.entropy,
+                                [0.5623351446, np.log(2)])
+
+    def test_empty(self):
+        summary = _CountsSummary(np.array([[]], dtype=int))
+        npt.assert_equal(summary.observed, [0])
+        npt.assert_equal(summary.maximum, [0])
+        npt.assert_equal(summary.entropy, [np.nan])
+
+    def test_single_vector(self):
+        summary = _CountsSummary(np.array([1, 0, 2]))
+        self.assertEqual(summary.n_samples, 1)
+        npt.assert_equal(summary.totals, [3])
+
+    def test_intermediates_are_cached(self):
+        summary = _CountsSummary(self.counts)
+        self.assertIs(summary.totals, summary.totals)
+        self.assertIs(summary.entropy, summary.entropy)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,8 @@ Functions
 
     unweighted_unifrac
     weighted_unifrac
+    generalized_unifrac
+    variance_adjusted_unifrac
 
 """
 
@@ -30,8 +32,10 @@ Functions
 
 from skbio.util import TestRunner
 
-from ._unifrac import unweighted_unifrac, weighted_unifrac
+from ._unifrac import (unweighted_unifrac, weighted_unifrac,
+                       generalized_unifrac, variance_adjusted_unifrac)
 
-__all__ = ["unweighted_unifrac", "weighted_unifrac"]
+__all__ = ["unweighted_unifrac", "weighted_unifrac", "generalized_unifrac",
+           "variance_adjusted_unifrac"]
 
 test = TestRunner(__file__).test
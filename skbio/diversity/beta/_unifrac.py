@@ -9,12 +9,13 @@
 import functools
 
 import numpy as np
+import scipy.sparse
 
 from skbio.util._decorator import experimental
 from skbio.diversity._util import (_validate_counts_matrix,
                                    _validate_otu_ids_and_tree,
-                                   _vectorize_counts_and_tree)
-from skbio.diversity._phylogenetic import _tip_distances
+                                   _vectorize_counts_and_tree,
+                                   _prepare_tree)
 
 
 # The default value indicating whether normalization should be applied
@@ -23,6 +24,15 @@ from skbio.diversity._phylogenetic import _tip_distances
 # change in this default value.
 _normalize_weighted_unifrac_by_default = False
 
+# The default weight of abundant lineages in generalized UniFrac, which is
+# also used by the diversity drivers.
+_generalized_unifrac_alpha_by_default = 0.5
+
+# The UniFrac variants with batched implementations, which compute distances
+# between all pairs of samples at once from the counts of all nodes.
+_unifrac_metrics = ('unweighted_unifrac', 'weighted_unifrac',
+                    'generalized_unifrac', 'variance_adjusted_unifrac')
+
 
 @experimental(as_of="0.4.1")
 def unweighted_unifrac(u_counts, v_counts, otu_ids, tree, validate=True):
@@ -36,9 +46,10 @@ def unweighted_unifrac(u_counts, v_counts, otu_ids, tree, validate=True):
     otu_ids: list, np.array
         Vector of OTU ids corresponding to tip names in ``tree``. Must be the
         same length as ``u_counts`` and ``v_counts``.
-    tree: skbio.TreeNode
+    tree: skbio.TreeNode or skbio.diversity.PreparedTree
         Tree relating the OTUs in otu_ids. The set of tip names in the tree can
-        be a superset of ``otu_ids``, but not a subset.
+        be a superset of ``otu_ids``, but not a subset. A ``PreparedTree``
+        avoids indexing the tree again when it is used repeatedly.
     validate: bool, optional
         If `False`, validation of the input won't be performed. This step can
         be slow, so if validation is run elsewhere it can be disabled here.
@@ -142,11 +153,11 @@ def unweighted_unifrac(u_counts, v_counts, otu_ids, tree, validate=True):
     0.37
 
     """
-    u_node_counts, v_node_counts, _, _, tree_index =\
+    u_node_counts, v_node_counts, _, _, prepared =\
         _setup_pairwise_unifrac(u_counts, v_counts, otu_ids, tree, validate,
                                 normalized=False, unweighted=True)
     return _unweighted_unifrac(u_node_counts, v_node_counts,
-                               tree_index['length'])
+                               prepared.tree_index['length'])
 
 
 @experimental(as_of="0.4.1")
@@ -163,9 +174,10 @@ def weighted_unifrac(u_counts, v_counts, otu_ids, tree,
     otu_ids: list, np.array
         Vector of OTU ids corresponding to tip names in ``tree``. Must be the
         same length as ``u_counts`` and ``v_counts``.
-    tree: skbio.TreeNode
+    tree: skbio.TreeNode or skbio.diversity.PreparedTree
         Tree relating the OTUs in otu_ids. The set of tip names in the tree can
-        be a superset of ``otu_ids``, but not a subset.
+        be a superset of ``otu_ids``, but not a subset. A ``PreparedTree``
+        avoids indexing the tree again when it is used repeatedly.
     normalized: boolean, optional
         If ``True``, apply branch length normalization, which is described in
         [1]_. Resulting distances will then be in the range ``[0, 1]``.
@@ -276,15 +288,13 @@ def weighted_unifrac(u_counts, v_counts, otu_ids, tree,
     0.33
 
     """
-    u_node_counts, v_node_counts, u_total_count, v_total_count, tree_index =\
+    u_node_counts, v_node_counts, u_total_count, v_total_count, prepared =\
         _setup_pairwise_unifrac(u_counts, v_counts, otu_ids, tree, validate,
                                 normalized=normalized, unweighted=False)
-    branch_lengths = tree_index['length']
+    branch_lengths = prepared.tree_index['length']
 
     if normalized:
-        tip_indices = _get_tip_indices(tree_index)
-        node_to_root_distances = _tip_distances(branch_lengths, tree,
-                                                tip_indices)
+        node_to_root_distances = prepared.node_to_root_distances
         return _weighted_unifrac_normalized(u_node_counts, v_node_counts,
                                             u_total_count, v_total_count,
                                             branch_lengths,
@@ -295,6 +305,211 @@ def weighted_unifrac(u_counts, v_counts, otu_ids, tree,
                                  branch_lengths)[0]
 
 
+@experimental(as_of="0.5.1")
+def generalized_unifrac(u_counts, v_counts, otu_ids, tree,
+                        alpha=_generalized_unifrac_alpha_by_default,
+                        validate=True):
+    r""" Compute generalized UniFrac
+
+    Parameters
+    ----------
+    u_counts, v_counts: list, np.array
+        Vectors of counts/abundances of OTUs for two samples. Must be equal
+        length.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``.
+    tree: skbio.TreeNode or skbio.diversity.PreparedTree
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset. A ``PreparedTree``
+        avoids indexing the tree again when it is used repeatedly.
+    alpha: float, optional
+        The weight given to abundant lineages, in the range ``[0, 1]``. Larger
+        values give more weight to abundant lineages, and smaller values to
+        rare lineages.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed. This step can
+        be slow, so if validation is run elsewhere it can be disabled here.
+        However, invalid input data can lead to invalid results or error
+        messages that are hard to interpret, so this step should not be
+        bypassed if you're not certain that your input data are valid. See
+        :mod:`skbio.diversity` for the description of what validation entails
+        so you can determine if you can safely disable validation.
+
+    Returns
+    -------
+    float
+        The generalized UniFrac distance between the two samples.
+
+    Raises
+    ------
+    ValueError, MissingNodeError, DuplicateNodeError
+        If validation fails, or if ``alpha`` is not in the range ``[0, 1]``.
+        Exact error will depend on what was invalid.
+
+    See Also
+    --------
+    weighted_unifrac
+    variance_adjusted_unifrac
+    skbio.diversity
+    skbio.diversity.beta_diversity
+
+    Notes
+    -----
+    Generalized UniFrac was described in [1]_. For proportional abundances
+    :math:`p^u_i` and :math:`p^v_i` of the lineages descending from branch
+    :math:`i`, of length :math:`b_i`, the distance is
+
+    .. math::
+
+       d^{(\alpha)} = \frac{\sum_i b_i (p^u_i + p^v_i)^\alpha
+       \left|\frac{p^u_i - p^v_i}{p^u_i + p^v_i}\right|}
+       {\sum_i b_i (p^u_i + p^v_i)^\alpha}
+
+    where branches that are observed in neither sample are omitted. With
+    ``alpha=1``, this is weighted UniFrac with branch length normalization,
+    and ``alpha=0`` is close to unweighted UniFrac while still taking
+    abundances into account. ``alpha=0.5`` is a robust compromise between
+    these extremes [1]_.
+
+    If computing generalized UniFrac for multiple pairs of samples, using
+    ``skbio.diversity.beta_diversity`` will be much faster than calling this
+    function individually on each sample.
+
+    References
+    ----------
+    .. [1] Chen, J., Bittinger, K., Charlson, E. S., Hoffmann, C., Lewis, J.,
+       Wu, G. D., Collman, R. G., Bushman, F. D. & Li, H. Associating
+       microbiome composition with environmental covariates using
+       generalized UniFrac distances. Bioinformatics 28, 2106-2113 (2012).
+
+    Examples
+    --------
+    >>> from io import StringIO
+    >>> from skbio import TreeNode
+    >>> from skbio.diversity.beta import generalized_unifrac
+    >>> tree = TreeNode.read(StringIO(
+    ...     '(((OTU1:0.5,OTU2:0.5):0.5,OTU3:1.0):1.0,OTU4:0.75)root;'))
+    >>> otu_ids = ['OTU1', 'OTU2', 'OTU3', 'OTU4']
+    >>> gu = generalized_unifrac([1, 0, 3, 2], [0, 2, 1, 4], otu_ids, tree)
+    >>> print(round(gu, 2))
+    0.42
+
+    """
+    _validate_alpha(alpha)
+    u_node_counts, v_node_counts, u_total_count, v_total_count, prepared =\
+        _setup_pairwise_unifrac(u_counts, v_counts, otu_ids, tree, validate,
+                                normalized=False, unweighted=False)
+    return _generalized_unifrac_condensed(
+        np.vstack([u_node_counts, v_node_counts]),
+        [u_total_count, v_total_count], prepared.tree_index['length'],
+        alpha)[0]
+
+
+@experimental(as_of="0.5.1")
+def variance_adjusted_unifrac(u_counts, v_counts, otu_ids, tree,
+                              validate=True):
+    r""" Compute variance-adjusted weighted UniFrac
+
+    Parameters
+    ----------
+    u_counts, v_counts: list, np.array
+        Vectors of counts of OTUs for two samples. Must be equal length.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``.
+    tree: skbio.TreeNode or skbio.diversity.PreparedTree
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset. A ``PreparedTree``
+        avoids indexing the tree again when it is used repeatedly.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed. This step can
+        be slow, so if validation is run elsewhere it can be disabled here.
+        However, invalid input data can lead to invalid results or error
+        messages that are hard to interpret, so this step should not be
+        bypassed if you're not certain that your input data are valid. See
+        :mod:`skbio.diversity` for the description of what validation entails
+        so you can determine if you can safely disable validation.
+
+    Returns
+    -------
+    float
+        The variance-adjusted weighted UniFrac distance between the two
+        samples, in the range ``[0, 1]``.
+
+    Raises
+    ------
+    ValueError, MissingNodeError, DuplicateNodeError
+        If validation fails. Exact error will depend on what was invalid.
+
+    See Also
+    --------
+    weighted_unifrac
+    generalized_unifrac
+    skbio.diversity
+    skbio.diversity.beta_diversity
+
+    Notes
+    -----
+    Variance-adjusted weighted UniFrac was described in [1]_. Weighted
+    UniFrac compares the proportional abundances of the lineages descending
+    from each branch, but the variance of these proportions depends on the
+    number of sequences that descend from the branch. Each branch is
+    therefore weighted by the inverse of the standard deviation of the
+    difference in proportions under random sampling. For counts
+    :math:`m^u_i` and :math:`m^v_i` of the lineages descending from branch
+    :math:`i`, of length :math:`b_i`, with :math:`m_i = m^u_i + m^v_i` and
+    :math:`m` the sum of the counts of both samples, the distance is
+
+    .. math::
+
+       d_{VAW} = \frac{\sum_i b_i |p^u_i - p^v_i| / \sqrt{m_i (m - m_i)}}
+       {\sum_i b_i (p^u_i + p^v_i) / \sqrt{m_i (m - m_i)}}
+
+    where :math:`p^u_i` and :math:`p^v_i` are the proportional abundances.
+    Branches with no variance (i.e., observed in neither sample, or which all
+    counts of both samples descend from) are omitted, as they cannot
+    distinguish the samples. As the variance is derived from the number of
+    sequences, ``u_counts`` and ``v_counts`` should be counts rather than
+    relative abundances.
+
+    If computing variance-adjusted weighted UniFrac for multiple pairs of
+    samples, using ``skbio.diversity.beta_diversity`` will be much faster than
+    calling this function individually on each sample.
+
+    References
+    ----------
+    .. [1] Chang, Q., Luan, Y. & Sun, F. Variance adjusted weighted UniFrac: a
+       powerful beta diversity measure for comparing communities based on
+       phylogeny. BMC Bioinformatics 12, 118 (2011).
+
+    Examples
+    --------
+    >>> from io import StringIO
+    >>> from skbio import TreeNode
+    >>> from skbio.diversity.beta import variance_adjusted_unifrac
+    >>> tree = TreeNode.read(StringIO(
+    ...     '(((OTU1:0.5,OTU2:0.5):0.5,OTU3:1.0):1.0,OTU4:0.75)root;'))
+    >>> otu_ids = ['OTU1', 'OTU2', 'OTU3', 'OTU4']
+    >>> vu = variance_adjusted_unifrac([1, 0, 3, 2], [0, 2, 1, 4], otu_ids,
+    ...                                tree)
+    >>> print(round(vu, 2))
+    0.4
+
+    """
+    u_node_counts, v_node_counts, u_total_count, v_total_count, prepared =\
+        _setup_pairwise_unifrac(u_counts, v_counts, otu_ids, tree, validate,
+                                normalized=False, unweighted=False)
+    return _variance_adjusted_unifrac_condensed(
+        np.vstack([u_node_counts, v_node_counts]),
+        [u_total_count, v_total_count], prepared.tree_index['length'])[0]
+
+
+def _validate_alpha(alpha):
+    if not 0 <= alpha <= 1:
+        raise ValueError("``alpha`` must be in the range [0, 1].")
+
+
 def _validate(u_counts, v_counts, otu_ids, tree):
     _validate_counts_matrix([u_counts, v_counts], suppress_cast=True)
     _validate_otu_ids_and_tree(counts=u_counts, otu_ids=otu_ids, tree=tree)
@@ -305,14 +520,15 @@ def _setup_pairwise_unifrac(u_counts, v_counts, otu_ids, tree, validate,
 
     if validate:
         _validate(u_counts, v_counts, otu_ids, tree)
+    prepared = _prepare_tree(otu_ids, tree)
 
     # temporarily store u_counts and v_counts in a 2-D array as that's what
     # _vectorize_counts_and_tree takes
     u_counts = np.asarray(u_counts)
     v_counts = np.asarray(v_counts)
     counts = np.vstack([u_counts, v_counts])
-    counts_by_node, tree_index, branch_lengths = \
-        _vectorize_counts_and_tree(counts, otu_ids, tree)
+    counts_by_node, _, branch_lengths = \
+        _vectorize_counts_and_tree(counts, otu_ids, prepared)
     # unpack counts vectors for single pairwise UniFrac calculation
     u_node_counts = counts_by_node[0]
     v_node_counts = counts_by_node[1]
@@ -321,7 +537,7 @@ def _setup_pairwise_unifrac(u_counts, v_counts, otu_ids, tree, validate,
     v_total_count = v_counts.sum()
 
     return (u_node_counts, v_node_counts, u_total_count, v_total_count,
-            tree_index)
+            prepared)
 
 
 def _unweighted_unifrac(u_node_counts, v_node_counts, branch_lengths):
@@ -447,11 +663,12 @@ def _weighted_unifrac_normalized(u_node_counts, v_node_counts, u_total_count,
 def _setup_multiple_unifrac(counts, otu_ids, tree, validate):
     if validate:
         _validate_otu_ids_and_tree(counts[0], otu_ids, tree)
+    prepared = _prepare_tree(otu_ids, tree)
 
-    counts_by_node, tree_index, branch_lengths = \
-        _vectorize_counts_and_tree(counts, otu_ids, tree)
+    counts_by_node, _, branch_lengths = \
+        _vectorize_counts_and_tree(counts, otu_ids, prepared)
 
-    return counts_by_node, tree_index, branch_lengths
+    return counts_by_node, prepared, branch_lengths
 
 
 def _setup_multiple_unweighted_unifrac(counts, otu_ids, tree, validate):
@@ -459,7 +676,7 @@ def _setup_multiple_unweighted_unifrac(counts, otu_ids, tree, validate):
 
     Parameters
     ----------
-    counts : 2D array_like of ints or floats
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
         Matrix containing count/abundance data where each row contains counts
         of observations in a given sample.
     otu_ids: list, np.array
@@ -495,7 +712,7 @@ def _setup_multiple_weighted_unifrac(counts, otu_ids, tree, normalized,
 
     Parameters
     ----------
-    counts : 2D array_like of ints or floats
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
         Matrix containing count/abundance data where each row contains counts
         of observations in a given sample.
     otu_ids: list, np.array
@@ -517,13 +734,12 @@ def _setup_multiple_weighted_unifrac(counts, otu_ids, tree, normalized,
         Counts of all nodes in ``tree``.
 
     """
-    counts_by_node, tree_index, branch_lengths = \
+    counts_by_node, prepared, branch_lengths = \
         _setup_multiple_unifrac(counts, otu_ids, tree, validate)
-    tip_indices = _get_tip_indices(tree_index)
+    tip_indices = prepared.tip_indices
 
     if normalized:
-        node_to_root_distances = _tip_distances(branch_lengths, tree,
-                                                tip_indices)
+        node_to_root_distances = prepared.node_to_root_distances
 
         def f(u_node_counts, v_node_counts):
             u_total_count = np.take(u_node_counts, tip_indices).sum()
@@ -545,10 +761,649 @@ def _setup_multiple_weighted_unifrac(counts, otu_ids, tree, normalized,
     return f, counts_by_node
 
 
-def _get_tip_indices(tree_index):
-    tip_indices = np.array([n.id for n in tree_index['id_index'].values()
-                            if n.is_tip()])
-    return tip_indices
+def _setup_multiple_generalized_unifrac(counts, otu_ids, tree, alpha,
+                                        validate):
+    """ Create optimized pdist-compatible generalized UniFrac function
+
+    Parameters
+    ----------
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
+        Matrix containing count/abundance data where each row contains counts
+        of observations in a given sample.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``. These IDs do not need to
+        be in tip order with respect to the tree.
+    tree: skbio.TreeNode
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset.
+    alpha: float
+        The weight given to abundant lineages, in the range ``[0, 1]``.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed.
+
+    Returns
+    -------
+    function
+        Optimized pairwise generalized UniFrac calculator that can be passed
+        to ``scipy.spatial.distance.pdist``.
+    2D np.array of ints, floats
+        Counts of all nodes in ``tree``.
+
+    """
+    _validate_alpha(alpha)
+    counts_by_node, prepared, branch_lengths = \
+        _setup_multiple_unifrac(counts, otu_ids, tree, validate)
+    tip_indices = prepared.tip_indices
+
+    def f(u_node_counts, v_node_counts):
+        node_counts = np.vstack([u_node_counts, v_node_counts])
+        total_counts = node_counts[:, tip_indices].sum(axis=1)
+        return _generalized_unifrac_condensed(node_counts, total_counts,
+                                              branch_lengths, alpha)[0]
+
+    return f, counts_by_node
+
+
+def _setup_multiple_variance_adjusted_unifrac(counts, otu_ids, tree,
+                                              validate):
+    """ Create optimized pdist-compatible variance-adjusted UniFrac function
+
+    Parameters
+    ----------
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
+        Matrix containing count/abundance data where each row contains counts
+        of observations in a given sample.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``. These IDs do not need to
+        be in tip order with respect to the tree.
+    tree: skbio.TreeNode
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed.
+
+    Returns
+    -------
+    function
+        Optimized pairwise variance-adjusted weighted UniFrac calculator that
+        can be passed to ``scipy.spatial.distance.pdist``.
+    2D np.array of ints, floats
+        Counts of all nodes in ``tree``.
+
+    """
+    counts_by_node, prepared, branch_lengths = \
+        _setup_multiple_unifrac(counts, otu_ids, tree, validate)
+    tip_indices = prepared.tip_indices
+
+    def f(u_node_counts, v_node_counts):
+        node_counts = np.vstack([u_node_counts, v_node_counts])
+        total_counts = node_counts[:, tip_indices].sum(axis=1)
+        return _variance_adjusted_unifrac_condensed(node_counts, total_counts,
+                                                    branch_lengths)[0]
+
+    return f, counts_by_node
+
+
+def _multiple_unweighted_unifrac(counts, otu_ids, tree, validate):
+    """ Compute unweighted UniFrac between all pairs of samples
+
+    Parameters
+    ----------
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
+        Matrix containing count/abundance data where each row contains counts
+        of observations in a given sample.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``. These IDs do not need to
+        be in tip order with respect to the tree.
+    tree: skbio.TreeNode
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Unweighted UniFrac distances between all pairs of samples, in the
+        condensed form returned by ``scipy.spatial.distance.pdist``.
+
+    """
+    counts_by_node, _, branch_lengths = \
+        _setup_multiple_unifrac(counts, otu_ids, tree, validate)
+
+    return _unweighted_unifrac_condensed(counts_by_node, branch_lengths)
+
+
+def _multiple_weighted_unifrac(counts, otu_ids, tree, normalized, validate):
+    """ Compute weighted UniFrac between all pairs of samples
+
+    Parameters
+    ----------
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
+        Matrix containing count/abundance data where each row contains counts
+        of observations in a given sample.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``. These IDs do not need to
+        be in tip order with respect to the tree.
+    tree: skbio.TreeNode
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset.
+    normalized: boolean
+        If ``True``, apply branch length normalization.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Weighted UniFrac distances between all pairs of samples, in the
+        condensed form returned by ``scipy.spatial.distance.pdist``.
+
+    """
+    counts_by_node, prepared, branch_lengths = \
+        _setup_multiple_unifrac(counts, otu_ids, tree, validate)
+    total_counts = np.asarray(
+        counts_by_node[:, prepared.tip_indices].sum(axis=1)).ravel()
+
+    node_to_root_distances = None
+    if normalized:
+        node_to_root_distances = prepared.node_to_root_distances
+
+    return _weighted_unifrac_condensed(counts_by_node, total_counts,
+                                       branch_lengths, node_to_root_distances)
+
+
+def _multiple_generalized_unifrac(counts, otu_ids, tree, alpha, validate):
+    """ Compute generalized UniFrac between all pairs of samples
+
+    Parameters
+    ----------
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
+        Matrix containing count/abundance data where each row contains counts
+        of observations in a given sample.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``. These IDs do not need to
+        be in tip order with respect to the tree.
+    tree: skbio.TreeNode
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset.
+    alpha: float
+        The weight given to abundant lineages, in the range ``[0, 1]``.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Generalized UniFrac distances between all pairs of samples, in the
+        condensed form returned by ``scipy.spatial.distance.pdist``.
+
+    """
+    _validate_alpha(alpha)
+    counts_by_node, prepared, branch_lengths = \
+        _setup_multiple_unifrac(counts, otu_ids, tree, validate)
+    total_counts = np.asarray(
+        counts_by_node[:, prepared.tip_indices].sum(axis=1)).ravel()
+
+    return _generalized_unifrac_condensed(counts_by_node, total_counts,
+                                          branch_lengths, alpha)
+
+
+def _multiple_variance_adjusted_unifrac(counts, otu_ids, tree, validate):
+    """ Compute variance-adjusted weighted UniFrac between all pairs of samples
+
+    Parameters
+    ----------
+    counts : 2D array_like of ints or floats, or scipy.sparse.spmatrix
+        Matrix containing count data where each row contains counts of
+        observations in a given sample.
+    otu_ids: list, np.array
+        Vector of OTU ids corresponding to tip names in ``tree``. Must be the
+        same length as ``u_counts`` and ``v_counts``. These IDs do not need to
+        be in tip order with respect to the tree.
+    tree: skbio.TreeNode
+        Tree relating the OTUs in otu_ids. The set of tip names in the tree can
+        be a superset of ``otu_ids``, but not a subset.
+    validate: bool, optional
+        If `False`, validation of the input won't be performed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Variance-adjusted weighted UniFrac distances between all pairs of
+        samples, in the condensed form returned by
+        ``scipy.spatial.distance.pdist``.
+
+    """
+    counts_by_node, prepared, branch_lengths = \
+        _setup_multiple_unifrac(counts, otu_ids, tree, validate)
+    total_counts = np.asarray(
+        counts_by_node[:, prepared.tip_indices].sum(axis=1)).ravel()
+
+    return _variance_adjusted_unifrac_condensed(counts_by_node, total_counts,
+                                                branch_lengths)
+
+
+# The approximate number of matrix elements (pairs or samples times nodes)
+# materialized at once by the batched UniFrac implementations. This bounds the
+# size of the temporaries to a few tens of megabytes regardless of the number
+# of samples or the size of the tree.
+_unifrac_block_elements = 2 ** 22
+
+
+def _observed_nodes(counts_by_node, branch_lengths):
+    """Drop nodes which cannot contribute to any UniFrac distance
+
+    A node contributes nothing to UniFrac if its branch length is zero or if
+    it is not observed in any sample, so those columns are removed before
+    computing distances.
+
+    """
+    if scipy.sparse.issparse(counts_by_node):
+        counts_by_node = scipy.sparse.csc_matrix(counts_by_node)
+        counts_by_node.eliminate_zeros()
+        observed = np.diff(counts_by_node.indptr) > 0
+        counts_by_node = scipy.sparse.csr_matrix(counts_by_node)
+    else:
+        observed = (counts_by_node != 0).any(axis=0)
+    keep = (branch_lengths != 0) & observed
+    return counts_by_node[:, keep], branch_lengths[keep]
+
+
+def _row_blocks(n_rows, n_cols):
+    """Generate contiguous row ranges with a bounded number of elements"""
+    step = max(1, _unifrac_block_elements // max(n_cols, 1))
+    for start in range(0, n_rows, step):
+        yield start, min(start + step, n_rows)
+
+
+def _pair_blocks(n, n_cols, n_rows=None):
+    """Generate blocks of sample pairs in condensed distance matrix order
+
+    Each block covers one or more consecutive rows of the upper triangle of
+    an ``n`` x ``n`` distance matrix, so the pairs in a block map onto a
+    contiguous slice of the condensed form. If ``n_rows`` is provided, the
+    blocks instead cover consecutive rows of the ``n_rows`` x
+    ``n - n_rows`` rectangle pairing each of the first ``n_rows`` samples
+    with each of the other samples, in row-major order.
+
+    Yields
+    ------
+    int
+        The offset of the block within the condensed form.
+    np.array of int
+        Row (``u``) indices of the pairs in the block.
+    np.array of int
+        Column (``v``) indices of the pairs in the block.
+
+    """
+    max_pairs = max(1, _unifrac_block_elements // max(n_cols, 1))
+    if n_rows is not None:
+        n_others = n - n_rows
+        if n_others == 0:
+            return
+        others = np.arange(n_rows, n)
+        step = max(1, max_pairs // n_others)
+        for start in range(0, n_rows, step):
+            stop = min(start + step, n_rows)
+            yield (start * n_others,
+                   np.repeat(np.arange(start, stop), n_others),
+                   np.tile(others, stop - start))
+        return
+
+    offset = 0
+    row = 0
+    while row < n - 1:
+        rows = []
+        n_pairs = 0
+        while row < n - 1 and (not rows or
+                               n_pairs + n - row - 1 <= max_pairs):
+            rows.append(row)
+            n_pairs += n - row - 1
+            row += 1
+
+        u = np.repeat(rows, [n - r - 1 for r in rows])
+        v = np.concatenate([np.arange(r + 1, n) for r in rows])
+        yield offset, u, v
+        offset += n_pairs
+
+
+def _zero_distances(n, n_rows=None):
+    """Allocate the distances computed by the batched implementations
+
+    The distances between all pairs of ``n`` samples are in condensed form,
+    while the distances between the first ``n_rows`` samples and the other
+    samples form a ``n_rows`` x ``n - n_rows`` array.
+
+    """
+    if n_rows is None:
+        return np.zeros(n * (n - 1) // 2, dtype=np.double)
+    return np.zeros((n_rows, n - n_rows), dtype=np.double)
+
+
+def _unweighted_unifrac_condensed(counts_by_node, branch_lengths,
+                                  n_rows=None):
+    """Compute unweighted UniFrac for all pairs of samples at once
+
+    Parameters
+    ----------
+    counts_by_node : 2D np.array or scipy.sparse.spmatrix
+        Counts of all nodes in the tree (columns) for each sample (rows).
+    branch_lengths : np.array
+        Vector of branch lengths of all nodes (tips and internal nodes) in
+        postorder representation of their tree.
+    n_rows : int, optional
+        If provided, only the distances between each of the first ``n_rows``
+        samples and each of the other samples are computed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Unweighted UniFrac distances in condensed form, or a 2D np.array of
+        shape ``(n_rows, n - n_rows)`` if ``n_rows`` is provided.
+
+    Notes
+    -----
+    For samples ``i`` and ``j`` with presence vectors ``P`` and absence
+    vectors ``Q = 1 - P``, the unique branch length is
+    ``(P_i * b) . Q_j + (P_j * b) . Q_i`` and the observed branch length is
+    ``sum(P_i * b) + (P_j * b) . Q_i``. Both are computed for a block of rows
+    against all subsequent samples with matrix products instead of one
+    function call per pair.
+
+    If ``counts_by_node`` is sparse, only the shared branch length
+    ``(P_i * b) . P_j`` is computed with a sparse matrix product, and the
+    unique and observed branch lengths are derived from it, so that the
+    (dense) absence vectors are never materialized.
+
+    """
+    n = counts_by_node.shape[0]
+    distances = _zero_distances(n, n_rows)
+
+    counts_by_node, branch_lengths = _observed_nodes(counts_by_node,
+                                                     branch_lengths)
+    if scipy.sparse.issparse(counts_by_node):
+        blocks = _sparse_unweighted_unifrac_blocks(counts_by_node,
+                                                   branch_lengths, n_rows)
+    else:
+        blocks = _dense_unweighted_unifrac_blocks(counts_by_node,
+                                                  branch_lengths, n_rows)
+
+    # a block of rows [start, stop) is compared against samples [start, n),
+    # and the upper triangle of the result is written to the condensed form.
+    # With n_rows, it is compared against samples [n_rows, n) and the whole
+    # result is kept
+    for start, stop, unique, shared_observed in blocks:
+        if n_rows is not None:
+            np.divide(unique, shared_observed, out=distances[start:stop],
+                      where=shared_observed != 0.0)
+            continue
+        for row in range(start, stop):
+            r = row - start
+            c = r + 1
+            u = unique[r, c:]
+            o = shared_observed[r, c:]
+            offset = row * n - row * (row + 1) // 2
+            # handle special case of no observed branch length to avoid
+            # division by zero
+            result = distances[offset:offset + len(u)]
+            np.divide(u, o, out=result, where=o != 0.0)
+
+    return distances
+
+
+def _dense_unweighted_unifrac_blocks(counts_by_node, branch_lengths,
+                                     n_rows=None):
+    """Unique and observed branch lengths of blocks of rows, dense input"""
+    n = counts_by_node.shape[0]
+    present = counts_by_node > 0
+    weighted = present * branch_lengths
+    absent = (~present).astype(np.double)
+    observed = weighted.sum(axis=1)
+
+    for start, stop in _row_blocks(n if n_rows is None else n_rows,
+                                   max(n, counts_by_node.shape[1])):
+        others = start if n_rows is None else n_rows
+        u_unique = weighted[start:stop].dot(absent[others:].T)
+        v_unique = absent[start:stop].dot(weighted[others:].T)
+        unique = u_unique + v_unique
+        shared_observed = observed[start:stop, np.newaxis] + v_unique
+        yield start, stop, unique, shared_observed
+
+
+def _sparse_unweighted_unifrac_blocks(counts_by_node, branch_lengths,
+                                      n_rows=None):
+    """Unique and observed branch lengths of blocks of rows, sparse input"""
+    n = counts_by_node.shape[0]
+    present = scipy.sparse.csr_matrix(counts_by_node > 0, dtype=np.double)
+    weighted = present.multiply(branch_lengths).tocsr()
+    observed = np.asarray(weighted.sum(axis=1)).ravel()
+
+    for start, stop in _row_blocks(n if n_rows is None else n_rows, n):
+        others = start if n_rows is None else n_rows
+        shared = weighted[start:stop].dot(present[others:].T).toarray()
+        shared_observed = (observed[start:stop, np.newaxis] +
+                           observed[np.newaxis, others:] - shared)
+        # guard against round-off producing tiny negative values
+        unique = np.maximum(shared_observed - shared, 0.0)
+        yield start, stop, unique, shared_observed
+
+
+def _node_proportions(counts_by_node, total_counts):
+    """Divide the node counts of each sample by its total count
+
+    Samples without any counts keep their (all zero) counts as proportions.
+
+    """
+    scale = np.where(total_counts > 0, total_counts, 1.0)
+    if scipy.sparse.issparse(counts_by_node):
+        return scipy.sparse.diags(1.0 / scale, 0).dot(counts_by_node)
+    return counts_by_node / scale[:, np.newaxis]
+
+
+def _dense_rows(matrix, rows):
+    """Get rows of a dense or sparse matrix as a dense 2D np.array"""
+    if scipy.sparse.issparse(matrix):
+        return matrix[rows].toarray()
+    return matrix[rows]
+
+
+def _weighted_unifrac_condensed(counts_by_node, total_counts, branch_lengths,
+                                node_to_root_distances=None, n_rows=None):
+    """Compute (normalized) weighted UniFrac for all pairs of samples at once
+
+    Parameters
+    ----------
+    counts_by_node : 2D np.array or scipy.sparse.spmatrix
+        Counts of all nodes in the tree (columns) for each sample (rows).
+    total_counts : np.array
+        The total count of each sample.
+    branch_lengths : np.array
+        Vector of branch lengths of all nodes (tips and internal nodes) in
+        postorder representation of their tree.
+    node_to_root_distances : np.array, optional
+        Distance of each tip to the root of the tree, and zero for internal
+        nodes. If provided, branch length normalization is applied.
+    n_rows : int, optional
+        If provided, only the distances between each of the first ``n_rows``
+        samples and each of the other samples are computed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Weighted UniFrac distances in condensed form, or a 2D np.array of
+        shape ``(n_rows, n - n_rows)`` if ``n_rows`` is provided.
+
+    Notes
+    -----
+    Node proportions and, if normalizing, the branch length correction of
+    each sample are computed a single time. Distances are then computed for
+    blocks of sample pairs as vectorized operations over the pairs.
+
+    """
+    n = counts_by_node.shape[0]
+    distances = _zero_distances(n, n_rows)
+    flat = distances.reshape(-1)
+
+    total_counts = np.asarray(total_counts, dtype=np.double)
+    proportions = _node_proportions(counts_by_node, total_counts)
+
+    corrections = None
+    if node_to_root_distances is not None:
+        corrections = proportions.dot(node_to_root_distances.ravel())
+
+    proportions, branch_lengths = _observed_nodes(proportions,
+                                                  branch_lengths)
+
+    for offset, u, v in _pair_blocks(n, proportions.shape[1], n_rows):
+        diff = abs(proportions[u] - proportions[v])
+        result = diff.dot(branch_lengths)
+
+        if corrections is not None:
+            c = corrections[u] + corrections[v]
+            # handle special case of both samples being empty to avoid
+            # division by zero
+            c[(total_counts[u] == 0) & (total_counts[v] == 0)] = 1.0
+            result /= c
+
+        flat[offset:offset + len(result)] = result
+
+    return distances
+
+
+def _generalized_unifrac_condensed(counts_by_node, total_counts,
+                                   branch_lengths, alpha, n_rows=None):
+    """Compute generalized UniFrac for all pairs of samples at once
+
+    Parameters
+    ----------
+    counts_by_node : 2D np.array or scipy.sparse.spmatrix
+        Counts of all nodes in the tree (columns) for each sample (rows).
+    total_counts : np.array
+        The total count of each sample.
+    branch_lengths : np.array
+        Vector of branch lengths of all nodes (tips and internal nodes) in
+        postorder representation of their tree.
+    alpha : float
+        The weight given to abundant lineages, in the range ``[0, 1]``.
+    n_rows : int, optional
+        If provided, only the distances between each of the first ``n_rows``
+        samples and each of the other samples are computed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Generalized UniFrac distances in condensed form, or a 2D np.array of
+        shape ``(n_rows, n - n_rows)`` if ``n_rows`` is provided.
+
+    Notes
+    -----
+    Node proportions are computed a single time, and distances are computed
+    for blocks of sample pairs as vectorized operations over the pairs. Each
+    block of proportions is made dense, as the weights of the nodes are not
+    linear in the proportions.
+
+    """
+    n = counts_by_node.shape[0]
+    distances = _zero_distances(n, n_rows)
+    flat = distances.reshape(-1)
+
+    total_counts = np.asarray(total_counts, dtype=np.double)
+    proportions = _node_proportions(counts_by_node, total_counts)
+    proportions, branch_lengths = _observed_nodes(proportions,
+                                                  branch_lengths)
+
+    for offset, u, v in _pair_blocks(n, proportions.shape[1], n_rows):
+        u_proportions = _dense_rows(proportions, u)
+        v_proportions = _dense_rows(proportions, v)
+        node_sums = u_proportions + v_proportions
+        # nodes observed in neither sample of a pair don't contribute to its
+        # distance
+        observed = node_sums > 0
+        weights = np.zeros_like(node_sums)
+        np.power(node_sums, alpha, out=weights, where=observed)
+        unique = np.zeros_like(node_sums)
+        np.divide(weights * abs(u_proportions - v_proportions), node_sums,
+                  out=unique, where=observed)
+
+        numerator = unique.dot(branch_lengths)
+        denominator = weights.dot(branch_lengths)
+        # handle special case of both samples being empty to avoid division
+        # by zero
+        result = flat[offset:offset + len(numerator)]
+        np.divide(numerator, denominator, out=result,
+                  where=denominator != 0.0)
+
+    return distances
+
+
+def _variance_adjusted_unifrac_condensed(counts_by_node, total_counts,
+                                         branch_lengths, n_rows=None):
+    """Compute variance-adjusted weighted UniFrac for all pairs of samples
+
+    Parameters
+    ----------
+    counts_by_node : 2D np.array or scipy.sparse.spmatrix
+        Counts of all nodes in the tree (columns) for each sample (rows).
+    total_counts : np.array
+        The total count of each sample.
+    branch_lengths : np.array
+        Vector of branch lengths of all nodes (tips and internal nodes) in
+        postorder representation of their tree.
+    n_rows : int, optional
+        If provided, only the distances between each of the first ``n_rows``
+        samples and each of the other samples are computed.
+
+    Returns
+    -------
+    1D np.array of floats
+        Variance-adjusted weighted UniFrac distances in condensed form, or a
+        2D np.array of shape ``(n_rows, n - n_rows)`` if ``n_rows`` is
+        provided.
+
+    Notes
+    -----
+    The variance of each node depends on the counts of both samples of a
+    pair, so the weights of the nodes are computed for blocks of sample pairs
+    along with the distances.
+
+    """
+    n = counts_by_node.shape[0]
+    distances = _zero_distances(n, n_rows)
+    flat = distances.reshape(-1)
+
+    total_counts = np.asarray(total_counts, dtype=np.double)
+    scale = np.where(total_counts > 0, total_counts, 1.0)
+    counts_by_node, branch_lengths = _observed_nodes(counts_by_node,
+                                                     branch_lengths)
+
+    for offset, u, v in _pair_blocks(n, counts_by_node.shape[1], n_rows):
+        u_counts = _dense_rows(counts_by_node, u).astype(np.double)
+        v_counts = _dense_rows(counts_by_node, v).astype(np.double)
+        node_counts = u_counts + v_counts
+        pair_counts = (total_counts[u] + total_counts[v])[:, np.newaxis]
+        variances = node_counts * (pair_counts - node_counts)
+        # nodes without variance can't distinguish the samples of a pair
+        adjusted = variances > 0
+        weights = np.zeros_like(variances)
+        weights[adjusted] = 1.0 / np.sqrt(variances[adjusted])
+
+        u_proportions = u_counts / scale[u, np.newaxis]
+        v_proportions = v_counts / scale[v, np.newaxis]
+        numerator = (weights * abs(u_proportions - v_proportions)).dot(
+            branch_lengths)
+        denominator = (weights * (u_proportions + v_proportions)).dot(
+            branch_lengths)
+        result = flat[offset:offset + len(numerator)]
+        np.divide(numerator, denominator, out=result,
+                  where=denominator != 0.0)
+
+    return distances
 
 
 def _weighted_unifrac_branch_correction(node_to_root_distances,
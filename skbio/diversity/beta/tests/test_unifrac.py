@@ -10,13 +10,22 @@ from io import StringIO
 from unittest import main, TestCase
 
 import numpy as np
+import numpy.testing as npt
+import scipy.sparse
 
 from skbio import TreeNode
 from skbio.tree import DuplicateNodeError, MissingNodeError
-from skbio.diversity.beta import unweighted_unifrac, weighted_unifrac
-from skbio.diversity.beta._unifrac import (_unweighted_unifrac,
-                                           _weighted_unifrac,
-                                           _weighted_unifrac_branch_correction)
+from skbio.diversity.beta import (unweighted_unifrac, weighted_unifrac,
+                                  generalized_unifrac,
+                                  variance_adjusted_unifrac)
+from skbio.diversity.beta import _unifrac
+from skbio.diversity.beta._unifrac import (
+    _unweighted_unifrac, _weighted_unifrac, _weighted_unifrac_normalized,
+    _weighted_unifrac_branch_correction, _unweighted_unifrac_condensed,
+    _weighted_unifrac_condensed, _generalized_unifrac_condensed,
+    _variance_adjusted_unifrac_condensed, _multiple_unweighted_unifrac,
+    _multiple_weighted_unifrac, _multiple_generalized_unifrac,
+    _multiple_variance_adjusted_unifrac, _pair_blocks)
 
 
 class UnifracTests(TestCase):
@@ -683,6 +692,269 @@ class UnifracTests(TestCase):
         self.assertAlmostEqual(
             _weighted_unifrac(m[:, 1], m[:, 2], m1s, m2s, bl)[0], 4.5)
 
+    def test_generalized_unifrac(self):
+        # expected values computed from the definition in Chen et al. (2012)
+        u = [1, 0, 1, 0]
+        v = [0, 1, 1, 2]
+        for alpha, exp in [(0.0, 0.51264368), (0.5, 0.44143800),
+                           (1.0, 0.38144330)]:
+            obs = generalized_unifrac(u, v, self.oids2, self.t2, alpha=alpha)
+            self.assertAlmostEqual(obs, exp)
+            self.assertAlmostEqual(
+                generalized_unifrac(v, u, self.oids2, self.t2, alpha=alpha),
+                obs)
+
+        # the default weight of abundant lineages is 0.5
+        self.assertAlmostEqual(
+            generalized_unifrac(u, v, self.oids2, self.t2), 0.44143800)
+
+    def test_generalized_unifrac_alpha_one(self):
+        # with alpha=1, generalized UniFrac is normalized weighted UniFrac
+        for i in range(len(self.b1)):
+            for j in range(len(self.b1)):
+                self.assertAlmostEqual(
+                    generalized_unifrac(self.b1[i], self.b1[j], self.oids1,
+                                        self.t1, alpha=1.0),
+                    weighted_unifrac(self.b1[i], self.b1[j], self.oids1,
+                                     self.t1, normalized=True))
+
+    def test_generalized_unifrac_identity_non_overlapping(self):
+        for i in range(len(self.b1)):
+            self.assertEqual(generalized_unifrac(
+                self.b1[i], self.b1[i], self.oids1, self.t1), 0.0)
+        self.assertAlmostEqual(generalized_unifrac(
+            [4, 6, 0, 0], [0, 0, 3, 1], self.oids2, self.t2), 1.0)
+        # zero counts
+        self.assertEqual(generalized_unifrac(
+            [0, 0, 0, 0], [0, 0, 0, 0], self.oids2, self.t2), 0.0)
+        self.assertAlmostEqual(generalized_unifrac(
+            [1, 0, 2, 0], [0, 0, 0, 0], self.oids2, self.t2), 1.0)
+
+    def test_generalized_unifrac_invalid_alpha(self):
+        for alpha in (-0.1, 1.5):
+            with self.assertRaises(ValueError):
+                generalized_unifrac([1, 0, 1, 0], [0, 1, 1, 2], self.oids2,
+                                    self.t2, alpha=alpha)
+
+    def test_variance_adjusted_unifrac(self):
+        # expected value computed from the definition in Chang et al. (2011)
+        u = [1, 0, 1, 0]
+        v = [0, 1, 1, 2]
+        obs = variance_adjusted_unifrac(u, v, self.oids2, self.t2)
+        self.assertAlmostEqual(obs, 0.38812750)
+        self.assertAlmostEqual(
+            variance_adjusted_unifrac(v, u, self.oids2, self.t2), obs)
+
+    def test_variance_adjusted_unifrac_identity_non_overlapping(self):
+        for i in range(len(self.b1)):
+            self.assertEqual(variance_adjusted_unifrac(
+                self.b1[i], self.b1[i], self.oids1, self.t1), 0.0)
+        self.assertAlmostEqual(variance_adjusted_unifrac(
+            [4, 6, 0, 0], [0, 0, 3, 1], self.oids2, self.t2), 1.0)
+        # zero counts
+        self.assertEqual(variance_adjusted_unifrac(
+            [0, 0, 0, 0], [0, 0, 0, 0], self.oids2, self.t2), 0.0)
+
+
+class BatchedUnifracTests(TestCase):
+
+    def setUp(self):
+        # lengths from ((a:1,b:2):4,(c:3,(d:1,e:1):2):3)
+        self.bl = np.array([1, 2, 1, 1, 3, 2, 4, 3, 0], dtype=float)
+        self.m = np.array([[1, 0, 1, 0],  # a
+                           [1, 1, 0, 0],  # b
+                           [0, 1, 0, 0],  # d
+                           [0, 0, 1, 0],  # e
+                           [0, 1, 0, 0],  # c
+                           [0, 1, 1, 0],  # parent of (d, e)
+                           [2, 1, 1, 0],  # parent of a, b
+                           [0, 2, 1, 0],  # parent of c (d, e)
+                           [2, 3, 2, 0]]).T  # root
+        self.totals = self.m[:, :5].sum(axis=1)
+        self.tip_ds = np.array([5, 6, 6, 6, 6, 0, 0, 0, 0], dtype=float)
+        self.pairs = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
+
+        self.b1 = np.array(
+            [[1, 3, 0, 1, 0],
+             [0, 2, 0, 4, 4],
+             [0, 0, 6, 2, 1],
+             [0, 0, 1, 1, 1],
+             [5, 3, 5, 0, 0],
+             [0, 0, 0, 3, 5],
+             [0, 0, 0, 0, 0]])
+        self.oids1 = ['OTU%d' % i for i in range(1, 6)]
+        self.t1 = TreeNode.read(
+            StringIO('(((((OTU1:0.5,OTU2:0.5):0.5,OTU3:1.0):1.0):0.0,(OTU4:'
+                     '0.75,OTU5:0.75):1.25):0.0)root;'))
+
+        self.block_elements = _unifrac._unifrac_block_elements
+
+    def tearDown(self):
+        _unifrac._unifrac_block_elements = self.block_elements
+
+    def test_pair_blocks(self):
+        _unifrac._unifrac_block_elements = 3
+        obs = [(o, list(u), list(v)) for o, u, v in _pair_blocks(4, 1)]
+        exp = [(0, [0, 0, 0], [1, 2, 3]),
+               (3, [1, 1, 2], [2, 3, 3])]
+        self.assertEqual(obs, exp)
+
+        # a single row may exceed the block size
+        _unifrac._unifrac_block_elements = 1
+        obs = [(o, list(u), list(v)) for o, u, v in _pair_blocks(3, 1)]
+        exp = [(0, [0, 0], [1, 2]),
+               (2, [1], [2])]
+        self.assertEqual(obs, exp)
+
+        self.assertEqual(list(_pair_blocks(1, 1)), [])
+
+    def test_pair_blocks_rectangle(self):
+        _unifrac._unifrac_block_elements = 4
+        obs = [(o, list(u), list(v)) for o, u, v in _pair_blocks(5, 1, 3)]
+        exp = [(0, [0, 0, 1, 1], [3, 4, 3, 4]),
+               (4, [2, 2], [3, 4])]
+        self.assertEqual(obs, exp)
+
+        self.assertEqual(list(_pair_blocks(3, 1, 3)), [])
+
+    def test_condensed_rectangle(self):
+        m = scipy.sparse.csr_matrix(self.m)
+        n = self.m.shape[0]
+        rows, cols = np.triu_indices(n, 1)
+        for n_rows in (1, 2, n - 1):
+            # the pairs of the condensed form between the first n_rows
+            # samples and the others, in row-major order
+            in_rectangle = (rows < n_rows) & (cols >= n_rows)
+            for block_elements in (1, 7, 2 ** 22):
+                _unifrac._unifrac_block_elements = block_elements
+                for counts in (self.m, m):
+                    for f, args in [
+                            (_unweighted_unifrac_condensed, (self.bl,)),
+                            (_weighted_unifrac_condensed,
+                             (self.totals, self.bl)),
+                            (_weighted_unifrac_condensed,
+                             (self.totals, self.bl, self.tip_ds)),
+                            (_generalized_unifrac_condensed,
+                             (self.totals, self.bl, 0.5)),
+                            (_variance_adjusted_unifrac_condensed,
+                             (self.totals, self.bl))]:
+                        exp = f(self.m, *args)[in_rectangle]
+                        obs = f(counts, *args, n_rows=n_rows)
+                        self.assertEqual(obs.shape, (n_rows, n - n_rows))
+                        npt.assert_almost_equal(obs.ravel(), exp)
+
+    def test_unweighted_unifrac_condensed(self):
+        obs = _unweighted_unifrac_condensed(self.m, self.bl)
+        exp = [_unweighted_unifrac(self.m[i], self.m[j], self.bl)
+               for i, j in self.pairs]
+        npt.assert_almost_equal(obs, exp)
+
+    def test_weighted_unifrac_condensed(self):
+        obs = _weighted_unifrac_condensed(self.m, self.totals, self.bl)
+        exp = [_weighted_unifrac(self.m[i], self.m[j], self.totals[i],
+                                 self.totals[j], self.bl)[0]
+               for i, j in self.pairs]
+        npt.assert_almost_equal(obs, exp)
+
+    def test_weighted_unifrac_condensed_normalized(self):
+        obs = _weighted_unifrac_condensed(self.m, self.totals, self.bl,
+                                          self.tip_ds)
+        exp = [_weighted_unifrac_normalized(
+                   self.m[i], self.m[j], self.totals[i], self.totals[j],
+                   self.bl, self.tip_ds)
+               for i, j in self.pairs]
+        npt.assert_almost_equal(obs, exp)
+
+    def test_condensed_sparse(self):
+        m = scipy.sparse.csr_matrix(self.m)
+        for block_elements in (1, 7, 2 ** 22):
+            _unifrac._unifrac_block_elements = block_elements
+            npt.assert_almost_equal(
+                _unweighted_unifrac_condensed(m, self.bl),
+                _unweighted_unifrac_condensed(self.m, self.bl))
+            npt.assert_almost_equal(
+                _weighted_unifrac_condensed(m, self.totals, self.bl),
+                _weighted_unifrac_condensed(self.m, self.totals, self.bl))
+            npt.assert_almost_equal(
+                _weighted_unifrac_condensed(m, self.totals, self.bl,
+                                            self.tip_ds),
+                _weighted_unifrac_condensed(self.m, self.totals, self.bl,
+                                            self.tip_ds))
+
+    def test_generalized_unifrac_condensed(self):
+        # with alpha=1, generalized UniFrac is normalized weighted UniFrac
+        npt.assert_almost_equal(
+            _generalized_unifrac_condensed(self.m, self.totals, self.bl, 1.0),
+            _weighted_unifrac_condensed(self.m, self.totals, self.bl,
+                                        self.tip_ds))
+
+    def test_condensed_sparse_generalized_variance_adjusted(self):
+        m = scipy.sparse.csr_matrix(self.m)
+        for block_elements in (1, 7, 2 ** 22):
+            _unifrac._unifrac_block_elements = block_elements
+            npt.assert_almost_equal(
+                _generalized_unifrac_condensed(m, self.totals, self.bl, 0.5),
+                _generalized_unifrac_condensed(self.m, self.totals, self.bl,
+                                               0.5))
+            npt.assert_almost_equal(
+                _variance_adjusted_unifrac_condensed(m, self.totals, self.bl),
+                _variance_adjusted_unifrac_condensed(self.m, self.totals,
+                                                     self.bl))
+
+    def test_condensed_single_sample(self):
+        obs = _unweighted_unifrac_condensed(self.m[:1], self.bl)
+        self.assertEqual(obs.shape, (0,))
+        obs = _weighted_unifrac_condensed(self.m[:1], self.totals[:1],
+                                          self.bl)
+        self.assertEqual(obs.shape, (0,))
+
+    def _pairwise(self, f, **kwargs):
+        n = len(self.b1)
+        return np.array([f(self.b1[i], self.b1[j], self.oids1, self.t1,
+                           **kwargs)
+                         for i in range(n) for j in range(i + 1, n)])
+
+    def test_multiple_unweighted_unifrac(self):
+        exp = self._pairwise(unweighted_unifrac)
+        for block_elements in (1, 7, 2 ** 22):
+            _unifrac._unifrac_block_elements = block_elements
+            obs = _multiple_unweighted_unifrac(self.b1, self.oids1, self.t1,
+                                               validate=True)
+            npt.assert_almost_equal(obs, exp)
+
+    def test_multiple_weighted_unifrac(self):
+        for normalized in (True, False):
+            exp = self._pairwise(weighted_unifrac, normalized=normalized)
+            for block_elements in (1, 7, 2 ** 22):
+                _unifrac._unifrac_block_elements = block_elements
+                obs = _multiple_weighted_unifrac(self.b1, self.oids1,
+                                                 self.t1,
+                                                 normalized=normalized,
+                                                 validate=True)
+                npt.assert_almost_equal(obs, exp)
+
+    def test_multiple_generalized_unifrac(self):
+        for alpha in (0.0, 0.5, 1.0):
+            exp = self._pairwise(generalized_unifrac, alpha=alpha)
+            for block_elements in (1, 7, 2 ** 22):
+                _unifrac._unifrac_block_elements = block_elements
+                obs = _multiple_generalized_unifrac(self.b1, self.oids1,
+                                                    self.t1, alpha=alpha,
+                                                    validate=True)
+                npt.assert_almost_equal(obs, exp)
+
+        with self.assertRaises(ValueError):
+            _multiple_generalized_unifrac(self.b1, self.oids1, self.t1,
+                                          alpha=2.0, validate=True)
+
+    def test_multiple_variance_adjusted_unifrac(self):
+        exp = self._pairwise(variance_adjusted_unifrac)
+        for block_elements in (1, 7, 2 ** 22):
+            _unifrac._unifrac_block_elements = block_elements
+            obs = _multiple_variance_adjusted_unifrac(self.b1, self.oids1,
+                                                      self.t1, validate=True)
+            npt.assert_almost_equal(obs, exp)
+
 
 if __name__ == '__main__':
     main()
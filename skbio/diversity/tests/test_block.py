@@ -6,16 +6,23 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
 from unittest import TestCase, main
 
 import numpy as np
 import numpy.testing as npt
+import scipy.sparse
+from scipy.spatial.distance import braycurtis
 
 from skbio import TreeNode, DistanceMatrix
 from skbio.diversity import beta_diversity, block_beta_diversity
 from skbio.diversity._block import (_block_party, _generate_id_blocks,
                                     _pairs_to_compute, _block_compute,
-                                    _block_kwargs, _map, _reduce)
+                                    _block_kwargs, _map, _reduce,
+                                    _parallel_map, _allocate_condensed)
+from skbio.diversity._util import _vectorize_tree, _otu_node_indices
 
 
 class ParallelBetaDiversity(TestCase):
@@ -114,6 +121,73 @@ class ParallelBetaDiversity(TestCase):
         npt.assert_equal(obs.data, exp.data)
         self.assertEqual(obs.ids, exp.ids)
 
+    def test_reduce_n_ids(self):
+        dm1 = DistanceMatrix(np.array([[0, 0, 44],
+                                       [0, 0, 60],
+                                       [44, 60, 0]]), (2, 3, 4))
+        dm2 = DistanceMatrix(np.array([[0, 123],
+                                       [123, 0]]), (1, 3))
+        exp = DistanceMatrix(np.array([[0, 0, 0, 0, 0, 0],
+                                       [0, 0, 0, 123, 0, 0],
+                                       [0, 0, 0, 0, 44, 0],
+                                       [0, 123, 0, 0, 60, 0],
+                                       [0, 0, 44, 60, 0, 0],
+                                       [0, 0, 0, 0, 0, 0]]), list(range(6)))
+
+        obs = _reduce(iter([dm1, dm2]), n_ids=6)
+        npt.assert_equal(obs.data, exp.data)
+        self.assertEqual(obs.ids, exp.ids)
+
+    def test_parallel_map(self):
+        counts = np.array([[0, 1, 2, 3, 4, 5],
+                           [1, 2, 3, 4, 5, 0],
+                           [2, 3, 4, 5, 0, 1],
+                           [10, 2, 3, 6, 8, 2],
+                           [9, 9, 2, 2, 3, 4]])
+        kws = {'ids': np.arange(5), 'k': 2, 'counts': counts,
+               'metric': braycurtis, 'validate': False}
+
+        exp = _reduce(_map(_block_compute, _block_kwargs(**kws)))
+        for backend in ('processes', 'threads'):
+            blocks = _parallel_map(_block_compute, _block_kwargs(**kws),
+                                   n_jobs=2, backend=backend)
+            obs = _reduce(blocks)
+            npt.assert_equal(obs.data, exp.data)
+            self.assertEqual(obs.ids, exp.ids)
+
+    def test_parallel_map_empty(self):
+        self.assertEqual(list(_parallel_map(_block_compute, [], n_jobs=2)),
+                         [])
+
+    def test_parallel_map_unknown_backend(self):
+        kws = {'ids': np.arange(3), 'k': 2, 'counts': np.ones((3, 2)),
+               'metric': 'braycurtis', 'validate': False}
+        with self.assertRaisesRegex(ValueError, 'Unknown backend'):
+            list(_parallel_map(_block_compute, _block_kwargs(**kws),
+                               n_jobs=2, backend='not-a-backend'))
+
+    def test_block_beta_diversity_n_jobs(self):
+        exp = beta_diversity('unweighted_unifrac', self.table1, self.sids1,
+                             tree=self.tree1, otu_ids=self.oids1)
+        for backend in ('processes', 'threads'):
+            obs = block_beta_diversity('unweighted_unifrac', self.table1,
+                                       self.sids1, otu_ids=self.oids1,
+                                       tree=self.tree1, k=2, n_jobs=2,
+                                       backend=backend)
+            npt.assert_equal(obs.data, exp.data)
+            self.assertEqual(obs.ids, exp.ids)
+
+    def test_block_beta_diversity_invalid_n_jobs(self):
+        with self.assertRaisesRegex(ValueError, 'map_f'):
+            block_beta_diversity('braycurtis', self.table1, self.sids1,
+                                 map_f=_map, n_jobs=2)
+        with self.assertRaisesRegex(ValueError, 'zero'):
+            block_beta_diversity('braycurtis', self.table1, self.sids1,
+                                 n_jobs=0)
+        with self.assertRaisesRegex(ValueError, 'Unknown backend'):
+            block_beta_diversity('braycurtis', self.table1, self.sids1,
+                                 n_jobs=2, backend='not-a-backend')
+
     def test_block_beta_diversity(self):
         exp = beta_diversity('unweighted_unifrac', self.table1, self.sids1,
                              tree=self.tree1, otu_ids=self.oids1)
@@ -123,6 +197,21 @@ class ParallelBetaDiversity(TestCase):
         npt.assert_equal(obs.data, exp.data)
         self.assertEqual(obs.ids, exp.ids)
 
+    def test_block_beta_diversity_sparse(self):
+        for metric in ('unweighted_unifrac', 'weighted_unifrac'):
+            exp = beta_diversity(metric, self.table1, self.sids1,
+                                 tree=self.tree1, otu_ids=self.oids1)
+            for counts, validate in (
+                    (scipy.sparse.csr_matrix(self.table1), True),
+                    (scipy.sparse.coo_matrix(self.table1), False)):
+                for n_jobs in (1, 2):
+                    obs = block_beta_diversity(
+                        metric, counts, self.sids1, validate=validate,
+                        otu_ids=self.oids1, tree=self.tree1, k=2,
+                        n_jobs=n_jobs)
+                    npt.assert_almost_equal(obs.data, exp.data)
+                    self.assertEqual(obs.ids, exp.ids)
+
     def test_generate_id_blocks(self):
         ids = [1, 2, 3, 4, 5]
         exp = [(np.array((0, 1)), np.array((0, 1))),
@@ -183,6 +272,135 @@ class ParallelBetaDiversity(TestCase):
             npt.assert_equal(okw['otu_ids'], ekw['otu_ids'])
             self.assertEqual(str(okw['tree']), str(ekw['tree']))
 
+    def test_block_party_tree_index(self):
+        counts = np.array([[1, 1, 1],
+                           [1, 0, 1],
+                           [0, 0, 1]])
+        tree = TreeNode.read(['(a:1,b:2,c:3);'])
+        tree_index = _vectorize_tree(tree)
+        otu_indices = _otu_node_indices(['c', 'a', 'b'], tree_index)
+
+        obs = _block_party(counts, np.array([1]), np.array([2]),
+                           tree_index=tree_index, otu_indices=otu_indices)
+        npt.assert_equal(obs['counts'], np.array([[1, 1], [0, 1]]))
+        npt.assert_equal(obs['otu_indices'], otu_indices[[0, 2]])
+        self.assertIs(obs['tree_index'], tree_index)
+
+    def test_block_unifrac(self):
+        counts = np.array([[1, 3, 0, 1, 0],
+                           [0, 2, 0, 4, 4],
+                           [0, 0, 6, 2, 1],
+                           [0, 0, 1, 1, 1],
+                           [5, 3, 5, 0, 0]])
+        ids = np.arange(5)
+        otu_ids = ['OTU%d' % i for i in range(1, 6)]
+        tree = TreeNode.read([
+            '(((((OTU1:0.5,OTU2:0.5):0.5,OTU3:1.0):1.0):0.0,(OTU4:0.75,'
+            'OTU5:0.75):1.25):0.0)root;'])
+        tree_index = _vectorize_tree(tree)
+        otu_indices = _otu_node_indices(otu_ids, tree_index)
+
+        for metric, kwargs in [('unweighted_unifrac', {}),
+                               ('weighted_unifrac', {}),
+                               ('weighted_unifrac', {'normalized': True})]:
+            exp = beta_diversity(metric, counts, ids, otu_ids=otu_ids,
+                                 tree=tree, **kwargs)
+            obs = _block_compute(metric=metric, counts=counts, ids=ids,
+                                 row_ids=np.array([0, 1]),
+                                 col_ids=np.array([3, 4]),
+                                 id_pairs=[(0, 3), (0, 4), (1, 3), (1, 4)],
+                                 tree_index=tree_index,
+                                 otu_indices=otu_indices, **kwargs)
+            # integer IDs index the data positionally
+            self.assertEqual(obs.ids, (0, 1, 3, 4))
+            for i, j in [(0, 2), (0, 3), (1, 2), (1, 3)]:
+                self.assertAlmostEqual(obs[i, j], exp[obs.ids[i], obs.ids[j]])
+                self.assertAlmostEqual(obs[j, i], exp[obs.ids[i], obs.ids[j]])
+            # pairs which are not part of the block are not computed
+            self.assertEqual(obs[0, 1], 0.0)
+            self.assertEqual(obs[2, 3], 0.0)
+
+    def test_block_beta_diversity_weighted_normalized(self):
+        exp = beta_diversity('weighted_unifrac', self.table1, self.sids1,
+                             tree=self.tree1, otu_ids=self.oids1,
+                             normalized=True)
+        obs = block_beta_diversity('weighted_unifrac', self.table1,
+                                   self.sids1, otu_ids=self.oids1,
+                                   tree=self.tree1, k=2, normalized=True)
+        npt.assert_almost_equal(obs.data, exp.data)
+        self.assertEqual(obs.ids, exp.ids)
+
+    def test_block_beta_diversity_generalized_variance_adjusted(self):
+        for metric, kwargs in [('generalized_unifrac', {}),
+                               ('generalized_unifrac', {'alpha': 0.0}),
+                               ('variance_adjusted_unifrac', {})]:
+            exp = beta_diversity(metric, self.table1, self.sids1,
+                                 tree=self.tree1, otu_ids=self.oids1,
+                                 **kwargs)
+            obs = block_beta_diversity(metric, self.table1, self.sids1,
+                                       otu_ids=self.oids1, tree=self.tree1,
+                                       k=2, **kwargs)
+            npt.assert_almost_equal(obs.data, exp.data)
+            self.assertEqual(obs.ids, exp.ids)
+
+    def test_block_beta_diversity_filename(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'distances.bin')
+
+        exp = beta_diversity('weighted_unifrac', self.table1, self.sids1,
+                             tree=self.tree1, otu_ids=self.oids1)
+        for dtype, decimal in ((np.float64, 7), (np.float32, 6)):
+            obs = block_beta_diversity('weighted_unifrac', self.table1,
+                                       self.sids1, otu_ids=self.oids1,
+                                       tree=self.tree1, k=2,
+                                       filename=filename, dtype=dtype)
+            self.assertIsInstance(obs.condensed_form(), np.memmap)
+            self.assertEqual(obs.condensed_form().dtype, dtype)
+            self.assertEqual(obs.ids, exp.ids)
+            npt.assert_almost_equal(obs.condensed_form(),
+                                    exp.condensed_form(), decimal)
+            npt.assert_almost_equal(obs.data, exp.data, decimal)
+
+            # the file holds the condensed distances
+            stored = np.memmap(filename, dtype=dtype, mode='r')
+            npt.assert_equal(stored, obs.condensed_form())
+            del stored
+
+        # a single sample has no distances to store
+        obs = block_beta_diversity(braycurtis, [[1, 2]], ['a'],
+                                   filename=filename)
+        self.assertEqual(obs.shape, (1, 1))
+        self.assertEqual(os.path.getsize(filename), 0)
+
+    def test_block_beta_diversity_dtype(self):
+        exp = beta_diversity('braycurtis', self.table1, self.sids1)
+        obs = block_beta_diversity(braycurtis, self.table1, self.sids1,
+                                   k=2, dtype=np.float32)
+        self.assertEqual(obs.condensed_form().dtype, np.float32)
+        npt.assert_almost_equal(obs.data, exp.data, 6)
+
+    def test_block_beta_diversity_filename_invalid_input(self):
+        with self.assertRaises(ValueError):
+            block_beta_diversity(braycurtis, self.table1, self.sids1,
+                                 dtype=np.float32, reduce_f=_reduce)
+        with self.assertRaises(ValueError):
+            block_beta_diversity(braycurtis, self.table1, self.sids1,
+                                 dtype=np.int64)
+
+    def test_reduce_out(self):
+        dm1 = DistanceMatrix(np.array([[0, 0, 44],
+                                       [0, 0, 60],
+                                       [44, 60, 0]]), (2, 3, 4))
+        dm2 = DistanceMatrix(np.array([[0, 123],
+                                       [123, 0]]), (1, 3))
+        exp = _reduce(iter([dm1, dm2]), n_ids=6)
+
+        out = _allocate_condensed(6, dtype=np.float32)
+        obs = _reduce(iter([dm1, dm2]), n_ids=6, out=out)
+        self.assertIs(obs.condensed_form(), out)
+        self.assertEqual(obs, exp)
+
     def test_pairs_to_compute_rids_are_cids(self):
         rids = np.array([0, 1, 2, 10])
         cids = rids
@@ -12,15 +12,21 @@ from unittest import TestCase, main
 import pandas as pd
 import numpy as np
 import numpy.testing as npt
+import scipy.sparse
+import scipy.spatial.distance
 
 from skbio import DistanceMatrix, TreeNode
-from skbio.util._testing import assert_series_almost_equal
-from skbio.diversity import (alpha_diversity, beta_diversity,
-                             partial_beta_diversity,
+from skbio.util._testing import (assert_series_almost_equal,
+                                 assert_data_frame_almost_equal)
+from skbio.diversity import (alpha_diversity, alpha_diversity_table,
+                             beta_diversity, partial_beta_diversity,
                              get_alpha_diversity_metrics,
-                             get_beta_diversity_metrics)
+                             get_beta_diversity_metrics, PreparedTree)
+from skbio.diversity import alpha
 from skbio.diversity.alpha import faith_pd, observed_otus
-from skbio.diversity.beta import unweighted_unifrac, weighted_unifrac
+from skbio.diversity.beta import (unweighted_unifrac, weighted_unifrac,
+                                  generalized_unifrac,
+                                  variance_adjusted_unifrac)
 from skbio.tree import DuplicateNodeError, MissingNodeError
 
 
@@ -247,6 +253,25 @@ class AlphaDiversityTests(TestCase):
                                  otu_ids=self.oids2)
         assert_series_almost_equal(actual, expected)
 
+    def test_faith_pd_prepared_tree(self):
+        prepared = PreparedTree(self.tree1, self.oids1)
+        expected = alpha_diversity('faith_pd', self.table1, tree=self.tree1,
+                                   otu_ids=self.oids1)
+        actual = alpha_diversity('faith_pd', self.table1, tree=prepared,
+                                 otu_ids=self.oids1)
+        assert_series_almost_equal(actual, expected)
+
+        # otu_ids are taken from the prepared tree
+        actual = alpha_diversity('faith_pd', self.table1, tree=prepared)
+        assert_series_almost_equal(actual, expected)
+
+        self.assertAlmostEqual(faith_pd(self.table1[0], self.oids1, prepared),
+                               expected[0])
+
+        with self.assertRaises(ValueError):
+            alpha_diversity('faith_pd', self.table1, tree=prepared,
+                            otu_ids=self.oids1[::-1])
+
     def test_no_ids(self):
         # expected values hand-calculated
         expected = pd.Series([3, 3, 3, 3])
@@ -262,6 +287,123 @@ class AlphaDiversityTests(TestCase):
                                       otu_ids=self.oids1)
         assert_series_almost_equal(optimized, unoptimized)
 
+    def test_vectorized(self):
+        # metrics with a matrix implementation give the same results as
+        # applying the per-sample function to each row
+        for metric, kwargs in [('shannon', {}), ('shannon', {'base': 10}),
+                               ('chao1', {'bias_corrected': False}),
+                               ('simpson', {}), ('goods_coverage', {})]:
+            exp = alpha_diversity(getattr(alpha, metric), self.table1,
+                                  self.sids1, **kwargs)
+            obs = alpha_diversity(metric, self.table1, self.sids1, **kwargs)
+            assert_series_almost_equal(obs, exp)
+
+    def test_vectorized_invalid_kwargs(self):
+        with self.assertRaises(TypeError):
+            alpha_diversity('shannon', self.table1, not_a_real_kwarg=42)
+
+    def test_sparse(self):
+        for fmt in (scipy.sparse.csr_matrix, scipy.sparse.csc_matrix):
+            table = fmt(self.table1)
+            for metric in ('observed_otus', 'shannon', observed_otus):
+                assert_series_almost_equal(
+                    alpha_diversity(metric, table, self.sids1),
+                    alpha_diversity(metric, self.table1, self.sids1))
+
+            assert_series_almost_equal(
+                alpha_diversity('faith_pd', table, self.sids1,
+                                tree=self.tree1, otu_ids=self.oids1),
+                alpha_diversity('faith_pd', self.table1, self.sids1,
+                                tree=self.tree1, otu_ids=self.oids1))
+
+    def test_sparse_invalid_input(self):
+        with self.assertRaises(ValueError):
+            alpha_diversity('observed_otus',
+                            scipy.sparse.csr_matrix([[1, -1], [0, 1]]))
+        with self.assertRaises(ValueError):
+            alpha_diversity('observed_otus',
+                            scipy.sparse.csr_matrix([[1, 2], [0, 1]]),
+                            ids=['a'])
+        with self.assertRaises(TypeError):
+            alpha_diversity('observed_otus',
+                            scipy.sparse.csr_matrix([[1.5, 2], [0, 1]]))
+        with self.assertRaises(ValueError):
+            alpha_diversity('faith_pd', scipy.sparse.csr_matrix(self.table1),
+                            tree=self.tree1, otu_ids=self.oids1[:-1])
+
+
+class AlphaDiversityTableTests(TestCase):
+    def setUp(self):
+        self.table1 = np.array([[1, 3, 0, 1, 0],
+                                [0, 2, 0, 4, 4],
+                                [0, 0, 6, 2, 1],
+                                [0, 0, 1, 1, 1]])
+        self.sids1 = list('ABCD')
+        self.oids1 = ['OTU%d' % i for i in range(1, 6)]
+        self.tree1 = TreeNode.read(io.StringIO(
+            '(((((OTU1:0.5,OTU2:0.5):0.5,OTU3:1.0):1.0):'
+            '0.0,(OTU4:0.75,OTU5:0.75):1.25):0.0)root;'))
+
+    def test_alpha_diversity_table(self):
+        metrics = ['shannon', 'observed_otus', 'faith_pd', 'chao1',
+                   'fisher_alpha', 'simpson', 'osd']
+        obs = alpha_diversity_table(metrics, self.table1, self.sids1,
+                                    otu_ids=self.oids1, tree=self.tree1)
+        self.assertEqual(list(obs.columns), metrics)
+        self.assertEqual(list(obs.index), self.sids1)
+        for metric in metrics:
+            kwargs = {}
+            if metric == 'faith_pd':
+                kwargs = {'otu_ids': self.oids1, 'tree': self.tree1}
+            exp = alpha_diversity(metric, self.table1, self.sids1, **kwargs)
+            if metric == 'osd':
+                self.assertEqual(list(obs[metric]), list(exp))
+            else:
+                assert_series_almost_equal(obs[metric], exp.rename(metric))
+
+    def test_alpha_diversity_table_metric_kwargs(self):
+        obs = alpha_diversity_table(
+            ['shannon', 'chao1'], self.table1,
+            metric_kwargs={'shannon': {'base': 10},
+                           'chao1': {'bias_corrected': False}})
+        assert_series_almost_equal(
+            obs['shannon'],
+            alpha_diversity('shannon', self.table1, base=10).rename(
+                'shannon'))
+        assert_series_almost_equal(
+            obs['chao1'],
+            alpha_diversity('chao1', self.table1,
+                            bias_corrected=False).rename('chao1'))
+
+    def test_alpha_diversity_table_sparse(self):
+        metrics = ['pielou_e', 'faith_pd', 'goods_coverage']
+        obs = alpha_diversity_table(metrics,
+                                    scipy.sparse.csr_matrix(self.table1),
+                                    otu_ids=self.oids1, tree=self.tree1)
+        exp = alpha_diversity_table(metrics, self.table1,
+                                    otu_ids=self.oids1, tree=self.tree1)
+        assert_data_frame_almost_equal(obs, exp)
+
+    def test_alpha_diversity_table_invalid_input(self):
+        with self.assertRaisesRegex(ValueError, 'only be provided once'):
+            alpha_diversity_table(['shannon', 'shannon'], self.table1)
+        with self.assertRaisesRegex(ValueError, "'simpson'"):
+            alpha_diversity_table(['shannon'], self.table1,
+                                  metric_kwargs={'simpson': {}})
+        with self.assertRaisesRegex(ValueError, 'Unknown metric'):
+            alpha_diversity_table(['shannon', 'not-a-metric'], self.table1)
+        with self.assertRaisesRegex(ValueError, 'otu_ids'):
+            alpha_diversity_table(['faith_pd'], self.table1, tree=self.tree1)
+        with self.assertRaises(ValueError):
+            alpha_diversity_table(['shannon'], self.table1, ids=['a'])
+        with self.assertRaises(TypeError):
+            alpha_diversity_table(['shannon'], self.table1,
+                                  metric_kwargs={'shannon': {'x': 42}})
+
+    def test_alpha_diversity_table_no_metrics(self):
+        obs = alpha_diversity_table([], self.table1, self.sids1)
+        self.assertEqual(obs.shape, (4, 0))
+
 
 class BetaDiversityTests(TestCase):
     def setUp(self):
@@ -561,7 +703,10 @@ class BetaDiversityTests(TestCase):
                              otu_ids=self.oids1, tree=self.tree1,
                              normalized=True)
         self.assertEqual(dm1.shape, (3, 3))
-        self.assertEqual(dm1, dm2)
+        # the optimized implementation computes the normalization for all
+        # pairs at once, so results can differ in the last few bits
+        self.assertEqual(dm1.ids, dm2.ids)
+        npt.assert_almost_equal(dm1.data, dm2.data)
         expected_data = [
             [0.0, 0.128834, 0.085714],
             [0.128834, 0.0, 0.2142857],
@@ -572,6 +717,109 @@ class BetaDiversityTests(TestCase):
                 npt.assert_almost_equal(dm1[id1, id2],
                                         expected_dm[id1, id2], 6)
 
+    def test_generalized_unifrac(self):
+        for weight in (0.0, 0.5, 1.0):
+            dm = beta_diversity('generalized_unifrac', self.table1,
+                                self.sids1, otu_ids=self.oids1,
+                                tree=self.tree1, alpha=weight)
+            for id1, c1 in zip(self.sids1, self.table1):
+                for id2, c2 in zip(self.sids1, self.table1):
+                    npt.assert_almost_equal(
+                        dm[id1, id2], generalized_unifrac(
+                            c1, c2, self.oids1, self.tree1, alpha=weight))
+
+            # the per-pair implementation is used with pairwise_func
+            obs = beta_diversity('generalized_unifrac', self.table1,
+                                 self.sids1, otu_ids=self.oids1,
+                                 tree=self.tree1, alpha=weight,
+                                 pairwise_func=scipy.spatial.distance.pdist)
+            npt.assert_almost_equal(obs.data, dm.data)
+
+        with self.assertRaises(ValueError):
+            beta_diversity('generalized_unifrac', self.table1, self.sids1,
+                           otu_ids=self.oids1, tree=self.tree1, alpha=-1.0)
+
+    def test_variance_adjusted_unifrac(self):
+        dm = beta_diversity('variance_adjusted_unifrac', self.table1,
+                            self.sids1, otu_ids=self.oids1, tree=self.tree1)
+        for id1, c1 in zip(self.sids1, self.table1):
+            for id2, c2 in zip(self.sids1, self.table1):
+                npt.assert_almost_equal(
+                    dm[id1, id2], variance_adjusted_unifrac(
+                        c1, c2, self.oids1, self.tree1))
+
+        obs = beta_diversity('variance_adjusted_unifrac', self.table1,
+                             self.sids1, otu_ids=self.oids1, tree=self.tree1,
+                             pairwise_func=scipy.spatial.distance.pdist)
+        npt.assert_almost_equal(obs.data, dm.data)
+
+    def test_sparse(self):
+        table = np.array([[23, 64, 14, 0, 0, 3, 1],
+                          [0, 3, 35, 42, 0, 12, 1],
+                          [0, 0, 0, 0, 0, 0, 0],
+                          [0, 0, 25, 35, 0, 19, 0]])
+        oids = ['O%d' % i for i in range(1, 8)]
+        tree = TreeNode.read(io.StringIO(
+            '(((O1:0.25,O2:0.5):0.25,(O3:0.1,O4:0.2):0.3):0.1,'
+            '((O5:0.6,O6:0.7):0.1,O7:0.75):0.2)root;'))
+
+        for fmt in (scipy.sparse.csr_matrix, scipy.sparse.csc_matrix):
+            for metric, kwargs in [('unweighted_unifrac', {}),
+                                   ('weighted_unifrac', {}),
+                                   ('weighted_unifrac', {'normalized': True}),
+                                   ('generalized_unifrac', {'alpha': 0.25}),
+                                   ('variance_adjusted_unifrac', {})]:
+                obs = beta_diversity(metric, fmt(table), otu_ids=oids,
+                                     tree=tree, **kwargs)
+                exp = beta_diversity(metric, table, otu_ids=oids, tree=tree,
+                                     **kwargs)
+                self.assertEqual(obs.ids, exp.ids)
+                npt.assert_almost_equal(obs.data, exp.data)
+
+            obs = beta_diversity('unweighted_unifrac', fmt(table),
+                                 otu_ids=oids, tree=tree,
+                                 pairwise_func=scipy.spatial.distance.pdist)
+            exp = beta_diversity('unweighted_unifrac', table, otu_ids=oids,
+                                 tree=tree)
+            npt.assert_almost_equal(obs.data, exp.data)
+
+            obs = beta_diversity('braycurtis', fmt(self.table2), self.sids2)
+            exp = beta_diversity('braycurtis', self.table2, self.sids2)
+            self.assertEqual(obs, exp)
+
+    def test_prepared_tree(self):
+        prepared = PreparedTree(self.tree1, self.oids1)
+        for metric, kwargs in [('unweighted_unifrac', {}),
+                               ('weighted_unifrac', {}),
+                               ('weighted_unifrac', {'normalized': True})]:
+            exp = beta_diversity(metric, self.table1, self.sids1,
+                                 otu_ids=self.oids1, tree=self.tree1,
+                                 **kwargs)
+            obs = beta_diversity(metric, self.table1, self.sids1,
+                                 tree=prepared, **kwargs)
+            self.assertEqual(obs.ids, exp.ids)
+            npt.assert_almost_equal(obs.data, exp.data)
+
+        # the per-pair implementations also accept a prepared tree
+        exp = beta_diversity(weighted_unifrac, self.table1, self.sids1,
+                             otu_ids=self.oids1, tree=self.tree1)
+        obs = beta_diversity(weighted_unifrac, self.table1, self.sids1,
+                             otu_ids=self.oids1, tree=prepared)
+        npt.assert_almost_equal(obs.data, exp.data)
+
+        with self.assertRaises(ValueError):
+            beta_diversity('unweighted_unifrac', self.table1, self.sids1,
+                           otu_ids=['O2', 'O1'], tree=prepared)
+
+    def test_sparse_invalid_input(self):
+        with self.assertRaises(ValueError):
+            beta_diversity('euclidean',
+                           scipy.sparse.csr_matrix([[1, -1], [0, 1]]))
+        with self.assertRaises(ValueError):
+            beta_diversity('unweighted_unifrac',
+                           scipy.sparse.csr_matrix(self.table1),
+                           otu_ids=['O1', 'O2', 'O3'], tree=self.tree1)
+
     def test_scipy_kwargs(self):
         # confirm that p can be passed to SciPy's minkowski, and that it
         # gives a different result than not passing it (the off-diagonal
@@ -630,6 +878,8 @@ class MetricGetters(TestCase):
         # basic sanity checks
         self.assertTrue('unweighted_unifrac' in m)
         self.assertTrue('weighted_unifrac' in m)
+        self.assertTrue('generalized_unifrac' in m)
+        self.assertTrue('variance_adjusted_unifrac' in m)
 
     def test_get_beta_diversity_metrics_sorted(self):
         m = get_beta_diversity_metrics()
@@ -769,6 +1019,17 @@ class TestPartialBetaDiversity(TestCase):
                 npt.assert_almost_equal(actual_dm[id1, id2],
                                         expected_dm[id1, id2], 6)
 
+    def test_sparse(self):
+        obs = partial_beta_diversity(
+            'unweighted_unifrac', scipy.sparse.csr_matrix(self.table1),
+            self.sids1, otu_ids=self.oids1, tree=self.tree1,
+            id_pairs=[('A', 'B'), ('C', 'A')])
+        exp = partial_beta_diversity(
+            'unweighted_unifrac', self.table1, self.sids1,
+            otu_ids=self.oids1, tree=self.tree1,
+            id_pairs=[('A', 'B'), ('C', 'A')])
+        self.assertEqual(obs, exp)
+
     def test_unusable_metric(self):
         id_pairs = [('A', 'B'), ('B', 'F'), ('D', 'E')]
         error_msg = "partial_beta_diversity is only compatible"
@@ -0,0 +1,168 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from io import StringIO
+
+import numpy as np
+import numpy.testing as npt
+import pandas.util.testing as pdt
+import scipy.sparse
+from scipy.special import comb
+
+from skbio import TreeNode
+from skbio.diversity import (rarefaction_curve, alpha_diversity,
+                             PreparedTree)
+from skbio.diversity.alpha import shannon
+from skbio.diversity._rarefaction import (_nested_subsamples,
+                                          _expected_observed_otus)
+
+
+class RarefactionCurveTests(TestCase):
+    def setUp(self):
+        self.counts = np.array([[4, 5, 0, 2, 1],
+                                [0, 3, 3, 0, 9],
+                                [1, 1, 0, 0, 0]])
+        self.ids = ['A', 'B', 'C']
+        self.otu_ids = ['O1', 'O2', 'O3', 'O4', 'O5']
+        self.tree = TreeNode.read(StringIO(
+            '(((((O1:0.5,O2:0.5):0.5,O3:1.0):1.0):0.0,(O4:1.0,O5:1.0):1.0)'
+            ':0.0,O6:1.0)root;'))
+
+    def test_rarefaction_curve(self):
+        obs = rarefaction_curve('observed_otus', self.counts, [10, 1, 5],
+                                ids=self.ids, iterations=4, seed=0)
+        self.assertEqual(list(obs.columns),
+                         ['sample_id', 'depth', 'iteration', 'observed_otus'])
+        # C is only deep enough for the first depth
+        self.assertEqual(len(obs), 2 * 3 * 4 + 4)
+        npt.assert_array_equal(obs['sample_id'],
+                               ['A'] * 12 + ['B'] * 12 + ['C'] * 4)
+        npt.assert_array_equal(obs['depth'][:12],
+                               [1] * 4 + [5] * 4 + [10] * 4)
+        npt.assert_array_equal(obs['iteration'][:12], [0, 1, 2, 3] * 3)
+        npt.assert_array_equal(obs['observed_otus'][obs['depth'] == 1], 1)
+        self.assertTrue((obs['observed_otus'] <= 4).all())
+
+    def test_rarefaction_curve_nested(self):
+        # the observed OTUs of an iteration can only grow with depth
+        obs = rarefaction_curve('observed_otus', self.counts[:2],
+                                range(1, 13), iterations=5, seed=1)
+        for _, curve in obs.groupby(['sample_id', 'iteration']):
+            self.assertTrue((np.diff(curve['observed_otus']) >= 0).all())
+        # all OTUs are observed at the full depth
+        full = obs[(obs['sample_id'] == 0) & (obs['depth'] == 12)]
+        npt.assert_array_equal(full['observed_otus'], 4)
+
+    def test_rarefaction_curve_seed(self):
+        obs1 = rarefaction_curve('shannon', self.counts, [3, 6],
+                                 iterations=3, seed=5)
+        obs2 = rarefaction_curve('shannon', self.counts, [3, 6],
+                                 iterations=3, seed=5)
+        pdt.assert_frame_equal(obs1, obs2)
+
+    def test_rarefaction_curve_callable(self):
+        obs = rarefaction_curve(shannon, self.counts, [2, 12],
+                                iterations=2, seed=2, base=10)
+        self.assertEqual(list(obs.columns),
+                         ['sample_id', 'depth', 'iteration', 'shannon'])
+        full = obs[(obs['sample_id'] == 0) & (obs['depth'] == 12)]
+        exp = alpha_diversity('shannon', self.counts[:1], base=10)[0]
+        npt.assert_almost_equal(full['shannon'], [exp, exp])
+
+    def test_rarefaction_curve_sparse(self):
+        exp = rarefaction_curve('observed_otus', self.counts, [2, 5],
+                                iterations=3, seed=3)
+        obs = rarefaction_curve('observed_otus',
+                                scipy.sparse.csr_matrix(self.counts), [2, 5],
+                                iterations=3, seed=3)
+        pdt.assert_frame_equal(obs, exp)
+
+    def test_rarefaction_curve_faith_pd(self):
+        obs = rarefaction_curve('faith_pd', self.counts, [2, 15],
+                                iterations=2, seed=4, otu_ids=self.otu_ids,
+                                tree=self.tree)
+        exp = alpha_diversity('faith_pd', self.counts[1:2],
+                              otu_ids=self.otu_ids, tree=self.tree)[0]
+        npt.assert_almost_equal(obs['faith_pd'][obs['depth'] == 15],
+                                [exp, exp])
+
+        prepared = PreparedTree(self.tree, self.otu_ids)
+        obs2 = rarefaction_curve('faith_pd', self.counts, [2, 15],
+                                 iterations=2, seed=4, tree=prepared)
+        pdt.assert_frame_equal(obs2, obs)
+
+    def test_rarefaction_curve_expected(self):
+        obs = rarefaction_curve('observed_otus', self.counts, [1, 2, 12],
+                                ids=self.ids, expected=True)
+        self.assertEqual(list(obs.columns),
+                         ['sample_id', 'depth', 'observed_otus'])
+        npt.assert_array_equal(obs['sample_id'], list('AAABBBCC'))
+        npt.assert_array_equal(obs['depth'], [1, 2, 12, 1, 2, 12, 1, 2])
+        npt.assert_almost_equal(obs['observed_otus'],
+                                [1, 1 + 49 / 66, 4, 1, 1 + 63 / 105,
+                                 3 - 2 / 455, 1, 2])
+
+    def test_rarefaction_curve_expected_matches_mean(self):
+        counts = np.array([[10, 20, 1, 3, 0, 6]])
+        exp = rarefaction_curve('observed_otus', counts, [5, 20],
+                                expected=True)
+        obs = rarefaction_curve('observed_otus', counts, [5, 20],
+                                iterations=2000, seed=6)
+        means = obs.groupby('depth')['observed_otus'].mean()
+        npt.assert_allclose(means.values, exp['observed_otus'].values,
+                            rtol=0.02)
+
+    def test_rarefaction_curve_no_deep_samples(self):
+        obs = rarefaction_curve('observed_otus', self.counts, [100])
+        self.assertEqual(len(obs), 0)
+        self.assertEqual(list(obs.columns),
+                         ['sample_id', 'depth', 'iteration', 'observed_otus'])
+
+    def test_rarefaction_curve_invalid_input(self):
+        with self.assertRaises(ValueError):
+            rarefaction_curve('observed_otus', self.counts, [])
+        with self.assertRaises(ValueError):
+            rarefaction_curve('observed_otus', self.counts, [0, 2])
+        with self.assertRaises(ValueError):
+            rarefaction_curve('observed_otus', self.counts, [2], iterations=0)
+        with self.assertRaisesRegex(ValueError, 'observed_otus'):
+            rarefaction_curve('shannon', self.counts, [2], expected=True)
+        with self.assertRaises(TypeError):
+            rarefaction_curve('observed_otus', self.counts, [2],
+                              expected=True, base=2)
+        with self.assertRaises(ValueError):
+            rarefaction_curve('observed_otus', [[1, -1]], [1])
+        with self.assertRaises(ValueError):
+            rarefaction_curve('observed_otus', self.counts, [1],
+                              ids=['A', 'B'])
+        with self.assertRaises(ValueError):
+            rarefaction_curve('not-a-metric', self.counts, [1])
+
+    def test_nested_subsamples(self):
+        counts = np.array([3, 0, 7, 2])
+        obs = _nested_subsamples(counts, np.array([2, 6, 12]), 10,
+                                 np.random.RandomState(0))
+        self.assertEqual(obs.shape, (3, 10, 4))
+        npt.assert_array_equal(obs.sum(axis=2), [[2] * 10, [6] * 10,
+                                                 [12] * 10])
+        npt.assert_array_equal(obs[2], np.tile(counts, (10, 1)))
+        self.assertTrue((obs[0] <= obs[1]).all())
+        self.assertTrue((obs[1] <= obs[2]).all())
+
+    def test_expected_observed_otus(self):
+        counts = np.array([4, 5, 0, 2, 1])
+        depths = np.arange(1, 13)
+        exp = [sum(1 - comb(12 - c, n, exact=True) /
+                   comb(12, n, exact=True) for c in counts[counts > 0])
+               for n in depths]
+        npt.assert_almost_equal(_expected_observed_otus(counts, depths), exp)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,12 +11,15 @@ from unittest import TestCase, main
 
 import numpy as np
 import numpy.testing as npt
+import scipy.sparse
 
 from skbio import TreeNode
 from skbio.diversity._util import (_validate_counts_vector,
                                    _validate_counts_matrix,
                                    _validate_otu_ids_and_tree,
-                                   _vectorize_counts_and_tree)
+                                   _vectorize_counts_and_tree,
+                                   _vectorize_tree, _otu_node_indices,
+                                   _counts_by_node_subset, PreparedTree)
 from skbio.tree import DuplicateNodeError, MissingNodeError
 
 
@@ -119,6 +122,30 @@ class ValidationTests(TestCase):
         with self.assertRaises(ValueError):
             _validate_counts_matrix([[0, 0, 75], [0, 0, 3], [9, 8, 22, 44]])
 
+    def test_validate_counts_matrix_sparse(self):
+        data = scipy.sparse.csc_matrix([[0, 1, 1], [4, 0, 0]])
+        obs = _validate_counts_matrix(data, ids=['a', 'b'])
+        self.assertTrue(scipy.sparse.isspmatrix_csr(obs))
+        self.assertEqual(obs.dtype, int)
+        npt.assert_array_equal(obs.toarray(), data.toarray())
+
+        data = scipy.sparse.csr_matrix([[0.0, 1.5], [4.0, 0.0]])
+        obs = _validate_counts_matrix(data, suppress_cast=True)
+        npt.assert_array_equal(obs.toarray(), data.toarray())
+
+    def test_validate_counts_matrix_sparse_invalid_input(self):
+        with self.assertRaises(TypeError):
+            _validate_counts_matrix(scipy.sparse.csr_matrix([[0.0, 1.5]]))
+        with self.assertRaises(ValueError):
+            _validate_counts_matrix(scipy.sparse.csr_matrix([[0, -1]]))
+        with self.assertRaises(ValueError):
+            _validate_counts_matrix(scipy.sparse.csr_matrix([[0, 1]]),
+                                    ids=['a', 'b'])
+
+    def test_validate_counts_vector_sparse(self):
+        obs = _validate_counts_vector(scipy.sparse.csr_matrix([[0, 2, 1]]))
+        npt.assert_array_equal(obs, np.array([0, 2, 1]))
+
     def test_validate_otu_ids_and_tree(self):
         # basic valid input
         t = TreeNode.read(
@@ -242,6 +269,120 @@ class ValidationTests(TestCase):
         exp_counts = np.array([[0, 1, 10], [1, 5, 1], [1, 6, 11], [1, 6, 11]])
         npt.assert_equal(count_array, exp_counts.T)
 
+    def test_vectorize_counts_and_tree_sparse(self):
+        t = TreeNode.read(io.StringIO(
+            "(((a:1,b:2)x:1,c:3)y:2,(d:1,(e:1,f:1)z:1)w:1)root:0.5;"))
+        otu_ids = np.array(['f', 'a', 'c', 'd'])
+        counts = np.array([[0, 1, 0, 2], [1, 5, 0, 0], [0, 0, 0, 0]])
+        exp, _, exp_lengths = _vectorize_counts_and_tree(counts, otu_ids, t)
+        obs, _, obs_lengths = _vectorize_counts_and_tree(
+            scipy.sparse.csc_matrix(counts), otu_ids, t)
+        self.assertTrue(scipy.sparse.isspmatrix_csr(obs))
+        npt.assert_equal(obs.toarray(), exp)
+        npt.assert_equal(obs_lengths, exp_lengths)
+
+    def test_vectorize_tree(self):
+        t = TreeNode.read(io.StringIO(
+            "(((a:1,b:2)x:1,c:3)y:2,(d:1,(e:1,f:1)z:1)w:1)root:0.5;"))
+        obs = _vectorize_tree(t)
+        npt.assert_equal(obs['name'], ['a', 'b', 'x', 'c', 'e', 'f', 'd',
+                                       'z', 'y', 'w', 'root'])
+        npt.assert_equal(obs['length'], [1, 2, 1, 3, 1, 1, 1, 1, 2, 1, 0.5])
+        npt.assert_equal(obs['parent'], [2, 2, 8, 8, 7, 7, 9, 9, 10, 10, -1])
+        npt.assert_equal(obs['height'], [0, 0, 1, 0, 0, 0, 0, 1, 2, 2, 3])
+        npt.assert_equal(obs['is_tip'], [True, True, False, True, True, True,
+                                         True, False, False, False, False])
+        npt.assert_equal(obs['node_to_root'],
+                         [4.5, 5.5, 3.5, 5.5, 3.5, 3.5, 2.5, 2.5, 2.5, 1.5,
+                          0.5])
+        self.assertEqual(obs['tip_lookup'], {'a': 0, 'b': 1, 'c': 3, 'e': 4,
+                                             'f': 5, 'd': 6})
+
+    def test_vectorize_tree_single_node(self):
+        obs = _vectorize_tree(TreeNode.read(io.StringIO("root;")))
+        npt.assert_equal(obs['parent'], [-1])
+        npt.assert_equal(obs['is_tip'], [True])
+
+    def test_counts_by_node_subset(self):
+        t = TreeNode.read(io.StringIO(
+            "(((a:1,b:2)x:1,c:3)y:2,(d:1,(e:1,f:1)z:1)w:1)root;"))
+        tree_arrays = _vectorize_tree(t)
+        otu_ids = np.array(['b', 'e', 'c'])
+        counts = np.array([[0, 1, 3], [2, 0, 1]])
+
+        otu_indices = _otu_node_indices(otu_ids, tree_arrays)
+        npt.assert_equal(otu_indices, [1, 4, 3])
+
+        obs_counts, obs_nodes = _counts_by_node_subset(counts, otu_indices,
+                                                       tree_arrays)
+        npt.assert_equal(obs_nodes, [1, 2, 3, 4, 7, 8, 9, 10])
+        exp_counts, _, _ = _vectorize_counts_and_tree(counts, otu_ids, t)
+        npt.assert_equal(obs_counts, exp_counts[:, obs_nodes])
+
+        # all other nodes have no counts
+        others = np.setdiff1d(np.arange(11), obs_nodes)
+        npt.assert_equal(exp_counts[:, others], 0)
+
+    def test_counts_by_node_subset_no_otus(self):
+        t = TreeNode.read(io.StringIO("((a:1, b:2)c:3)root;"))
+        obs_counts, obs_nodes = _counts_by_node_subset(
+            np.zeros((2, 0), dtype=int), np.array([], dtype=int),
+            _vectorize_tree(t))
+        self.assertEqual(obs_counts.shape, (2, 0))
+        self.assertEqual(obs_nodes.shape, (0,))
+
+
+class PreparedTreeTests(TestCase):
+    def setUp(self):
+        self.t = TreeNode.read(io.StringIO(
+            "(((a:1,b:2)x:1,c:3)y:2,(d:1,(e:1,f:1)z:1)w:1)root:0.5;"))
+        self.otu_ids = ['f', 'a', 'c', 'd']
+
+    def test_prepared_tree(self):
+        prepared = PreparedTree(self.t, self.otu_ids)
+        npt.assert_equal(prepared.otu_ids, self.otu_ids)
+        self.assertIsNot(prepared.tree, self.t)
+
+        # modifying the original tree has no effect on the prepared tree
+        self.t.find('a').length = 42
+        self.assertEqual(prepared.tree.find('a').length, 1)
+
+        # intermediate results are computed once
+        self.assertIs(prepared.tree_index, prepared.tree_index)
+        self.assertIs(prepared.tree_arrays, prepared.tree_arrays)
+
+    def test_prepared_tree_vectorize_counts_and_tree(self):
+        prepared = PreparedTree(self.t, self.otu_ids)
+        counts = np.array([[0, 1, 0, 2], [1, 5, 0, 0], [0, 0, 0, 0]])
+        exp, _, exp_lengths = _vectorize_counts_and_tree(counts, self.otu_ids,
+                                                         self.t)
+        obs, _, obs_lengths = _vectorize_counts_and_tree(counts, self.otu_ids,
+                                                         prepared)
+        npt.assert_equal(obs, exp)
+        npt.assert_equal(obs_lengths, exp_lengths)
+
+        obs, _, _ = _vectorize_counts_and_tree(
+            scipy.sparse.csr_matrix(counts), self.otu_ids, prepared)
+        npt.assert_equal(obs.toarray(), exp)
+
+    def test_prepared_tree_invalid_input(self):
+        with self.assertRaises(ValueError):
+            PreparedTree(self.t, ['a', 'a'])
+        with self.assertRaises(MissingNodeError):
+            PreparedTree(self.t, ['a', 'OTU42'])
+
+    def test_validate_otu_ids_and_tree_prepared(self):
+        prepared = PreparedTree(self.t, self.otu_ids)
+        self.assertIsNone(_validate_otu_ids_and_tree([1, 0, 1, 1],
+                                                     self.otu_ids, prepared))
+        self.assertIsNone(_validate_otu_ids_and_tree([1, 0, 1, 1], None,
+                                                     prepared))
+        with self.assertRaises(ValueError):
+            _validate_otu_ids_and_tree([1, 0, 1], self.otu_ids, prepared)
+        with self.assertRaises(ValueError):
+            _validate_otu_ids_and_tree([1, 0, 1, 1], ['a', 'f', 'c', 'd'],
+                                       prepared)
+
 
 if __name__ == "__main__":
     main()
@@ -30,6 +30,7 @@ Functions
 # ----------------------------------------------------------------------------
 
 import numpy as np
+import scipy.sparse
 import scipy.spatial.distance
 
 import skbio
@@ -176,3 +177,84 @@ def _check_seqs(seq1, seq2):
         raise TypeError(
             "Sequences must have matching type. Type %r does not match type %r"
             % (type(seq1).__name__, type(seq2).__name__))
+
+
+def _pairwise_hamming(seqs):
+    """Compute the Hamming distances between all pairs of sequences
+
+    Returns the distances in condensed form, in the order of
+    ``scipy.spatial.distance.pdist``. Raises the errors ``hamming`` would
+    raise for any pair.
+
+    """
+    for seq in seqs:
+        _check_seqs(seqs[0], seq)
+    lengths = {len(seq) for seq in seqs}
+    if len(lengths) > 1:
+        raise ValueError(
+            "Hamming distance can only be computed between sequences of equal "
+            "length (%d != %d)" % (min(lengths), max(lengths)))
+
+    num_pairs = len(seqs) * (len(seqs) - 1) // 2
+    if not lengths.pop():
+        return np.full(num_pairs, np.nan)
+    values = np.vstack([seq._bytes for seq in seqs])
+    return scipy.spatial.distance.pdist(values, 'hamming')
+
+
+def _pairwise_kmer_distance(seqs, k, overlap=True):
+    """Compute the kmer distances between all pairs of sequences
+
+    Returns the distances in condensed form, in the order of
+    ``scipy.spatial.distance.pdist``. The kmers of each sequence are
+    extracted once, and the number of kmers shared by each pair of sequences
+    is computed as a product of sparse kmer incidence matrices, a block of
+    rows at a time.
+
+    """
+    if k < 1:
+        raise ValueError("k must be greater than 0.")
+    for seq in seqs:
+        _check_seqs(seqs[0], seq)
+
+    step = 1 if overlap else k
+    kmer_ids = {}
+    rows, cols = [], []
+    for row, seq in enumerate(seqs):
+        seq = str(seq)
+        kmers = {seq[i:i + k] for i in range(0, len(seq) - k + 1, step)}
+        rows.extend([row] * len(kmers))
+        cols.extend(kmer_ids.setdefault(kmer, len(kmer_ids))
+                    for kmer in kmers)
+    num_seqs = len(seqs)
+    incidence = scipy.sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(num_seqs, len(kmer_ids)))
+    sizes = np.bincount(rows, minlength=num_seqs)
+
+    distances = np.empty(num_seqs * (num_seqs - 1) // 2)
+    block_size = max(1, 2 ** 22 // max(num_seqs, 1))
+    position = 0
+    for start in range(0, num_seqs - 1, block_size):
+        stop = min(start + block_size, num_seqs - 1)
+        shared = incidence[start:stop].dot(incidence.T).toarray()
+        for i in range(start, stop):
+            shared_i = shared[i - start, i + 1:]
+            union = sizes[i] + sizes[i + 1:] - shared_i
+            with np.errstate(divide='ignore', invalid='ignore'):
+                distances[position:position + len(union)] = np.where(
+                    union > 0, (union - shared_i) / union, np.nan)
+            position += len(union)
+    return distances
+
+
+def _get_pairwise_metric_map():
+    """Implementations of sequence distance metrics for all pairs at once
+
+    Each function takes a list of sequences and the metric-specific
+    parameters of the corresponding pairwise function, and returns the
+    distances between all pairs of sequences in condensed form.
+
+    """
+    return {
+        hamming: _pairwise_hamming,
+        kmer_distance: _pairwise_kmer_distance}
@@ -13,7 +13,9 @@ import numpy as np
 import numpy.testing as npt
 
 from skbio import Sequence, DNA
-from skbio.sequence.distance import hamming, kmer_distance
+from skbio.sequence.distance import (hamming, kmer_distance,
+                                     _pairwise_hamming,
+                                     _pairwise_kmer_distance)
 
 
 class TestHamming(unittest.TestCase):
@@ -230,5 +232,47 @@ class TestKmerDistance(unittest.TestCase):
             kmer_distance(seq1, seq2, 3)
 
 
+class TestPairwiseHamming(unittest.TestCase):
+    def test_matches_hamming(self):
+        seqs = [Sequence('AGGGTA'), Sequence('CGTTTA'), Sequence('AGGGTA'),
+                Sequence('TTTTTT', metadata={'id': 'x'})]
+        exp = [hamming(a, b) for a, b in itertools.combinations(seqs, 2)]
+        npt.assert_almost_equal(_pairwise_hamming(seqs), exp)
+
+    def test_empty_sequences(self):
+        obs = _pairwise_hamming([Sequence(''), Sequence(''), Sequence('')])
+        npt.assert_equal(obs, [np.nan] * 3)
+
+    def test_single_sequence(self):
+        self.assertEqual(_pairwise_hamming([DNA('ACGT')]).shape, (0,))
+
+    def test_errors(self):
+        with self.assertRaisesRegex(TypeError, "not 'str'"):
+            _pairwise_hamming([Sequence('abc'), 'abc'])
+        with self.assertRaisesRegex(TypeError, 'Sequence.*DNA'):
+            _pairwise_hamming([Sequence('ACGT'), DNA('ACGT')])
+        with self.assertRaisesRegex(ValueError, 'equal length'):
+            _pairwise_hamming([Sequence('ACGT'), Sequence('AC')])
+
+
+class TestPairwiseKmerDistance(unittest.TestCase):
+    def test_matches_kmer_distance(self):
+        seqs = [DNA('ATCGGCGAT'), DNA('GCAGATGTG'), DNA('ATCG'), DNA(''),
+                DNA('ATCGGCGAT', metadata={'id': 'x'})]
+        for k, overlap in ((3, True), (2, False), (1, True)):
+            exp = [kmer_distance(a, b, k, overlap=overlap)
+                   for a, b in itertools.combinations(seqs, 2)]
+            obs = _pairwise_kmer_distance(seqs, k, overlap=overlap)
+            npt.assert_almost_equal(obs, exp)
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ValueError, 'k'):
+            _pairwise_kmer_distance([DNA('ACGT'), DNA('ACGT')], 0)
+        with self.assertRaisesRegex(TypeError, "not 'str'"):
+            _pairwise_kmer_distance([Sequence('ATCG'), 'ATCG'], 3)
+        with self.assertRaisesRegex(TypeError, 'Sequence.*DNA'):
+            _pairwise_kmer_distance([Sequence('ATCG'), DNA('ATCG')], 3)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -7,6 +7,7 @@
 # ----------------------------------------------------------------------------
 
 import sys
+import multiprocessing
 from heapq import heappush, heappop
 from collections import defaultdict
 from copy import copy
@@ -14,6 +15,7 @@ from copy import copy
 import numpy as np
 
 from skbio.util._decorator import experimental
+from skbio.util._parallel import _resolve_n_jobs
 from .__subsample import _subsample_counts_without_replacement
 
 
@@ -181,6 +183,7 @@ def subsample_counts(counts, n, replace=False):
     See Also
     --------
     isubsample
+    rarefy
     skbio.diversity.alpha
 
     Notes
@@ -245,3 +248,213 @@ def subsample_counts(counts, n, replace=False):
             result = _subsample_counts_without_replacement(counts, n,
                                                            counts_sum)
     return result
+
+
+@experimental(as_of="0.5.1")
+def rarefy(counts, depth, iterations=1, replace=False, seed=None, n_jobs=1):
+    """Randomly subsample every sample of a counts matrix to the same depth.
+
+    Parameters
+    ----------
+    counts : 2-D array_like
+        Matrix of counts (integers) where rows are samples and columns are
+        OTUs.
+    depth : int
+        Number of items to subsample from each sample. Must be less than or
+        equal to the sum of the counts of every sample.
+    iterations : int, optional
+        Number of independent draws to perform for each sample.
+    replace : bool, optional
+        If ``True``, subsample with replacement. If ``False`` (the default),
+        subsample without replacement.
+    seed : int or 1-D array_like of int, optional
+        Seed for the random number generators. If an int, the generator of
+        each sample is seeded with ``seed`` and the index of the sample. If an
+        array_like, it must provide one seed per sample. If ``None`` (the
+        default), the seeds are drawn from NumPy's global random state, so
+        ``np.random.seed`` makes the result reproducible.
+    n_jobs : int, optional
+        Number of processes to use. ``-1`` uses all CPUs.
+
+    Returns
+    -------
+    ndarray
+        Array of shape ``(iterations, n_samples, n_otus)`` where
+        ``result[i, j]`` is the subsampled vector of counts of sample ``j``
+        in iteration ``i``. Each of these vectors sums to `depth`.
+
+    Raises
+    ------
+    TypeError
+        If `counts` cannot be safely converted to an integer datatype.
+    ValueError
+        If `counts` is not 2-D or contains negative values, if `depth` is
+        negative or greater than the sum of the counts of a sample, if
+        `iterations` is less than one, or if the number of seeds does not
+        match the number of samples.
+
+    See Also
+    --------
+    subsample_counts
+
+    Notes
+    -----
+    Without replacement, each draw is sampled from the multivariate
+    hypergeometric distribution one OTU at a time: the number of items drawn
+    from an OTU follows a hypergeometric distribution given the items not yet
+    drawn and the counts of the OTUs not yet visited. Unlike
+    ``subsample_counts``, the individual items are never expanded into an
+    array of length ``counts.sum()``, so memory usage does not depend on the
+    depth of the samples, and all iterations of a sample are drawn together.
+    With replacement, the draws are multinomial.
+
+    Each sample is subsampled using its own random number generator, so the
+    draws of a sample depend only on its counts and its seed, and not on
+    `n_jobs` or the other samples in the matrix.
+
+    Examples
+    --------
+    Subsample each of two samples to a depth of 5, three times:
+
+    >>> import numpy as np
+    >>> from skbio.stats import rarefy
+    >>> counts = np.array([[4, 5, 0, 2, 1],
+    ...                    [0, 3, 3, 0, 9]])
+    >>> rarefied = rarefy(counts, 5, iterations=3, seed=42)
+    >>> rarefied.shape
+    (3, 2, 5)
+    >>> rarefied.sum(axis=2)
+    array([[5, 5],
+           [5, 5],
+           [5, 5]])
+
+    Subsampling a sample to its own depth (without replacement) returns its
+    counts:
+
+    >>> rarefy([[0, 3, 0, 1]], 4)
+    array([[[0, 3, 0, 1]]])
+
+    """
+    counts = np.asarray(counts)
+    counts = counts.astype(int, casting='safe')
+
+    if counts.ndim != 2:
+        raise ValueError("Only 2-D matrices are supported.")
+    if (counts < 0).any():
+        raise ValueError("Counts cannot be negative.")
+    if depth < 0:
+        raise ValueError("depth cannot be negative.")
+    if iterations < 1:
+        raise ValueError("iterations must be at least 1.")
+
+    too_shallow = counts.sum(axis=1) < depth
+    if too_shallow.any():
+        raise ValueError("Cannot subsample more items than exist in the "
+                         "input counts matrix: %d sample(s) have fewer than "
+                         "%d items." % (too_shallow.sum(), depth))
+
+    n_samples = counts.shape[0]
+    seeds = _sample_seeds(seed, n_samples)
+
+    n_jobs = _resolve_n_jobs(n_jobs)
+    if n_jobs == 1 or n_samples < 2:
+        return _rarefy_rows(counts, seeds, depth, iterations, replace)
+
+    n_chunks = min(n_samples, 4 * n_jobs)
+    bounds = np.linspace(0, n_samples, n_chunks + 1).astype(int)
+    tasks = [(counts[start:stop], seeds[start:stop], depth, iterations,
+              replace) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    pool = multiprocessing.Pool(n_jobs)
+    try:
+        results = pool.starmap(_rarefy_rows, tasks)
+    finally:
+        pool.terminate()
+    return np.concatenate(results, axis=1)
+
+
+def _sample_seeds(seed, n_samples):
+    """Get the seed of the random number generator of each sample
+
+    See ``rarefy`` for the accepted values of `seed`.
+
+    """
+    if seed is None:
+        # the bound fits in a C long on all platforms, so that no dtype needs
+        # to be passed to randint
+        return np.random.randint(2 ** 31 - 1, size=n_samples)
+    elif np.ndim(seed) == 0:
+        return [[seed, i] for i in range(n_samples)]
+
+    seeds = list(seed)
+    if len(seeds) != n_samples:
+        raise ValueError("Number of seeds (%d) must match the number of "
+                         "samples (%d)." % (len(seeds), n_samples))
+    return seeds
+
+
+def _rarefy_rows(counts, seeds, depth, iterations, replace):
+    """Subsample each row of a counts matrix using its own seed"""
+    result = np.zeros((iterations,) + counts.shape, dtype=int)
+    for i, (row, seed) in enumerate(zip(counts, seeds)):
+        random_state = np.random.RandomState(seed)
+        result[:, i] = _rarefy_row(row, depth, iterations, replace,
+                                   random_state)
+    return result
+
+
+def _rarefy_row(counts, depth, iterations, replace, random_state):
+    """Draw `iterations` subsamples of a single vector of counts"""
+    result = np.zeros((iterations, len(counts)), dtype=int)
+    observed = np.flatnonzero(counts)
+    if depth == 0 or observed.size == 0:
+        return result
+
+    counts_sum = counts.sum()
+    if replace:
+        probs = counts[observed] / counts_sum
+        result[:, observed] = random_state.multinomial(depth, probs,
+                                                       size=iterations)
+        return result
+    if depth == counts_sum:
+        result[:] = counts
+        return result
+    return _subsample_rows(np.tile(counts, (iterations, 1)), depth,
+                           random_state)
+
+
+def _subsample_rows(counts, depth, random_state):
+    """Subsample each row of a counts matrix to `depth`, without replacement
+
+    Each row must sum to at least `depth`.
+
+    """
+    result = np.zeros_like(counts)
+    observed = np.flatnonzero(counts.any(axis=0))
+    if depth == 0 or observed.size == 0:
+        return result
+
+    # Visit the observed OTUs in turn, drawing for every row at once how many
+    # of the items still to be drawn come from the current OTU rather than
+    # from the OTUs that have not been visited yet. The last OTU receives
+    # whatever remains.
+    remaining = np.full(len(counts), depth, dtype=counts.dtype)
+    unvisited_sum = counts.sum(axis=1)
+    for otu in observed[:-1]:
+        active = np.flatnonzero(remaining)
+        if active.size == 0:
+            break
+        otu_counts = counts[active, otu]
+        unvisited_sum[active] -= otu_counts
+        others = unvisited_sum[active]
+        # every remaining item comes from the current OTU once the other OTUs
+        # are exhausted, and none does if it is empty. Older versions of
+        # numpy reject these cases in hypergeometric
+        drawn = np.where(others == 0, remaining[active], 0)
+        mixed = (otu_counts > 0) & (others > 0)
+        drawn[mixed] = random_state.hypergeometric(
+            otu_counts[mixed], others[mixed], remaining[active][mixed])
+        result[active, otu] = drawn
+        remaining[active] -= drawn
+    result[:, observed[-1]] = remaining
+    return result
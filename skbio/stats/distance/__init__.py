@@ -154,6 +154,8 @@ Categorical Variable Stats
 
    anosim
    permanova
+   adonis
+   permdisp
 
 Continuous Variable Stats
 ^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -194,11 +196,13 @@ from ._base import (DissimilarityMatrixError, DistanceMatrixError,
                     randdm)
 from ._bioenv import bioenv
 from ._anosim import anosim
-from ._permanova import permanova
+from ._permanova import permanova, adonis
+from ._permdisp import permdisp
 from ._mantel import mantel, pwmantel
 
 __all__ = ['DissimilarityMatrixError', 'DistanceMatrixError', 'MissingIDError',
            'DissimilarityMatrix', 'DistanceMatrix', 'randdm', 'anosim',
-           'permanova', 'bioenv', 'mantel', 'pwmantel']
+           'permanova', 'adonis', 'permdisp', 'bioenv', 'mantel',
+           'pwmantel']
 
 test = TestRunner(__file__).test
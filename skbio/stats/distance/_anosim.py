@@ -9,14 +9,17 @@
 from functools import partial
 
 import numpy as np
+from scipy.spatial.distance import squareform
 from scipy.stats import rankdata
 
-from ._base import (_preprocess_input, _run_monte_carlo_stats, _build_results)
+from ._base import (_preprocess_input, _run_monte_carlo_stats, _build_results,
+                    _permutation_batch_elements)
 from skbio.util._decorator import experimental
 
 
 @experimental(as_of="0.4.0")
-def anosim(distance_matrix, grouping, column=None, permutations=999):
+def anosim(distance_matrix, grouping, column=None, permutations=999,
+           random_state=None, n_jobs=1):
     """Test for significant differences between groups using ANOSIM.
 
     Analysis of Similarities (ANOSIM) is a non-parametric method that tests
@@ -58,6 +61,13 @@ def anosim(distance_matrix, grouping, column=None, permutations=999):
         significance. Must be greater than or equal to zero. If zero,
         statistical significance calculations will be skipped and the p-value
         will be ``np.nan``.
+    random_state : int or np.random.RandomState, optional
+        Seed or random state used to draw the permutations. If ``None`` (the
+        default), permutations are drawn from NumPy's global random state.
+    n_jobs : int, optional
+        Number of processes used to evaluate the permutations. ``-1`` uses all
+        CPUs. For a given `random_state`, the result doesn't depend on
+        `n_jobs`.
 
     Returns
     -------
@@ -75,6 +85,13 @@ def anosim(distance_matrix, grouping, column=None, permutations=999):
     interface are similar to ``vegan::anosim``, available in R's vegan package
     [2]_.
 
+    The distances are ranked once. The sum of the ranks of the distances
+    within groups is then computed for a batch of permutations at once, as
+    the product of the matrix of ranks with an indicator matrix of the groups
+    of each permutation (see ``permanova``). As the number of pairs of
+    objects within groups doesn't depend on the permutation, it is also
+    computed once.
+
     The p-value will be ``np.nan`` if `permutations` is zero.
 
     References
@@ -167,38 +184,48 @@ def anosim(distance_matrix, grouping, column=None, permutations=999):
     *must* be present in the ``DataFrame`` or an error will be raised.
 
     """
-    sample_size, num_groups, grouping, tri_idxs, distances = _preprocess_input(
+    sample_size, num_groups, grouping, distances = _preprocess_input(
         distance_matrix, grouping, column)
 
     divisor = sample_size * ((sample_size - 1) / 4)
-    ranked_dists = rankdata(distances, method='average')
-
-    test_stat_function = partial(_compute_r_stat, tri_idxs, ranked_dists,
-                                 divisor)
+    ranked_dists = squareform(rankdata(distances, method='average'),
+                              force='tomatrix', checks=False)
+    group_sizes = np.bincount(grouping)
+    num_within = (group_sizes * (group_sizes - 1)).sum() // 2
+
+    test_stat_function = partial(_compute_r_stat, sample_size, num_groups,
+                                 ranked_dists, num_within, divisor)
+    batch_size = max(1, _permutation_batch_elements //
+                     (sample_size * num_groups))
     stat, p_value = _run_monte_carlo_stats(test_stat_function, grouping,
-                                           permutations)
+                                           permutations, random_state, n_jobs,
+                                           batch_size)
 
     return _build_results('ANOSIM', 'R', sample_size, num_groups, stat,
                           p_value, permutations)
 
 
-def _compute_r_stat(tri_idxs, ranked_dists, divisor, grouping):
-    """Compute ANOSIM R statistic (between -1 and +1)."""
-    # Create a matrix where True means that the two objects are in the same
-    # group. This ufunc requires that grouping is a numeric vector (e.g., it
-    # won't work with a grouping vector of strings).
-    grouping_matrix = np.equal.outer(grouping, grouping)
-
-    # Extract upper triangle from the grouping matrix. It is important to
-    # extract the values in the same order that the distances are extracted
-    # from the distance matrix (see ranked_dists). Extracting the upper
-    # triangle (excluding the diagonal) preserves this order.
-    grouping_tri = grouping_matrix[tri_idxs]
-
-    # within
-    r_W = np.mean(ranked_dists[grouping_tri])
-
-    # between
-    r_B = np.mean(ranked_dists[np.invert(grouping_tri)])
+def _compute_r_stat(sample_size, num_groups, ranked_dists, num_within,
+                    divisor, groupings):
+    """Compute ANOSIM R statistic (between -1 and +1) of each grouping."""
+    # Sum the ranks of the distances within each group with a single product
+    # of the matrix of ranks with an indicator matrix that has a column per
+    # grouping vector and group, like PERMANOVA does with squared distances.
+    num_groupings = len(groupings)
+    indicators = np.zeros((sample_size, num_groupings, num_groups))
+    indicators[np.arange(sample_size)[:, np.newaxis],
+               np.arange(num_groupings), groupings.T] = 1
+    indicators = indicators.reshape(sample_size, -1)
+    within = (indicators * ranked_dists.dot(indicators)).sum(axis=0)
+
+    # within, where each pair of objects is counted twice by the sums above
+    r_W_sum = within.reshape(num_groupings, num_groups).sum(axis=1) / 2
+    r_W = r_W_sum / num_within
+
+    # between, where the ranks of all pairs sum to the same value as the
+    # ranks 1 to num_pairs (average ranks of ties included)
+    num_pairs = sample_size * (sample_size - 1) // 2
+    r_B = ((num_pairs * (num_pairs + 1) / 2 - r_W_sum) /
+           (num_pairs - num_within))
 
     return (r_B - r_W) / divisor
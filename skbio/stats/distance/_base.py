@@ -6,7 +6,9 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import functools
 import itertools
+import multiprocessing
 from copy import deepcopy
 
 import matplotlib.pyplot as plt
@@ -17,10 +19,12 @@ import pandas as pd
 from scipy.spatial.distance import squareform
 
 from skbio._base import SkbioObject
+from skbio.sequence.distance import _get_pairwise_metric_map
 from skbio.stats._misc import _pprint_strs
 from skbio.util import find_duplicates
 from skbio.util._decorator import experimental, classonlymethod
 from skbio.util._misc import resolve_key
+from skbio.util._parallel import _resolve_n_jobs
 
 
 class DissimilarityMatrixError(Exception):
@@ -64,12 +68,22 @@ class DissimilarityMatrix(SkbioObject):
         instead be a `DissimilarityMatrix` (or subclass) instance,
         in which case the instance's data will be used.
         Data will be converted to a float ``dtype`` if necessary. A copy will
-        *not* be made if already a ``numpy.ndarray`` with a float ``dtype``.
+        *not* be made if already a ``numpy.ndarray`` with a float ``dtype``
+        (a `DistanceMatrix` copies a writeable one, see its Notes).
     ids : sequence of str, optional
         Sequence of strings to be used as object IDs. Must match the number of
         rows/cols in `data`. If ``None`` (the default), IDs will be
         monotonically-increasing integers cast as strings, with numbering
         starting from zero, e.g., ``('0', '1', '2', '3', ...)``.
+    validate : bool, optional
+        If ``False``, the dissimilarities are trusted and the checks of their
+        values (e.g., for symmetry and hollowness in `DistanceMatrix`) are
+        skipped, so that a float ``numpy.ndarray`` is used without any pass
+        over it (other than the copy `DistanceMatrix` makes of a writeable
+        one). The shape of `data` and the IDs are always checked. The
+        values of the data of a `DissimilarityMatrix` are not checked again
+        if they can't have been modified since they were checked (e.g., if
+        they are read-only).
 
     See Also
     --------
@@ -93,20 +107,40 @@ class DissimilarityMatrix(SkbioObject):
     _matrix_element_name = 'dissimilarity'
 
     @experimental(as_of="0.4.0")
-    def __init__(self, data, ids=None):
+    def __init__(self, data, ids=None, validate=True):
+        # whether the dissimilarities are known to be symmetric and hollow,
+        # in which case a DistanceMatrix doesn't check them again
+        symmetric = False
         if isinstance(data, DissimilarityMatrix):
             ids = data.ids if ids is None else ids
+            symmetric = data._values_trusted()
             data = data.data
+        source = data
         data = np.asarray(data, dtype='float')
         if data.ndim == 1:
+            # the redundant form of condensed dissimilarities is symmetric and
+            # hollow, but NaNs still need to be detected
+            symmetric = not (validate and np.isnan(data).any())
             data = squareform(data, force='tomatrix', checks=False)
         if ids is None:
             ids = (str(i) for i in range(data.shape[0]))
         ids = tuple(ids)
 
         self._validate(data, ids)
+        if validate and not symmetric:
+            self._validate_values(data)
+
+        if isinstance(self, DistanceMatrix) and not _is_frozen(data):
+            # the distances are made read-only, so that they can't be modified
+            # after they have been validated or converted to condensed form,
+            # but the caller's array is copied rather than frozen
+            if data.base is not None or np.may_share_memory(data, source):
+                data = data.copy()
+            data.flags.writeable = False
 
         self._data = data
+        self._condensed = None
+        self._symmetric = symmetric or isinstance(self, DistanceMatrix)
         self._ids = ids
         self._id_index = self._index_list(self._ids)
 
@@ -173,7 +207,17 @@ class DissimilarityMatrix(SkbioObject):
         -----
         This property is not writeable.
 
+        If the dissimilarities are stored in condensed form (see
+        ``DistanceMatrix.from_condensed``), the square array is constructed in
+        memory, with the ``dtype`` of the stored dissimilarities, the first
+        time this property is accessed, and kept afterwards. It is read-only,
+        so that it stays consistent with the stored dissimilarities.
+
         """
+        if self._data is None:
+            data = _condensed_to_redundant(self._condensed)
+            data.flags.writeable = False
+            self._data = data
         return self._data
 
     @property
@@ -194,7 +238,8 @@ class DissimilarityMatrix(SkbioObject):
     @ids.setter
     def ids(self, ids_):
         ids_ = tuple(ids_)
-        self._validate(self.data, ids_)
+        # the data have already been validated
+        self._validate_ids(ids_, self.shape[0])
         self._ids = ids_
         self._id_index = self._index_list(self._ids)
 
@@ -202,6 +247,8 @@ class DissimilarityMatrix(SkbioObject):
     @experimental(as_of="0.4.0")
     def dtype(self):
         """Data type of the dissimilarities."""
+        if self._data is None:
+            return self._condensed.dtype
         return self.data.dtype
 
     @property
@@ -215,7 +262,7 @@ class DissimilarityMatrix(SkbioObject):
         entries will always be equal.
 
         """
-        return self.data.shape
+        return (len(self._ids),) * 2
 
     @property
     @experimental(as_of="0.4.0")
@@ -227,7 +274,7 @@ class DissimilarityMatrix(SkbioObject):
         Equivalent to ``self.shape[0] * self.shape[1]``.
 
         """
-        return self.data.size
+        return self.shape[0] * self.shape[1]
 
     @property
     @experimental(as_of="0.4.0")
@@ -256,7 +303,91 @@ class DissimilarityMatrix(SkbioObject):
             `self`.
 
         """
-        return self.__class__(self.data.T.copy(), deepcopy(self.ids))
+        return self.__class__(self.data.T.copy(), deepcopy(self.ids),
+                              validate=not self._values_trusted())
+
+    @experimental(as_of="0.5.1")
+    def lookup(self, ids, other_ids=None):
+        """Return the dissimilarities between many pairs of IDs at once.
+
+        Parameters
+        ----------
+        ids : iterable of str, or iterable of pairs of str
+            If `other_ids` is provided, the IDs of the first object of each
+            pair. Otherwise, the pairs of IDs (e.g., tuples of two IDs).
+        other_ids : iterable of str, optional
+            The IDs of the second object of each pair. Must have the same
+            length as `ids`.
+
+        Returns
+        -------
+        ndarray
+            One-dimensional ``numpy.ndarray`` containing the dissimilarity
+            between the objects of each pair, in the order of the pairs.
+
+        Raises
+        ------
+        MissingIDError
+            If an ID is not in the dissimilarity matrix.
+        ValueError
+            If `ids` and `other_ids` don't have the same length, or if `ids`
+            doesn't contain pairs of IDs.
+
+        See Also
+        --------
+        __getitem__
+
+        Notes
+        -----
+        This is equivalent to looking up each pair of IDs with
+        ``dm[id1, id2]``, but the dissimilarities are gathered from the data
+        array at once. If the distances of a `DistanceMatrix` are stored in
+        condensed form (see ``DistanceMatrix.from_condensed``), they are
+        gathered from the condensed form.
+
+        Examples
+        --------
+        >>> from skbio import DistanceMatrix
+        >>> dm = DistanceMatrix([[0, 1, 2],
+        ...                      [1, 0, 3],
+        ...                      [2, 3, 0]], ids=['a', 'b', 'c'])
+        >>> dm.lookup([('a', 'b'), ('c', 'b'), ('c', 'c')]).tolist()
+        [1.0, 3.0, 0.0]
+        >>> dm.lookup(['a', 'c'], ['b', 'b']).tolist()
+        [1.0, 3.0]
+
+        """
+        if other_ids is None:
+            pairs = list(ids)
+            if any(len(pair) != 2 for pair in pairs):
+                raise ValueError("`ids` must contain pairs of IDs if "
+                                 "`other_ids` isn't provided.")
+            ids = [pair[0] for pair in pairs]
+            other_ids = [pair[1] for pair in pairs]
+        else:
+            ids, other_ids = list(ids), list(other_ids)
+            if len(ids) != len(other_ids):
+                raise ValueError(
+                    "`ids` and `other_ids` must have the same length (%d != "
+                    "%d)." % (len(ids), len(other_ids)))
+
+        rows = self._indices(ids)
+        cols = self._indices(other_ids)
+        if self._data is None:
+            return _condensed_elements(self._condensed, self.shape[0], rows,
+                                       cols)
+        return self.data[rows, cols]
+
+    def _indices(self, lookup_ids):
+        """Return the indices of IDs as an array"""
+        id_index = self._id_index
+        try:
+            return np.array([id_index[id_] for id_ in lookup_ids],
+                            dtype=np.intp)
+        except (KeyError, TypeError):
+            for id_ in lookup_ids:
+                self.index(id_)
+            raise
 
     @experimental(as_of="0.4.0")
     def index(self, lookup_id):
@@ -287,8 +418,10 @@ class DissimilarityMatrix(SkbioObject):
     def redundant_form(self):
         """Return an array of dissimilarities in redundant format.
 
-        As this is the native format that the dissimilarities are stored in,
-        this is simply an alias for `data`.
+        Unless the dissimilarities are stored in condensed form (see
+        ``DistanceMatrix.from_condensed``), this is the native format that
+        the dissimilarities are stored in, and this is simply an alias for
+        `data`.
 
         Returns
         -------
@@ -300,7 +433,9 @@ class DissimilarityMatrix(SkbioObject):
         -----
         Redundant format is described in [1]_.
 
-        Does *not* return a copy of the data.
+        Does *not* return a copy of the data. If the dissimilarities are
+        stored in condensed form, the redundant form is only constructed the
+        first time it is requested.
 
         References
         ----------
@@ -322,10 +457,16 @@ class DissimilarityMatrix(SkbioObject):
         """
         # We deepcopy IDs in case the tuple contains mutable objects at some
         # point in the future.
-        return self.__class__(self.data.copy(), deepcopy(self.ids))
+        if self._data is None:
+            # the copy of condensed distances is made in memory
+            return self.__class__.from_condensed(np.array(self._condensed),
+                                                 deepcopy(self.ids),
+                                                 validate=False)
+        return self.__class__(self.data.copy(), deepcopy(self.ids),
+                              validate=not self._values_trusted())
 
     @experimental(as_of="0.4.0")
-    def filter(self, ids, strict=True):
+    def filter(self, ids, strict=True, copy=True):
         """Filter the dissimilarity matrix by IDs.
 
         Parameters
@@ -337,6 +478,12 @@ class DissimilarityMatrix(SkbioObject):
             If `strict` is ``True`` and an ID that is not found in the distance
             matrix is found in `ids`, a ``MissingIDError`` exception will be
             raised, otherwise the ID will be ignored.
+        copy : bool, optional
+            If ``False`` and the IDs to retain are in the same order as in the
+            dissimilarity matrix and evenly spaced in it (e.g., a contiguous
+            range of IDs), the dissimilarities of the filtered dissimilarity
+            matrix are a read-only view of the dissimilarities of this one.
+            Otherwise, they are copied.
 
         Returns
         -------
@@ -348,6 +495,13 @@ class DissimilarityMatrix(SkbioObject):
         ------
         MissingIDError
             If an ID in `ids` is not in the object's list of IDs.
+
+        Notes
+        -----
+        The filtered dissimilarities are copied at once, and are not validated
+        again unless the dissimilarities of this dissimilarity matrix might
+        have been modified since they were validated.
+
         """
         if strict:
             idxs = [self.index(id_) for id_ in ids]
@@ -364,8 +518,19 @@ class DissimilarityMatrix(SkbioObject):
                     pass
             ids = found_ids
 
-        filtered_data = self._data[idxs][:, idxs]
-        return self.__class__(filtered_data, ids)
+        if self._data is None:
+            return self.__class__.from_condensed(
+                _filter_condensed(self._condensed, self.shape[0], idxs), ids,
+                validate=False)
+        step = None if copy else _index_step(idxs)
+        if step is not None:
+            stop = idxs[-1] + 1
+            filtered_data = self.data[idxs[0]:stop:step, idxs[0]:stop:step]
+            filtered_data.flags.writeable = False
+        else:
+            filtered_data = self.data[np.ix_(idxs, idxs)]
+        return self.__class__(filtered_data, ids,
+                              validate=not self._values_trusted())
 
     @experimental(as_of="0.4.0")
     def plot(self, cmap=None, title=""):
@@ -539,6 +704,13 @@ class DissimilarityMatrix(SkbioObject):
                 equal = False
             elif self.ids != other.ids:
                 equal = False
+            elif ((self._data is None or other._data is None) and
+                  isinstance(self, DistanceMatrix) and
+                  isinstance(other, DistanceMatrix)):
+                # compare condensed distances without constructing the
+                # redundant form
+                equal = np.array_equal(self.condensed_form(),
+                                       other.condensed_form())
             elif not np.array_equal(self.data, other.data):
                 equal = False
         except AttributeError:
@@ -636,7 +808,28 @@ class DissimilarityMatrix(SkbioObject):
         -----
         The lookup based on ID(s) is quick.
 
+        If the dissimilarities are stored in condensed form (see
+        ``DistanceMatrix.from_condensed``), rows (looked up by ID or by an
+        integer index) and pairs of IDs are read from the condensed form,
+        without constructing the redundant form. Other indices construct the
+        redundant form.
+
         """
+        if self._data is None:
+            if isinstance(index, str):
+                return _condensed_row(self._condensed, self.shape[0],
+                                      self.index(index))
+            elif self._is_id_pair(index):
+                return _condensed_element(self._condensed, self.shape[0],
+                                          self.index(index[0]),
+                                          self.index(index[1]))
+            elif isinstance(index, (int, np.integer)):
+                n = self.shape[0]
+                if not -n <= index < n:
+                    raise IndexError("index %d is out of bounds for a matrix "
+                                     "with %d rows" % (index, n))
+                return _condensed_row(self._condensed, n, index % n)
+
         if isinstance(index, str):
             return self.data[self.index(index)]
         elif self._is_id_pair(index):
@@ -644,6 +837,18 @@ class DissimilarityMatrix(SkbioObject):
         else:
             return self.data.__getitem__(index)
 
+    def _values_trusted(self):
+        """Whether the values of the data are known to be valid
+
+        The values checked (or trusted) when the dissimilarity matrix was
+        created are only known to still be valid if they can't have been
+        modified since, i.e., if they are stored in condensed form or in a
+        read-only array.
+
+        """
+        return self._symmetric and (self._data is None or
+                                    _is_frozen(self._data))
+
     def _validate(self, data, ids):
         """Validate the data array and IDs.
 
@@ -675,17 +880,32 @@ class DissimilarityMatrix(SkbioObject):
         if data.dtype != np.double:
             raise DissimilarityMatrixError("Data must contain only floating "
                                            "point values.")
+        self._validate_ids(ids, data.shape[0])
+
+    def _validate_values(self, data):
+        """Validate the values of the data array.
+
+        Called after `_validate` unless the data are trusted (i.e., created
+        with ``validate=False``) or known to be valid (e.g., the read-only
+        data of another `DistanceMatrix`). Dissimilarities can have any
+        values, so this method does nothing, but subclasses can override it
+        (e.g., see `DistanceMatrix`).
+
+        """
+        pass
+
+    def _validate_ids(self, ids, n):
+        """Validate that IDs are unique and that there are ``n`` of them"""
         duplicates = find_duplicates(ids)
         if duplicates:
             formatted_duplicates = ', '.join(repr(e) for e in duplicates)
             raise DissimilarityMatrixError("IDs must be unique. Found the "
                                            "following duplicate IDs: %s" %
                                            formatted_duplicates)
-        if len(ids) != data.shape[0]:
+        if len(ids) != n:
             raise DissimilarityMatrixError("The number of IDs (%d) must match "
                                            "the number of rows/columns in the "
-                                           "data (%d)." %
-                                           (len(ids), data.shape[0]))
+                                           "data (%d)." % (len(ids), n))
 
     def _index_list(self, list_):
         return {id_: idx for idx, id_ in enumerate(list_)}
@@ -714,6 +934,17 @@ class DistanceMatrix(DissimilarityMatrix):
     distances can be retrieved in condensed (vector-form) format using
     `condensed_form`.
 
+    The distances are read-only. If `data` is a writeable ``numpy.ndarray``
+    (or the data of a `DissimilarityMatrix`), it is copied, so that the
+    distances can't be modified once they have been validated. A read-only
+    ``numpy.ndarray`` of floats is used without a copy.
+
+    Alternatively, a `DistanceMatrix` created with `from_condensed` stores
+    its distances in condensed format, as single or double precision floats,
+    optionally in a memory-mapped file. The redundant format is then only
+    constructed when it is needed (e.g., when accessing `data`), which
+    divides the memory used by large distance matrices by at least two.
+
     `DistanceMatrix` only requires that the distances it stores are symmetric.
     Checks are *not* performed to ensure the other three metric properties
     hold (non-negativity, identity of indiscernibles, and triangle inequality)
@@ -733,7 +964,7 @@ class DistanceMatrix(DissimilarityMatrix):
     @classonlymethod
     @experimental(as_of="0.4.1")
     def from_iterable(cls, iterable, metric, key=None, keys=None,
-                      validate=True):
+                      validate=True, n_jobs=1):
         """Create DistanceMatrix from all pairs in an iterable given a metric.
 
         Parameters
@@ -753,13 +984,18 @@ class DistanceMatrix(DissimilarityMatrix):
             An iterable of the same length as `iterable`. Each element will be
             used as the respective key.
         validate : boolean, optional
-            If ``True``, all pairwise distances are computed, including upper
-            and lower triangles and the diagonal, and the resulting matrix is
-            validated for symmetry and hollowness. If ``False``, `metric` is
-            assumed to be hollow and symmetric and only the lower triangle
-            (excluding the diagonal) is computed. Pass ``validate=False`` if
-            you are sure `metric` is hollow and symmetric for improved
-            performance.
+            If ``True``, `metric` is also applied to each element and itself,
+            and to each pair of consecutive elements in reverse order, and the
+            resulting matrix is validated for symmetry and hollowness. If
+            ``False``, `metric` is assumed to be hollow and symmetric and is
+            not applied to these additional pairs. In both cases, `metric` is
+            applied once to each pair of distinct elements (i.e., to compute
+            the lower triangle of the distance matrix).
+        n_jobs : int, optional
+            Number of processes used to apply `metric`, to blocks of rows of
+            the distance matrix. ``-1`` uses all CPUs. If greater than 1,
+            `metric` and the elements of `iterable` must be picklable (e.g.,
+            `metric` cannot be a lambda).
 
         Returns
         -------
@@ -771,15 +1007,21 @@ class DistanceMatrix(DissimilarityMatrix):
         ValueError
             If `key` and `keys` are both provided.
 
-        """
-        if validate:
-            return super(DistanceMatrix, cls).from_iterable(iterable, metric,
-                                                            key, keys)
+        Notes
+        -----
+        If `metric` is ``skbio.sequence.distance.hamming`` or
+        ``skbio.sequence.distance.kmer_distance`` (or a ``functools.partial``
+        of it, e.g. to set ``k``), the distances between all pairs of
+        sequences are computed at once, rather than a pair at a time, and
+        `n_jobs` is ignored. These metrics are hollow and symmetric, so
+        `validate` only checks that the distances are defined.
 
+        """
         iterable = list(iterable)
         if key is not None and keys is not None:
             raise ValueError("Cannot use both `key` and `keys` at the same"
                              " time.")
+        n_jobs = _resolve_n_jobs(n_jobs)
 
         keys_ = None
         if key is not None:
@@ -787,10 +1029,51 @@ class DistanceMatrix(DissimilarityMatrix):
         elif keys is not None:
             keys_ = keys
 
-        dm = np.zeros((len(iterable),) * 2)
-        for i, a in enumerate(iterable):
-            for j, b in enumerate(iterable[:i]):
-                dm[i, j] = dm[j, i] = metric(a, b)
+        pairwise_metric = _get_pairwise_metric(metric)
+        if pairwise_metric is not None and iterable:
+            condensed = pairwise_metric(iterable)
+            return cls(squareform(condensed, force='tomatrix', checks=False),
+                       keys_)
+
+        n = len(iterable)
+        # blocks of columns of the lower triangle (i.e., of contiguous
+        # condensed distances), with similar numbers of pairs
+        num_blocks = min(max(n - 1, 1), 4 * n_jobs)
+        cumulative_pairs = np.cumsum(np.arange(n - 1, -1, -1))
+        bounds = np.searchsorted(
+            cumulative_pairs,
+            np.linspace(0, n * (n - 1) // 2, num_blocks + 1)[1:-1]) + 1
+        bounds = ([0] + sorted({b for b in bounds.tolist() if b < n - 1}) +
+                  [max(n - 1, 0)])
+        blocks = list(zip(bounds[:-1], bounds[1:]))
+
+        if n_jobs == 1 or len(blocks) < 2:
+            columns = [_lower_triangle_columns(iterable, metric, *block)
+                       for block in blocks]
+        else:
+            pool = multiprocessing.Pool(
+                min(n_jobs, len(blocks)), initializer=_from_iterable_init,
+                initargs=(iterable, metric))
+            try:
+                columns = pool.starmap(_from_iterable_worker, blocks)
+            finally:
+                pool.terminate()
+
+        dm = np.zeros((n, n))
+        for (start, stop), values in zip(blocks, columns):
+            position = 0
+            for j in range(start, stop):
+                column = values[position:position + n - j - 1]
+                dm[j + 1:, j] = dm[j, j + 1:] = column
+                position += n - j - 1
+
+        if validate:
+            for i, a in enumerate(iterable):
+                dm[i, i] = metric(a, a)
+                # a sample of the upper triangle, in reverse order, so that
+                # asymmetric metrics are detected
+                if i > 0:
+                    dm[i - 1, i] = metric(iterable[i - 1], a)
 
         return cls(dm, keys_)
 
@@ -808,14 +1091,23 @@ class DistanceMatrix(DissimilarityMatrix):
         Condensed format is described in [1]_.
 
         The conversion is not a constant-time operation, though it should be
-        relatively quick to perform.
+        relatively quick to perform. As the distances can't be modified, it is
+        only performed the first time this method is called: the condensed
+        form is cached, and returned as a read-only array by later calls.
+
+        If the distances are stored in condensed form (e.g., in a
+        memory-mapped file), the stored array is returned without a copy.
 
         References
         ----------
         .. [1] http://docs.scipy.org/doc/scipy/reference/spatial.distance.html
 
         """
-        return squareform(self._data, force='tovector', checks=False)
+        if self._condensed is None:
+            condensed = squareform(self._data, force='tovector', checks=False)
+            condensed.flags.writeable = False
+            self._condensed = condensed
+        return self._condensed
 
     @experimental(as_of="0.4.0")
     def permute(self, condensed=False):
@@ -851,22 +1143,145 @@ class DistanceMatrix(DissimilarityMatrix):
 
         """
         order = np.random.permutation(self.shape[0])
-        permuted = self._data[order][:, order]
 
         if condensed:
-            return squareform(permuted, force='tovector', checks=False)
+            return _permute_condensed(self.condensed_form(), self.shape[0],
+                                      order)
         else:
-            return self.__class__(permuted, self.ids)
+            return self.__class__(self.data[np.ix_(order, order)], self.ids,
+                                  validate=not self._values_trusted())
 
-    def _validate(self, data, ids):
-        """Validate the data array and IDs.
+    @classonlymethod
+    @experimental(as_of="0.5.1")
+    def from_condensed(cls, condensed, ids=None, dtype=None, filename=None,
+                       validate=True):
+        """Create a DistanceMatrix that stores distances in condensed form.
+
+        Parameters
+        ----------
+        condensed : 1-D array_like or np.memmap
+            Distances in condensed form, as defined by
+            `scipy.spatial.distance.squareform`. A ``numpy.ndarray`` (e.g., a
+            ``np.memmap``) of a suitable ``dtype`` is stored without a copy.
+        ids : sequence of str, optional
+            Object IDs. If ``None`` (the default), IDs will be
+            monotonically-increasing integers cast as strings, with numbering
+            starting from zero.
+        dtype : {np.float32, np.float64}, optional
+            Floating point type used to store the distances. If ``None`` (the
+            default), single and double precision distances are stored as
+            they are, and other distances are converted to double precision.
+        filename : str, optional
+            If provided, the distances are copied into a new memory-mapped
+            file at this path (overwritten if it exists), which stores them.
+        validate : bool, optional
+            If ``True`` (the default), check that the distances don't contain
+            NaNs, reading them in chunks.
+
+        Returns
+        -------
+        DistanceMatrix
+            Distance matrix storing the distances in condensed form.
+
+        Raises
+        ------
+        DistanceMatrixError
+            If the length of `condensed` doesn't match the number of IDs, if
+            `dtype` isn't a single or double precision floating point type,
+            or if the distances contain NaNs.
+        DissimilarityMatrixError
+            If the IDs aren't unique.
+
+        See Also
+        --------
+        condensed_form
+        redundant_form
 
-        Overrides the superclass `_validate`. Performs a check for symmetry in
-        addition to the checks performed in the superclass.
+        Notes
+        -----
+        The condensed form is symmetric and hollow by construction. The
+        redundant form is constructed in memory, with the ``dtype`` of the
+        stored distances, the first time `data` or `redundant_form` is
+        accessed. Rows (``dm[id_]`` or ``dm[i]``) and distances between pairs
+        of IDs (``dm[id1, id2]``) are read from the condensed form, and
+        `condensed_form` returns the stored distances without a copy.
+        `filter` and `copy` return distance matrices that store their
+        distances in condensed form, in memory.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> from skbio import DistanceMatrix
+        >>> dm = DistanceMatrix.from_condensed([1, 2, 3], ['a', 'b', 'c'],
+        ...                                    dtype=np.float32)
+        >>> dm.dtype
+        dtype('float32')
+        >>> dm['b'].tolist()
+        [1.0, 0.0, 3.0]
+        >>> dm.redundant_form().tolist()
+        [[0.0, 1.0, 2.0], [1.0, 0.0, 3.0], [2.0, 3.0, 0.0]]
 
         """
-        super(DistanceMatrix, self)._validate(data, ids)
+        if dtype is not None:
+            dtype = np.dtype(dtype)
+            if dtype not in (np.float32, np.float64):
+                raise DistanceMatrixError(
+                    "`dtype` must be np.float32 or np.float64, not %r."
+                    % dtype.name)
+        if not isinstance(condensed, np.ndarray):
+            condensed = np.asarray(condensed)
+        if dtype is None:
+            if condensed.dtype in (np.float32, np.float64):
+                dtype = condensed.dtype
+            else:
+                dtype = np.dtype(np.float64)
 
+        if ids is None:
+            n = _condensed_size(len(condensed))
+            ids = (str(i) for i in range(n))
+        ids = tuple(ids)
+        n = len(ids)
+        if n == 0:
+            raise DistanceMatrixError("Data must be at least 1x1 in size.")
+        if condensed.ndim != 1 or len(condensed) != n * (n - 1) // 2:
+            raise DistanceMatrixError(
+                "Condensed distances must be a vector of length n * (n - 1) "
+                "/ 2 for n IDs.")
+
+        if filename is not None:
+            stored = np.memmap(filename, dtype=dtype, mode='w+',
+                               shape=(max(len(condensed), 1),))
+            stored = stored[:len(condensed)]
+            for start in range(0, len(condensed), _condensed_chunk_size):
+                stop = start + _condensed_chunk_size
+                stored[start:stop] = condensed[start:stop]
+            stored.flush()
+            condensed = stored
+        elif condensed.dtype != dtype:
+            condensed = condensed.astype(dtype)
+
+        if validate:
+            for start in range(0, len(condensed), _condensed_chunk_size):
+                if np.isnan(
+                        condensed[start:start + _condensed_chunk_size]).any():
+                    raise DistanceMatrixError("Data cannot contain NaNs.")
+
+        dm = cls.__new__(cls)
+        dm._validate_ids(ids, n)
+        dm._data = None
+        dm._condensed = condensed
+        dm._symmetric = True
+        dm._ids = ids
+        dm._id_index = dm._index_list(ids)
+        return dm
+
+    def _validate_values(self, data):
+        """Validate the values of the data array.
+
+        Overrides the superclass `_validate_values`. Checks that the data is
+        symmetric, hollow, and doesn't contain NaNs.
+
+        """
         if (data.T != data).any():
             raise DistanceMatrixError(
                 "Data must be symmetric and cannot contain NaNs.")
@@ -984,6 +1399,177 @@ def randdm(num_objects, ids=None, constructor=None, random_fn=None):
 
 # helper functions for anosim and permanova
 
+# Number of condensed distances read or written at once when streaming them
+# (e.g., to or from a memory-mapped file).
+_condensed_chunk_size = 2 ** 22
+
+
+def _get_pairwise_metric(metric):
+    """Return a function computing `metric` for all pairs at once, or None"""
+    metric_map = _get_pairwise_metric_map()
+    args, kwargs = (), {}
+    if isinstance(metric, functools.partial):
+        metric, args, kwargs = metric.func, metric.args, metric.keywords
+    try:
+        pairwise_metric = metric_map.get(metric)
+    except TypeError:
+        # unhashable metric
+        return None
+    if pairwise_metric is None or args:
+        return None
+    return functools.partial(pairwise_metric, **kwargs)
+
+
+def _lower_triangle_columns(iterable, metric, start, stop):
+    """Apply `metric` to the pairs of the lower triangle in columns
+    ``start:stop``, returning the distances in condensed order"""
+    values = []
+    for j in range(start, stop):
+        b = iterable[j]
+        values.extend(metric(a, b) for a in iterable[j + 1:])
+    return np.array(values, dtype=np.double)
+
+
+# State of the worker processes (e.g., the test statistic function and the
+# grouping vector of a Monte Carlo test), set by their initializers
+_worker_state = {}
+
+
+def _from_iterable_init(iterable, metric):
+    _worker_state['iterable'] = iterable
+    _worker_state['metric'] = metric
+
+
+def _from_iterable_worker(start, stop):
+    return _lower_triangle_columns(_worker_state['iterable'],
+                                   _worker_state['metric'], start, stop)
+
+
+def _condensed_size(length):
+    """Number of objects of condensed distances of a given length"""
+    n = int(round((1 + np.sqrt(1 + 8 * length)) / 2))
+    if n * (n - 1) // 2 != length:
+        raise DistanceMatrixError(
+            "Condensed distances must be a vector of length n * (n - 1) / 2 "
+            "for some n, not %d." % length)
+    return n
+
+
+def _condensed_index(n, i, j):
+    """Position of the distance between objects i < j in condensed form"""
+    return n * i - i * (i + 1) // 2 + j - i - 1
+
+
+def _condensed_element(condensed, n, i, j):
+    """Distance between objects i and j"""
+    if i == j:
+        return condensed.dtype.type(0)
+    i, j = min(i, j), max(i, j)
+    return condensed[_condensed_index(n, i, j)]
+
+
+def _condensed_elements(condensed, n, rows, cols):
+    """Distances between the objects at the given indices, as an array"""
+    low, high = np.minimum(rows, cols), np.maximum(rows, cols)
+    off_diagonal = low != high
+    elements = np.zeros(len(rows), dtype=condensed.dtype)
+    elements[off_diagonal] = condensed[_condensed_index(
+        n, low[off_diagonal], high[off_diagonal])]
+    return elements
+
+
+def _condensed_row(condensed, n, i):
+    """Distances from object i to all objects, as an array"""
+    row = np.empty(n, dtype=condensed.dtype)
+    before = np.arange(i)
+    row[:i] = condensed[_condensed_index(n, before, i)]
+    row[i] = 0
+    start = _condensed_index(n, i, i + 1)
+    row[i + 1:] = condensed[start:start + n - i - 1]
+    return row
+
+
+def _condensed_to_redundant(condensed):
+    """Construct the redundant form of condensed distances
+
+    Unlike ``squareform``, the redundant form keeps the ``dtype`` of the
+    distances, and the distances are copied a row at a time so that a
+    memory-mapped file is read sequentially, without allocating indices for
+    all of them.
+
+    """
+    n = _condensed_size(len(condensed))
+    redundant = np.zeros((n, n), dtype=condensed.dtype)
+    start = 0
+    for i in range(n - 1):
+        stop = start + n - i - 1
+        row = condensed[start:stop]
+        redundant[i, i + 1:] = row
+        redundant[i + 1:, i] = row
+        start = stop
+    return redundant
+
+
+def _is_frozen(array):
+    """Whether the values of an array can't be modified
+
+    The array must be read-only, as well as the arrays it is a view of.
+
+    """
+    while isinstance(array, np.ndarray):
+        if array.flags.writeable:
+            return False
+        array = array.base
+    return True
+
+
+def _index_step(idxs):
+    """Return the step of evenly spaced increasing indices, or None"""
+    if len(idxs) < 2:
+        return 1 if len(idxs) else None
+    steps = np.diff(idxs)
+    step = steps[0]
+    if step > 0 and (steps == step).all():
+        return int(step)
+    return None
+
+
+def _filter_condensed(condensed, n, idxs):
+    """Condensed distances between the objects at the given indices"""
+    idxs = np.asarray(idxs, dtype=np.int64)
+    filtered = np.empty(len(idxs) * (len(idxs) - 1) // 2,
+                        dtype=condensed.dtype)
+    start = 0
+    for a in range(len(idxs) - 1):
+        i, others = idxs[a], idxs[a + 1:]
+        low, high = np.minimum(i, others), np.maximum(i, others)
+        stop = start + len(others)
+        filtered[start:stop] = condensed[_condensed_index(n, low, high)]
+        start = stop
+    return filtered
+
+
+def _permute_condensed(condensed, n, order):
+    """Condensed distances between all the objects in a permuted order
+
+    The positions in `condensed` of the distances between the objects at all
+    pairs of positions p < q of `order` are computed at once, so that the
+    distances are gathered in a single operation.
+
+    """
+    order = np.asarray(order, dtype=np.intp)
+    upper = np.arange(n)[:, np.newaxis] < np.arange(n)
+    first, second = np.broadcast_arrays(order[:, np.newaxis], order)
+    first, second = first[upper], second[upper]
+    low = np.minimum(first, second)
+    high = np.maximum(first, second, out=second)
+    # the distance between objects i < j is at position offsets[i] + j
+    offsets = _condensed_index(n, np.arange(n, dtype=np.intp), 0)
+    positions = offsets[low]
+    positions += high
+    return condensed[positions]
+
+
 def _preprocess_input(distance_matrix, grouping, column):
     """Compute intermediate results not affected by permutations.
 
@@ -1032,10 +1618,9 @@ def _preprocess_input(distance_matrix, grouping, column):
             "objects (e.g., there are no 'between' distances because there is "
             "only a single group).")
 
-    tri_idxs = np.triu_indices(sample_size, k=1)
     distances = distance_matrix.condensed_form()
 
-    return sample_size, num_groups, grouping, tri_idxs, distances
+    return sample_size, num_groups, grouping, distances
 
 
 def _df_to_vector(distance_matrix, df, column):
@@ -1075,25 +1660,132 @@ def _df_to_vector(distance_matrix, df, column):
     return grouping.tolist()
 
 
-def _run_monte_carlo_stats(test_stat_function, grouping, permutations):
-    """Run stat test and compute significance with Monte Carlo permutations."""
+# the maximum number of elements (i.e., the number of permutations times the
+# number of pairs of objects) of the arrays built by the test statistic
+# functions for a batch of permutations
+_permutation_batch_elements = 2 ** 22
+
+
+def _run_monte_carlo_stats(test_stat_function, grouping, permutations,
+                           random_state=None, n_jobs=1, batch_size=None,
+                           stat=None):
+    """Run stat test and compute significance with Monte Carlo permutations.
+
+    ``test_stat_function`` is given a 2-D array where each row is a grouping
+    vector, and returns the test statistic of each row, so that a batch of
+    permutations is evaluated at once. It can also return a 2-D array with
+    several test statistics per row, in which case the test statistics and
+    p-values are returned as 1-D arrays.
+
+    ``batch_size`` is the number of permutations evaluated at once. By
+    default, it is chosen so that an array with an element per pair of
+    objects and per permutation is reasonably small.
+
+    If ``stat`` is provided, it is used as the original test statistic
+    instead of applying ``test_stat_function`` to ``grouping`` (e.g., when
+    the permuted vector is made of residuals rather than of the data).
+
+    If ``random_state`` is ``None`` and a single job is used, the grouping
+    vector is permuted with ``np.random.permutation``, so results are
+    reproducible with ``np.random.seed``. Otherwise, each batch of
+    permutations is drawn from its own random state, seeded with a base seed
+    (derived from ``random_state``) and the index of the batch. As the size
+    of the batches only depends on the size of the problem, the results only
+    depend on ``random_state`` and not on ``n_jobs``.
+
+    """
     if permutations < 0:
         raise ValueError(
             "Number of permutations must be greater than or equal to zero.")
+    n_jobs = _resolve_n_jobs(n_jobs)
 
-    stat = test_stat_function(grouping)
+    grouping = np.asarray(grouping)
+    if stat is None:
+        stat = test_stat_function(grouping[np.newaxis])[0]
 
     p_value = np.nan
     if permutations > 0:
-        perm_stats = np.empty(permutations, dtype=np.float64)
+        batch_sizes = _permutation_batch_sizes(len(grouping), permutations,
+                                               batch_size)
+
+        if random_state is None and n_jobs == 1:
+            perm_stats = [
+                test_stat_function(np.array(
+                    [np.random.permutation(grouping) for _ in range(size)]))
+                for size in batch_sizes]
+        else:
+            base_seed = _base_seed(random_state)
+            batches = [(base_seed, i, size)
+                       for i, size in enumerate(batch_sizes)]
+            if n_jobs == 1:
+                perm_stats = [_permuted_stats(test_stat_function, grouping,
+                                              *batch) for batch in batches]
+            else:
+                pool = multiprocessing.Pool(
+                    n_jobs, initializer=_monte_carlo_worker_init,
+                    initargs=(test_stat_function, grouping))
+                try:
+                    perm_stats = pool.starmap(_monte_carlo_worker, batches)
+                finally:
+                    pool.terminate()
+        perm_stats = np.concatenate(perm_stats)
+
+        # Permuted statistics that are equal to the original statistic can
+        # differ from it by rounding errors (e.g., with tied distances), so
+        # they are compared with a tolerance like vegan does.
+        tolerance = (np.sqrt(np.finfo(np.float64).eps) *
+                     np.maximum(np.abs(stat), 1))
+        p_value = (((perm_stats >= stat - tolerance).sum(axis=0) + 1) /
+                   (permutations + 1))
+    elif np.ndim(stat) > 0:
+        p_value = np.full(len(stat), np.nan)
 
-        for i in range(permutations):
-            perm_grouping = np.random.permutation(grouping)
-            perm_stats[i] = test_stat_function(perm_grouping)
+    return stat, p_value
 
-        p_value = ((perm_stats >= stat).sum() + 1) / (permutations + 1)
 
-    return stat, p_value
+def _permutation_batch_sizes(sample_size, permutations, batch_size=None):
+    """Split a number of permutations into batches"""
+    if batch_size is None:
+        num_pairs = max(1, sample_size * (sample_size - 1) // 2)
+        batch_size = max(1, _permutation_batch_elements // num_pairs)
+    sizes = [batch_size] * (permutations // batch_size)
+    if permutations % batch_size:
+        sizes.append(permutations % batch_size)
+    return sizes
+
+
+def _base_seed(random_state):
+    """Get the seed from which the seeds of all batches are derived"""
+    # the bound fits in a C long on all platforms, so that no dtype needs to
+    # be passed to randint
+    if random_state is None:
+        return np.random.randint(2 ** 31 - 1)
+    elif isinstance(random_state, np.random.RandomState):
+        return random_state.randint(2 ** 31 - 1)
+    elif (isinstance(random_state, (int, np.integer)) and
+            0 <= random_state < 2 ** 32):
+        return random_state
+    raise ValueError("`random_state` must be None, an integer between 0 and "
+                     "2**32 - 1 or a np.random.RandomState, not %r."
+                     % random_state)
+
+
+def _permuted_stats(test_stat_function, grouping, base_seed, index, size):
+    """Compute the test statistic for a batch of permutations of grouping"""
+    random_state = np.random.RandomState([base_seed, index])
+    orders = np.argsort(random_state.random_sample((size, len(grouping))),
+                        axis=1)
+    return test_stat_function(grouping[orders])
+
+
+def _monte_carlo_worker_init(test_stat_function, grouping):
+    _worker_state['test_stat_function'] = test_stat_function
+    _worker_state['grouping'] = grouping
+
+
+def _monte_carlo_worker(base_seed, index, size):
+    return _permuted_stats(_worker_state['test_stat_function'],
+                           _worker_state['grouping'], base_seed, index, size)
 
 
 def _build_results(method_name, test_stat_name, sample_size, num_groups, stat,
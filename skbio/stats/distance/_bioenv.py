@@ -6,19 +6,23 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
-from itertools import combinations
+import multiprocessing
+from itertools import combinations, islice
 
 import numpy as np
 import pandas as pd
 from scipy.spatial.distance import pdist
-from scipy.stats import spearmanr
+from scipy.stats import rankdata
 
 from skbio.stats.distance import DistanceMatrix
 from skbio.util._decorator import experimental
+from skbio.util._parallel import (_resolve_n_jobs, _to_shared_array,
+                                  _from_shared_array)
 
 
 @experimental(as_of="0.4.0")
-def bioenv(distance_matrix, data_frame, columns=None):
+def bioenv(distance_matrix, data_frame, columns=None, search='exhaustive',
+           n_jobs=1):
     """Find subset of variables maximally correlated with distances.
 
     Finds subsets of variables whose Euclidean distances (after scaling the
@@ -36,7 +40,11 @@ def bioenv(distance_matrix, data_frame, columns=None):
     The "best" subset is chosen by computing the correlation between the
     community distance matrix and all possible Euclidean environmental distance
     matrices at the given subset size. The combination of environmental
-    variables with maximum correlation is chosen as the "best" subset.
+    variables with maximum correlation is chosen as the "best" subset. With
+    ``search='stepwise'``, a subset is instead grown one variable at a time,
+    by adding the variable that maximizes the correlation, and variables are
+    removed from it whenever this improves on the best subset of the smaller
+    size found so far (similarly to BVSTEP [4]_).
 
     Parameters
     ----------
@@ -56,6 +64,16 @@ def bioenv(distance_matrix, data_frame, columns=None):
         calculations. If not provided, defaults to all columns in `data_frame`.
         The values in each column must be numeric or convertible to a numeric
         type.
+    search : {'exhaustive', 'stepwise'}, optional
+        Whether to evaluate all subsets of variables at each subset size, or
+        to grow a single subset by adding the best variable at each step and
+        removing variables when this improves the correlation of a smaller
+        subset (stepwise selection). The stepwise search usually evaluates a
+        number of subsets that is quadratic, rather than exponential, in the
+        number of variables, but isn't guaranteed to find the best subsets.
+    n_jobs : int, optional
+        Number of processes used to evaluate subsets of variables. ``-1`` uses
+        all CPUs. The results don't depend on `n_jobs`.
 
     Returns
     -------
@@ -71,8 +89,8 @@ def bioenv(distance_matrix, data_frame, columns=None):
     ValueError
         If column name(s) or `distance_matrix` IDs cannot be found in
         `data_frame`, if there is missing data (``NaN``) in the environmental
-        variables, or if the environmental variables cannot be scaled (e.g.,
-        due to zero variance).
+        variables, if the environmental variables cannot be scaled (e.g.,
+        due to zero variance), or if `search` is invalid.
 
     See Also
     --------
@@ -87,11 +105,21 @@ def bioenv(distance_matrix, data_frame, columns=None):
 
     .. warning:: This method can take a *long* time to run if a large number of
        variables are specified, as all possible subsets are evaluated at each
-       subset size.
+       subset size. Consider using ``search='stepwise'`` in that case.
 
     The variables are scaled before computing the Euclidean distance: each
     column is centered and then scaled by its standard deviation.
 
+    The community distances are ranked and standardized once. The squared
+    differences between objects are computed once for each variable, and the
+    squared Euclidean distances of a subset of variables are obtained by
+    adding the squared differences of its last variable to the squared
+    distances of the subset without it, which are kept while the subsets are
+    enumerated (in the same order as ``itertools.combinations``). Only the
+    ranking of the distances of each subset is left to compute. Similarly,
+    the stepwise search adds or subtracts the squared differences of a
+    variable to or from the squared distances of the current subset.
+
     References
     ----------
     .. [1] Clarke, K. R & Ainsworth, M. 1993. "A method of linking multivariate
@@ -102,6 +130,9 @@ def bioenv(distance_matrix, data_frame, columns=None):
 
     .. [3] http://www.primer-e.com/primer.htm
 
+    .. [4] Clarke, K. R. & Warwick, R. M. 1998. "Quantifying structural
+       redundancy in ecological communities". Oecologia, 113, 278-289.
+
     Examples
     --------
     Import the functionality we'll use in the following examples:
@@ -180,39 +211,234 @@ def bioenv(distance_matrix, data_frame, columns=None):
         raise TypeError("All specified columns in the data frame must be "
                         "numeric.")
 
-    # Scale the vars and extract the underlying numpy array from the data
-    # frame. We mainly do this for performance as we'll be taking subsets of
-    # columns within a tight loop and using a numpy array ends up being ~2x
-    # faster.
+    if search not in ('exhaustive', 'stepwise'):
+        raise ValueError("Unknown search: %r. Supported searches are "
+                         "'exhaustive' and 'stepwise'." % search)
+    n_jobs = _resolve_n_jobs(n_jobs)
+
+    # Scale the vars and compute the squared differences between objects for
+    # each variable, from which the squared Euclidean distances of any subset
+    # of variables can be accumulated.
     vars_array = _scale(vars_df).values
-    dm_flat = distance_matrix.condensed_form()
+    sq_diffs = np.array([pdist(vars_array[:, [i]], metric='sqeuclidean')
+                         for i in range(vars_array.shape[1])])
+    ranked_dm = _standardize(rankdata(distance_matrix.condensed_form()))
 
     num_vars = len(columns)
-    var_idxs = np.arange(num_vars)
+    if n_jobs == 1:
+        pool = None
+        _bioenv_worker_init(ranked_dm, sq_diffs)
+    else:
+        pool = multiprocessing.Pool(
+            n_jobs, initializer=_bioenv_worker_init,
+            initargs=(_to_shared_array(ranked_dm),
+                      _to_shared_array(sq_diffs), True))
+
+    try:
+        if search == 'exhaustive':
+            best = _exhaustive_search(num_vars, pool, n_jobs)
+        else:
+            best = _stepwise_search(num_vars, pool, n_jobs)
+    finally:
+        _worker_state.clear()
+        if pool is not None:
+            pool.terminate()
 
     # For each subset size, store the best combination of variables:
     #     (string identifying best vars, subset size, rho)
     max_rhos = np.empty(num_vars, dtype=[('vars', object),
                                          ('size', int),
                                          ('correlation', float)])
-    for subset_size in range(1, num_vars + 1):
-        max_rho = None
-        for subset_idxs in combinations(var_idxs, subset_size):
-            # Compute Euclidean distances using the current subset of
-            # variables. pdist returns the distances in condensed form.
-            vars_dm_flat = pdist(vars_array[:, subset_idxs],
-                                 metric='euclidean')
-            rho = spearmanr(dm_flat, vars_dm_flat)[0]
+    for subset_size, (rho, subset_idxs) in enumerate(best, start=1):
+        vars_label = ', '.join([columns[i] for i in subset_idxs])
+        max_rhos[subset_size - 1] = (vars_label, subset_size, rho)
 
-            # If there are ties for the best rho at a given subset size, choose
-            # the first one in order to match vegan::bioenv's behavior.
-            if max_rho is None or rho > max_rho[0]:
-                max_rho = (rho, subset_idxs)
+    return pd.DataFrame.from_records(max_rhos, index='vars')
 
-        vars_label = ', '.join([columns[i] for i in max_rho[1]])
-        max_rhos[subset_size - 1] = (vars_label, subset_size, max_rho[0])
 
-    return pd.DataFrame.from_records(max_rhos, index='vars')
+def _exhaustive_search(num_vars, pool, n_jobs):
+    """Find the best subset of each size among all subsets"""
+    best = []
+    for subset_size in range(1, num_vars + 1):
+        # Split the combinations into chunks of consecutive combinations, so
+        # that the squared distances of the prefixes are mostly reused within
+        # a chunk.
+        num_subsets = _num_combinations(num_vars, subset_size)
+        chunk_size = -(-num_subsets // (4 * n_jobs))
+        chunks = [(subset_size, start, min(start + chunk_size, num_subsets))
+                  for start in range(0, num_subsets, chunk_size)]
+        if pool is None:
+            results = [_best_combination(*chunk) for chunk in chunks]
+        else:
+            results = pool.starmap(_best_combination, chunks)
+
+        # If there are ties for the best rho at a given subset size, choose
+        # the first one in order to match vegan::bioenv's behavior.
+        max_rho = None
+        for result in results:
+            if max_rho is None or result[0] > max_rho[0]:
+                max_rho = result
+        best.append(max_rho)
+    return best
+
+
+def _stepwise_search(num_vars, pool, n_jobs):
+    """Grow a subset by adding the variable that maximizes rho at each step,
+    and remove variables whenever this improves on the best smaller subset"""
+    best = []
+    selected = ()
+    while len(selected) < num_vars:
+        remaining = [i for i in range(num_vars) if i not in selected]
+        rho, added = _best_step(_best_addition, selected, remaining, pool,
+                                n_jobs)
+        selected = tuple(sorted(selected + (added,)))
+        size = len(selected)
+        if size > len(best):
+            best.append((rho, selected))
+        elif rho > best[size - 1][0]:
+            best[size - 1] = (rho, selected)
+        else:
+            # continue from the best subset of this size found so far
+            selected = best[size - 1][1]
+            added = None
+
+        # Remove variables (other than the one just added) as long as this
+        # improves on the best subset of the smaller size. Each removal
+        # strictly improves the correlation of a subset size, so the search
+        # terminates.
+        while len(selected) > 2:
+            candidates = [i for i in selected if i != added]
+            rho, removed = _best_step(_best_removal, selected, candidates,
+                                      pool, n_jobs)
+            if rho <= best[len(selected) - 2][0]:
+                break
+            selected = tuple(i for i in selected if i != removed)
+            best[len(selected) - 1] = (rho, selected)
+            added = None
+    return best
+
+
+def _best_step(step_function, selected, candidates, pool, n_jobs):
+    """Find the best of the candidate variables to add to or remove from a
+    subset, evaluated in chunks by the workers"""
+    chunk_size = -(-len(candidates) // n_jobs)
+    chunks = [(selected, candidates[start:start + chunk_size])
+              for start in range(0, len(candidates), chunk_size)]
+    if pool is None:
+        results = [step_function(*chunk) for chunk in chunks]
+    else:
+        results = pool.starmap(step_function, chunks)
+
+    # the first of tied variables is chosen, like in the exhaustive search
+    max_rho = None
+    for result in results:
+        if max_rho is None or result[0] > max_rho[0]:
+            max_rho = result
+    return max_rho
+
+
+# The ranked community distances and the squared differences of each
+# variable, set by _bioenv_worker_init in each worker process (or in the main
+# process if a single job is used).
+_worker_state = {}
+
+
+def _bioenv_worker_init(ranked_dm, sq_diffs, shared=False):
+    if shared:
+        ranked_dm = _from_shared_array(ranked_dm)
+        sq_diffs = _from_shared_array(sq_diffs)
+    _worker_state['ranked_dm'] = ranked_dm
+    _worker_state['sq_diffs'] = sq_diffs
+
+
+def _best_combination(subset_size, start, stop):
+    """Find the best of a range of the combinations of a subset size
+
+    The squared distances of the prefixes of the current combination are
+    kept on a stack, so that moving to the next combination only requires
+    adding the squared differences of the variables that changed.
+
+    """
+    sq_diffs = _worker_state['sq_diffs']
+    max_rho = None
+    prefix_idxs = ()
+    prefix_sums = []
+    for subset_idxs in islice(combinations(range(len(sq_diffs)), subset_size),
+                              start, stop):
+        # length of the prefix shared with the previous combination
+        shared = 0
+        while (shared < len(prefix_idxs) and
+               prefix_idxs[shared] == subset_idxs[shared]):
+            shared += 1
+        del prefix_sums[shared:]
+        for i in subset_idxs[shared:-1]:
+            previous = prefix_sums[-1] if prefix_sums else 0
+            prefix_sums.append(previous + sq_diffs[i])
+        prefix_idxs = subset_idxs[:-1]
+
+        previous = prefix_sums[-1] if prefix_sums else 0
+        rho = _rho(previous + sq_diffs[subset_idxs[-1]])
+        if max_rho is None or rho > max_rho[0]:
+            max_rho = (rho, subset_idxs)
+    return max_rho
+
+
+def _best_addition(selected, candidates):
+    """Find the variable that maximizes rho when added to a subset"""
+    sq_diffs = _worker_state['sq_diffs']
+    sq_dists = _subset_sq_dists(selected)
+
+    max_rho = None
+    for i in candidates:
+        rho = _rho(sq_dists + sq_diffs[i])
+        if max_rho is None or rho > max_rho[0]:
+            max_rho = (rho, i)
+    return max_rho
+
+
+def _best_removal(selected, candidates):
+    """Find the variable that maximizes rho when removed from a subset"""
+    sq_diffs = _worker_state['sq_diffs']
+    sq_dists = _subset_sq_dists(selected)
+
+    max_rho = None
+    for i in candidates:
+        rho = _rho(sq_dists - sq_diffs[i])
+        if max_rho is None or rho > max_rho[0]:
+            max_rho = (rho, i)
+    return max_rho
+
+
+def _subset_sq_dists(subset):
+    """Squared Euclidean distances of a subset of variables"""
+    sq_diffs = _worker_state['sq_diffs']
+    sq_dists = np.zeros(sq_diffs.shape[1])
+    for i in subset:
+        sq_dists += sq_diffs[i]
+    return sq_dists
+
+
+def _rho(sq_dists):
+    """Compute Spearman's rho between the community distances and the
+    Euclidean distances with the given squares"""
+    # The distances, rather than their squares, are ranked so that ties are
+    # the same as with the distances computed by pdist.
+    ranked = _standardize(rankdata(np.sqrt(sq_dists)))
+    return ranked.dot(_worker_state['ranked_dm'])
+
+
+def _standardize(values):
+    """Center values and scale them to unit norm"""
+    centered = values - values.mean()
+    return centered / np.sqrt(centered.dot(centered))
+
+
+def _num_combinations(n, k):
+    """Number of combinations of k elements among n"""
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
 
 
 def _scale(df):
@@ -6,20 +6,24 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import multiprocessing
+from functools import partial
 from itertools import combinations
 
 import numpy as np
 import pandas as pd
-import scipy.misc
-from scipy.stats import pearsonr, spearmanr
+from scipy.spatial.distance import squareform
+from scipy.stats import pearsonr, spearmanr, rankdata
 
 from skbio.stats.distance import DistanceMatrix
+from skbio.stats.distance._base import _run_monte_carlo_stats, _base_seed
 from skbio.util._decorator import experimental
+from skbio.util._parallel import _resolve_n_jobs
 
 
 @experimental(as_of="0.4.0")
 def mantel(x, y, method='pearson', permutations=999, alternative='two-sided',
-           strict=True, lookup=None):
+           strict=True, lookup=None, random_state=None, n_jobs=1):
     """Compute correlation between distance matrices using the Mantel test.
 
     The Mantel test compares two distance matrices by computing the correlation
@@ -102,6 +106,13 @@ def mantel(x, y, method='pearson', permutations=999, alternative='two-sided',
         already match between the distance matrices, this parameter is not
         necessary. This parameter is disallowed if `x` and `y` are
         ``array_like``.
+    random_state : int or np.random.RandomState, optional
+        Seed or random state used to draw the permutations. If ``None`` (the
+        default), permutations are drawn from NumPy's global random state.
+    n_jobs : int, optional
+        Number of processes used to evaluate the permutations. ``-1`` uses all
+        CPUs. For a given `random_state`, the result doesn't depend on
+        `n_jobs`.
 
     Returns
     -------
@@ -139,6 +150,13 @@ def mantel(x, y, method='pearson', permutations=999, alternative='two-sided',
     interface are similar to ``vegan::mantel``, available in R's vegan
     package [3]_.
 
+    The distances (or their ranks) are standardized once, and the correlation
+    coefficient of a permutation is the dot product of the standardized
+    distances of `y` with the standardized distances of `x` indexed by the
+    permuted pairs of objects. The correlation coefficients of a batch of
+    permutations are computed at once, so neither `x` nor its ranks are
+    copied or recomputed for every permutation.
+
     ``np.nan`` will be returned for the p-value if `permutations` is zero or if
     the correlation coefficient is ``np.nan``. The correlation coefficient will
     be ``np.nan`` if one or both of the inputs does not have any variation
@@ -278,26 +296,60 @@ def mantel(x, y, method='pearson', permutations=999, alternative='two-sided',
     if permutations == 0 or np.isnan(orig_stat):
         p_value = np.nan
     else:
-        perm_gen = (corr_func(x.permute(condensed=True), y_flat)[0]
-                    for _ in range(permutations))
-        permuted_stats = np.fromiter(perm_gen, np.float, count=permutations)
-
-        if alternative == 'two-sided':
-            count_better = (np.absolute(permuted_stats) >=
-                            np.absolute(orig_stat)).sum()
-        elif alternative == 'greater':
-            count_better = (permuted_stats >= orig_stat).sum()
+        if method == 'spearman':
+            # permuting x only permutes its distances, so they are ranked once
+            x_flat = rankdata(x_flat)
+            y_flat = rankdata(y_flat)
+        x_std = _standardize(x_flat)
+        y_std = _standardize(y_flat)
+
+        if x_std is None or y_std is None:
+            # without variation, every permutation gives the same statistic
+            p_value = 1.0
         else:
-            count_better = (permuted_stats <= orig_stat).sum()
-
-        p_value = (count_better + 1) / (permutations + 1)
+            stat = _signed(alternative, x_std.dot(y_std))
+            x_std = squareform(x_std, force='tomatrix', checks=False)
+            rows, cols = np.triu_indices(n, k=1)
+            test_stat_function = partial(_permuted_corr, x_std, y_std, rows,
+                                         cols, alternative)
+            _, p_value = _run_monte_carlo_stats(
+                test_stat_function, np.arange(n), permutations, random_state,
+                n_jobs, stat=stat)
 
     return orig_stat, p_value, n
 
 
+def _standardize(values):
+    """Center values and scale them to unit norm, or return None if they
+    have no variation"""
+    centered = values - values.mean()
+    norm = np.sqrt(centered.dot(centered))
+    if norm == 0:
+        return None
+    return centered / norm
+
+
+def _signed(alternative, stat):
+    """Transform correlation coefficients so that greater values are more
+    extreme under the alternative hypothesis"""
+    if alternative == 'two-sided':
+        return np.abs(stat)
+    elif alternative == 'greater':
+        return stat
+    else:
+        return -stat
+
+
+def _permuted_corr(x_std, y_std, rows, cols, alternative, orders):
+    """Compute the correlation coefficient of each permutation of x"""
+    permuted = x_std[orders[:, rows], orders[:, cols]]
+    return _signed(alternative, permuted.dot(y_std))
+
+
 @experimental(as_of="0.4.0")
 def pwmantel(dms, labels=None, method='pearson', permutations=999,
-             alternative='two-sided', strict=True, lookup=None):
+             alternative='two-sided', strict=True, lookup=None,
+             random_state=None, n_jobs=1):
     """Run Mantel tests for every pair of given distance matrices.
 
     Runs a Mantel test for each pair of distance matrices and collates the
@@ -328,6 +380,15 @@ def pwmantel(dms, labels=None, method='pearson', permutations=999,
         Handling of nonmatching IDs. See ``mantel`` function for more details.
     lookup : dict, optional
         Map existing IDs to new IDs. See ``mantel`` function for more details.
+    random_state : int or np.random.RandomState, optional
+        Seed or random state used to draw the permutations. If provided (or if
+        `n_jobs` isn't 1), the permutations of each pair of distance matrices
+        are drawn from a random state derived from `random_state` and the
+        index of the pair. See ``mantel`` function for more details.
+    n_jobs : int, optional
+        Number of processes used to run the Mantel tests of the pairs of
+        distance matrices concurrently. ``-1`` uses all CPUs. For a given
+        `random_state`, the results don't depend on `n_jobs`.
 
     Returns
     -------
@@ -348,7 +409,8 @@ def pwmantel(dms, labels=None, method='pearson', permutations=999,
     --------
     Passing a list of filepaths can be useful as it allows for a smaller amount
     of memory consumption as it only loads two matrices at a time as opposed to
-    loading all distance matrices into memory.
+    loading all distance matrices into memory. With ``n_jobs`` greater than 1,
+    each process loads the two matrices of the pair it tests.
 
     Examples
     --------
@@ -398,29 +460,53 @@ def pwmantel(dms, labels=None, method='pearson', permutations=999,
         if len(set(labels)) != len(labels):
             raise ValueError("Labels must be unique.")
 
-    num_combs = scipy.misc.comb(num_dms, 2, exact=True)
+    n_jobs = _resolve_n_jobs(n_jobs)
+    pairs = list(combinations(zip(labels, dms), 2))
+    kwargs = dict(method=method, permutations=permutations,
+                  alternative=alternative, strict=strict, lookup=lookup)
+
+    if random_state is None and n_jobs == 1:
+        random_states = [None] * len(pairs)
+    else:
+        # each pair has its own random state, so that results don't depend
+        # on which process tests the pair
+        base_seed = _base_seed(random_state)
+        random_states = [np.random.RandomState([base_seed, i])
+                         for i in range(len(pairs))]
+    tasks = [(x, y, pair_random_state, kwargs)
+             for ((_, x), (_, y)), pair_random_state in zip(pairs,
+                                                            random_states)]
+
+    if n_jobs == 1:
+        stats = [_pairwise_mantel(*task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(min(n_jobs, len(tasks)))
+        try:
+            stats = pool.starmap(_pairwise_mantel, tasks)
+        finally:
+            pool.terminate()
+
     results_dtype = [('dm1', object), ('dm2', object), ('statistic', float),
                      ('p-value', float), ('n', int), ('method', object),
                      ('permutations', int), ('alternative', object)]
-    results = np.empty(num_combs, dtype=results_dtype)
-
-    for i, pair in enumerate(combinations(zip(labels, dms), 2)):
-        (xlabel, x), (ylabel, y) = pair
-        if isinstance(x, str):
-            x = DistanceMatrix.read(x)
-        if isinstance(y, str):
-            y = DistanceMatrix.read(y)
-
-        stat, p_val, n = mantel(x, y, method=method, permutations=permutations,
-                                alternative=alternative, strict=strict,
-                                lookup=lookup)
-
+    results = np.empty(len(pairs), dtype=results_dtype)
+    for i, (((xlabel, _), (ylabel, _)), (stat, p_val, n)) in enumerate(
+            zip(pairs, stats)):
         results[i] = (xlabel, ylabel, stat, p_val, n, method, permutations,
                       alternative)
 
     return pd.DataFrame.from_records(results, index=('dm1', 'dm2'))
 
 
+def _pairwise_mantel(x, y, random_state, kwargs):
+    """Run the Mantel test of a pair of distance matrices or filepaths"""
+    if isinstance(x, str):
+        x = DistanceMatrix.read(x)
+    if isinstance(y, str):
+        y = DistanceMatrix.read(y)
+    return mantel(x, y, random_state=random_state, **kwargs)
+
+
 def _order_dms(x, y, strict=True, lookup=None):
     """Intersect distance matrices and put them in the same order."""
     x_is_dm = isinstance(x, DistanceMatrix)
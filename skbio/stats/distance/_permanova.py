@@ -9,13 +9,16 @@
 from functools import partial
 
 import numpy as np
+import pandas as pd
 
-from ._base import (_preprocess_input, _run_monte_carlo_stats, _build_results)
+from ._base import (DistanceMatrix, _preprocess_input, _run_monte_carlo_stats,
+                    _build_results, _permutation_batch_elements)
 from skbio.util._decorator import experimental
 
 
 @experimental(as_of="0.4.0")
-def permanova(distance_matrix, grouping, column=None, permutations=999):
+def permanova(distance_matrix, grouping, column=None, permutations=999,
+              random_state=None, n_jobs=1):
     """Test for significant differences between groups using PERMANOVA.
 
     Permutational Multivariate Analysis of Variance (PERMANOVA) is a
@@ -58,6 +61,13 @@ def permanova(distance_matrix, grouping, column=None, permutations=999):
         significance. Must be greater than or equal to zero. If zero,
         statistical significance calculations will be skipped and the p-value
         will be ``np.nan``.
+    random_state : int or np.random.RandomState, optional
+        Seed or random state used to draw the permutations. If ``None`` (the
+        default), permutations are drawn from NumPy's global random state.
+    n_jobs : int, optional
+        Number of processes used to evaluate the permutations. ``-1`` uses all
+        CPUs. For a given `random_state`, the result doesn't depend on
+        `n_jobs`.
 
     Returns
     -------
@@ -89,47 +99,285 @@ def permanova(distance_matrix, grouping, column=None, permutations=999):
     provide similar interfaces).
 
     """
-    sample_size, num_groups, grouping, tri_idxs, distances = _preprocess_input(
+    sample_size, num_groups, grouping, distances = _preprocess_input(
         distance_matrix, grouping, column)
 
     # Calculate number of objects in each group.
     group_sizes = np.bincount(grouping)
     s_T = (distances ** 2).sum() / sample_size
+    squared_distances = np.asarray(distance_matrix.data,
+                                   dtype=np.float64) ** 2
 
     test_stat_function = partial(_compute_f_stat, sample_size, num_groups,
-                                 tri_idxs, distances, group_sizes, s_T)
+                                 squared_distances, group_sizes, s_T)
+    batch_size = max(1, _permutation_batch_elements //
+                     (sample_size * num_groups))
     stat, p_value = _run_monte_carlo_stats(test_stat_function, grouping,
-                                           permutations)
+                                           permutations, random_state, n_jobs,
+                                           batch_size)
 
     return _build_results('PERMANOVA', 'pseudo-F', sample_size, num_groups,
                           stat, p_value, permutations)
 
 
-def _compute_f_stat(sample_size, num_groups, tri_idxs, distances, group_sizes,
-                    s_T, grouping):
-    """Compute PERMANOVA pseudo-F statistic."""
-    # Create a matrix where objects in the same group are marked with the group
-    # index (e.g. 0, 1, 2, etc.). objects that are not in the same group are
-    # marked with -1.
-    grouping_matrix = -1 * np.ones((sample_size, sample_size), dtype=int)
-    for group_idx in range(num_groups):
-        within_indices = _index_combinations(
-            np.where(grouping == group_idx)[0])
-        grouping_matrix[within_indices] = group_idx
+@experimental(as_of="0.5.1")
+def adonis(distance_matrix, metadata, columns, permutations=999,
+           random_state=None, n_jobs=1):
+    """Test for differences explained by several factors using PERMANOVA.
 
-    # Extract upper triangle (in same order as distances were extracted
-    # from full distance matrix).
-    grouping_tri = grouping_matrix[tri_idxs]
+    This is the multi-factor version of ``permanova`` (as implemented by
+    ``vegan::adonis``). The variation in the distance matrix is partitioned
+    between the terms of a linear model built from columns of `metadata`,
+    which are added to the model sequentially (i.e., each term is tested
+    after accounting for the terms that precede it), and a pseudo-F
+    statistic is computed for each term.
 
-    # Calculate s_W for each group, accounting for different group sizes.
-    s_W = 0
-    for i in range(num_groups):
-        s_W += (distances[grouping_tri == i] ** 2).sum() / group_sizes[i]
+    Statistical significance is assessed via a permutation test. The objects
+    (rows of the model) are randomly permuted a number of times (controlled
+    via `permutations`), and the p-value of each term is the proportion of
+    permuted pseudo-F statistics that are equal to or greater than the
+    original pseudo-F statistic of the term.
+
+    Parameters
+    ----------
+    distance_matrix : DistanceMatrix
+        Distance matrix containing distances between objects (e.g., distances
+        between samples of microbial communities).
+    metadata : pandas.DataFrame
+        ``DataFrame`` indexed by the IDs in `distance_matrix` (the order of
+        IDs need not be the same, and extra IDs are ignored). All IDs in the
+        distance matrix must be present in the ``DataFrame``.
+    columns : str or list of str
+        Columns of `metadata` to use as the terms of the model, in the order
+        in which they are added to the model. Numeric columns are treated as
+        continuous variables, and other columns (e.g., strings or booleans)
+        as factors.
+    permutations : int, optional
+        Number of permutations to use when assessing statistical
+        significance. Must be greater than or equal to zero. If zero,
+        statistical significance calculations will be skipped and the
+        p-values will be ``np.nan``.
+    random_state : int or np.random.RandomState, optional
+        Seed or random state used to draw the permutations. If ``None`` (the
+        default), permutations are drawn from NumPy's global random state.
+    n_jobs : int, optional
+        Number of processes used to evaluate the permutations. ``-1`` uses all
+        CPUs. For a given `random_state`, the result doesn't depend on
+        `n_jobs`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Table with a row for each term of the model, the residuals and the
+        total, and the columns ``df`` (degrees of freedom), ``sum of
+        squares``, ``mean squares``, ``pseudo-F``, ``R2`` (the proportion of
+        the total sum of squares) and ``p-value``.
+
+    Raises
+    ------
+    TypeError
+        If `distance_matrix` is not a ``DistanceMatrix``.
+    ValueError
+        If no columns are provided, if a column is provided more than once or
+        is not in `metadata`, if a distance matrix ID is not in `metadata` or
+        has a missing value, if a term is completely explained by the terms
+        that precede it, or if there are no residual degrees of freedom.
+
+    See Also
+    --------
+    permanova
+
+    Notes
+    -----
+    See [1]_ for the method reference, as well as ``vegan::adonis``,
+    available in R's vegan package [2]_. Only main effects are supported
+    (i.e., there are no interaction terms).
+
+    The sums of squares are computed from the Gower-centered matrix
+    :math:`G` of the squared distances, and an orthonormal basis of the
+    model, which is computed once. Permuting the objects permutes the rows
+    of the basis, so the sums of squares of all terms are obtained for a
+    batch of permutations with a single product with :math:`G`.
+
+    With a single factor, the pseudo-F statistic is the same as the one
+    computed by ``permanova``.
+
+    References
+    ----------
+    .. [1] Anderson, Marti J. "A new method for non-parametric multivariate
+       analysis of variance." Austral Ecology 26.1 (2001): 32-46.
+
+    .. [2] http://cran.r-project.org/web/packages/vegan/index.html
+
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> from skbio import DistanceMatrix
+    >>> from skbio.stats.distance import adonis
+    >>> dm = DistanceMatrix([[0, 1, 5, 4, 3, 6],
+    ...                      [1, 0, 3, 2, 4, 5],
+    ...                      [5, 3, 0, 3, 2, 1],
+    ...                      [4, 2, 3, 0, 3, 2],
+    ...                      [3, 4, 2, 3, 0, 1],
+    ...                      [6, 5, 1, 2, 1, 0]], list('abcdef'))
+    >>> metadata = pd.DataFrame(
+    ...     {'treatment': ['c', 'c', 't', 't', 't', 't'],
+    ...      'ph': [7.0, 6.5, 5.0, 6.0, 5.5, 4.5]}, index=list('abcdef'))
+    >>> table = adonis(dm, metadata, ['treatment', 'ph'], permutations=0)
+    >>> table[['df', 'sum of squares', 'pseudo-F', 'R2']].round(3)
+               df  sum of squares  pseudo-F     R2
+    treatment   1          20.667    13.115  0.734
+    ph          1           2.773     1.760  0.098
+    Residuals   3           4.727       NaN  0.168
+    Total       5          28.167       NaN  1.000
+
+    """
+    if not isinstance(distance_matrix, DistanceMatrix):
+        raise TypeError("Input must be a DistanceMatrix.")
+    if isinstance(columns, str):
+        columns = [columns]
+    columns = list(columns)
+    if not columns:
+        raise ValueError("At least one column must be provided.")
+    if len(set(columns)) != len(columns):
+        raise ValueError("Each column can only be provided once.")
+    for column in columns:
+        if column not in metadata:
+            raise ValueError("Column '%s' not in DataFrame." % column)
+
+    data = metadata[columns].reindex(list(distance_matrix.ids))
+    if data.isnull().any().any():
+        raise ValueError(
+            "One or more IDs in the distance matrix are not in the data "
+            "frame, or have missing values.")
+
+    sample_size = distance_matrix.shape[0]
+    basis, term_dfs = _sequential_basis(data)
+    df_residual = sample_size - 1 - sum(term_dfs)
+    if df_residual < 1:
+        raise ValueError("There are no residual degrees of freedom: the "
+                         "model explains all of the distances.")
+
+    gower = _gower_center(distance_matrix)
+    s_T = np.trace(gower)
+
+    test_stat_function = partial(_compute_adonis_f_stats, gower, basis,
+                                 term_dfs, s_T, df_residual)
+    batch_size = max(1, _permutation_batch_elements //
+                     (sample_size * basis.shape[1]))
+    f_stats, p_values = _run_monte_carlo_stats(
+        test_stat_function, np.arange(sample_size), permutations,
+        random_state, n_jobs, batch_size)
+
+    ss_terms = _adonis_sums_of_squares(gower, basis, term_dfs,
+                                       np.arange(sample_size)[np.newaxis])[0]
+    ss_residual = s_T - ss_terms.sum()
+    dfs = np.array(term_dfs + [df_residual, sample_size - 1])
+    ss = np.append(ss_terms, [ss_residual, s_T])
+    return pd.DataFrame(
+        {'df': dfs,
+         'sum of squares': ss,
+         'mean squares': np.append(ss[:-1] / dfs[:-1], np.nan),
+         'pseudo-F': np.append(f_stats, [np.nan, np.nan]),
+         'R2': ss / s_T,
+         'p-value': np.append(p_values, [np.nan, np.nan])},
+        index=columns + ['Residuals', 'Total'],
+        columns=['df', 'sum of squares', 'mean squares', 'pseudo-F', 'R2',
+                 'p-value'])
+
+
+def _compute_f_stat(sample_size, num_groups, squared_distances, group_sizes,
+                    s_T, groupings):
+    """Compute PERMANOVA pseudo-F statistic of each grouping vector."""
+    # Build an indicator matrix with a column per grouping vector and group,
+    # marking the objects that are in the group. The product with the matrix
+    # of squared distances sums, for each object, the squared distances to
+    # all objects of each group, so that the sums of squared distances within
+    # each group are obtained for all grouping vectors with a single matrix
+    # product.
+    num_groupings = len(groupings)
+    indicators = np.zeros((sample_size, num_groupings, num_groups))
+    indicators[np.arange(sample_size)[:, np.newaxis],
+               np.arange(num_groupings), groupings.T] = 1
+    indicators = indicators.reshape(sample_size, -1)
+    within = (indicators * squared_distances.dot(indicators)).sum(axis=0)
+
+    # Calculate s_W, accounting for different group sizes. Each pair of
+    # objects is counted twice by the sums above.
+    within = within.reshape(num_groupings, num_groups)
+    s_W = (within / group_sizes).sum(axis=1) / 2
 
     s_A = s_T - s_W
     return (s_A / (num_groups - 1)) / (s_W / (sample_size - num_groups))
 
 
-def _index_combinations(indices):
-    # Modified from http://stackoverflow.com/a/11144716
-    return np.tile(indices, len(indices)), np.repeat(indices, len(indices))
+def _sequential_basis(data):
+    """Compute an orthonormal basis of a sequential model
+
+    The columns of the basis are grouped by term: the columns of each term
+    span the part of the term that is orthogonal to the intercept and to the
+    preceding terms. The intercept itself is not included. Returns the basis
+    and the number of columns (degrees of freedom) of each term.
+
+    """
+    sample_size = len(data)
+    previous = np.full((sample_size, 1), 1 / np.sqrt(sample_size))
+    term_dfs = []
+    for column in data:
+        values = data[column]
+        if (np.issubdtype(values.dtype, np.number) and
+                not np.issubdtype(values.dtype, np.bool_)):
+            design = values.values.astype(np.float64)[:, np.newaxis]
+        else:
+            codes = pd.factorize(values)[0]
+            design = np.eye(codes.max() + 1)[codes]
+
+        norms = np.linalg.norm(design, axis=0)
+        design = design[:, norms > 0] / norms[norms > 0]
+        design -= previous.dot(previous.T.dot(design))
+        u, singular_values, _ = np.linalg.svd(design, full_matrices=False)
+        rank = (singular_values >
+                np.sqrt(np.finfo(np.float64).eps)).sum()
+        if rank == 0:
+            raise ValueError("Column '%s' is completely explained by the "
+                             "columns that precede it." % column)
+
+        previous = np.hstack([previous, u[:, :rank]])
+        term_dfs.append(int(rank))
+
+    return previous[:, 1:], term_dfs
+
+
+def _gower_center(distance_matrix):
+    """Compute the Gower-centered matrix of squared distances"""
+    gower = np.asarray(distance_matrix.data, dtype=np.float64) ** 2
+    gower *= -0.5
+    row_means = gower.mean(axis=1)
+    gower -= row_means[:, np.newaxis]
+    gower -= row_means[np.newaxis, :]
+    gower += row_means.mean()
+    return gower
+
+
+def _adonis_sums_of_squares(gower, basis, term_dfs, orders):
+    """Compute the sum of squares of each term for each permutation"""
+    num_orders = len(orders)
+    sample_size, rank = basis.shape
+
+    # permute the rows of the basis, keeping a column per permutation and
+    # basis vector
+    permuted = basis[orders].transpose(1, 0, 2).reshape(sample_size, -1)
+    projected = (permuted * gower.dot(permuted)).sum(axis=0)
+    projected = projected.reshape(num_orders, rank)
+
+    starts = np.cumsum([0] + term_dfs[:-1])
+    return np.add.reduceat(projected, starts, axis=1)
+
+
+def _compute_adonis_f_stats(gower, basis, term_dfs, s_T, df_residual,
+                            orders):
+    """Compute the pseudo-F statistic of each term for each permutation"""
+    ss_terms = _adonis_sums_of_squares(gower, basis, term_dfs, orders)
+    ss_residual = s_T - ss_terms.sum(axis=1)
+    return ((ss_terms / term_dfs) /
+            (ss_residual / df_residual)[:, np.newaxis])
@@ -0,0 +1,253 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from functools import partial
+
+import numpy as np
+from scipy.linalg import eigh
+
+from ._base import (_preprocess_input, _run_monte_carlo_stats, _build_results,
+                    _permutation_batch_elements)
+from ._permanova import _gower_center
+from skbio.util._decorator import experimental
+
+
+@experimental(as_of="0.5.1")
+def permdisp(distance_matrix, grouping, column=None, test='centroid',
+             permutations=999, random_state=None, n_jobs=1):
+    """Test for homogeneity of multivariate dispersions using PERMDISP.
+
+    PERMDISP is a multivariate extension of Levene's test for homogeneity of
+    variances. The distance of each object to the center (centroid or
+    spatial median) of its group is computed in the space of principal
+    coordinates of the distance matrix, and an ANOVA F statistic tests
+    whether the mean distance to the center differs between groups. As
+    PERMANOVA is sensitive to differences in dispersion as well as in
+    location, PERMDISP is commonly used alongside it.
+
+    Statistical significance is assessed via a permutation test. The
+    residuals of the distances to the centers (i.e., their deviations from
+    the mean distance of their group) are randomly permuted a number of times
+    (controlled via `permutations`). An F statistic is computed for each
+    permutation and the p-value is the proportion of permuted F statistics
+    that are equal to or greater than the original F statistic.
+
+    Parameters
+    ----------
+    distance_matrix : DistanceMatrix
+        Distance matrix containing distances between objects (e.g., distances
+        between samples of microbial communities).
+    grouping : 1-D array_like or pandas.DataFrame
+        Vector indicating the assignment of objects to groups. See
+        ``permanova`` for details.
+    column : str, optional
+        Column name to use as the grouping vector if `grouping` is a
+        ``DataFrame``. Must be provided if `grouping` is a ``DataFrame``.
+        Cannot be provided if `grouping` is 1-D ``array_like``.
+    test : {'centroid', 'median'}, optional
+        Whether to compute the distances of objects to the centroid or to the
+        spatial median of their group.
+    permutations : int, optional
+        Number of permutations to use when assessing statistical
+        significance. Must be greater than or equal to zero. If zero,
+        statistical significance calculations will be skipped and the p-value
+        will be ``np.nan``.
+    random_state : int or np.random.RandomState, optional
+        Seed or random state used to draw the permutations. If ``None`` (the
+        default), permutations are drawn from NumPy's global random state.
+    n_jobs : int, optional
+        Number of processes used to evaluate the permutations. ``-1`` uses all
+        CPUs. For a given `random_state`, the result doesn't depend on
+        `n_jobs`.
+
+    Returns
+    -------
+    pandas.Series
+        Results of the statistical test, including ``test statistic`` and
+        ``p-value``.
+
+    Raises
+    ------
+    ValueError
+        If `test` is not ``'centroid'`` or ``'median'``, or if the input is
+        invalid (see ``permanova``).
+
+    See Also
+    --------
+    permanova
+
+    Notes
+    -----
+    See [1]_ for the original method reference, as well as
+    ``vegan::betadisper`` and ``vegan::permutest.betadisper``, available in
+    R's vegan package [2]_, which this implementation follows. Principal
+    coordinates with negative eigenvalues are taken into account: the
+    squared distance of an object to the center of its group is the squared
+    distance along the axes with positive eigenvalues minus the squared
+    distance along the axes with negative eigenvalues, and the absolute value
+    of this difference is used.
+
+    Distances to centroids are computed directly from the squared distances,
+    as the mean squared distance of an object to the objects of its group
+    minus half of the mean squared distance between the objects of the group,
+    for all groups at once with an indicator matrix of the groups. This is
+    equivalent to computing the centroids in the space of principal
+    coordinates, but doesn't require computing the principal coordinates.
+    The spatial medians are computed from the principal coordinates (which
+    are computed once) with Weiszfeld's algorithm, iterating over all groups
+    at once.
+
+    The p-value will be ``np.nan`` if `permutations` is zero.
+
+    References
+    ----------
+    .. [1] Anderson, Marti J. "Distance-based tests for homogeneity of
+       multivariate dispersions." Biometrics 62.1 (2006): 245-253.
+
+    .. [2] http://cran.r-project.org/web/packages/vegan/index.html
+
+    Examples
+    --------
+    Two groups of objects, where the objects of the second group are more
+    dispersed than the objects of the first group:
+
+    >>> import numpy as np
+    >>> from scipy.spatial.distance import pdist, squareform
+    >>> from skbio import DistanceMatrix
+    >>> from skbio.stats.distance import permdisp
+    >>> points = np.array([[1, 0], [-1, 1], [0, 1], [1, -1], [0, 0],
+    ...                    [12, 1], [8, 0], [10, 3], [9, -2], [11, -1]])
+    >>> dm = DistanceMatrix(squareform(pdist(points)))
+    >>> grouping = ['a'] * 5 + ['b'] * 5
+    >>> results = permdisp(dm, grouping, random_state=42)
+    >>> print(results)
+    method name                PERMDISP
+    test statistic name         F-value
+    sample size                      10
+    number of groups                  2
+    test statistic            16.572485
+    p-value                       0.007
+    number of permutations          999
+    Name: PERMDISP results, dtype: object
+
+    The distances can be computed to the spatial medians of the groups
+    instead of their centroids:
+
+    >>> results = permdisp(dm, grouping, test='median', random_state=42)
+    >>> round(results['test statistic'], 4)
+    10.3062
+
+    """
+    if test not in ('centroid', 'median'):
+        raise ValueError("Unknown test: %r. Supported tests are 'centroid' "
+                         "and 'median'." % test)
+
+    sample_size, num_groups, grouping, _ = _preprocess_input(
+        distance_matrix, grouping, column)
+
+    indicators = np.zeros((sample_size, num_groups))
+    indicators[np.arange(sample_size), grouping] = 1
+    group_sizes = np.bincount(grouping)
+
+    if test == 'centroid':
+        distances = _centroid_distances(distance_matrix, grouping,
+                                        indicators, group_sizes)
+    else:
+        distances = _median_distances(distance_matrix, grouping, indicators)
+
+    # permute the residuals of the distances from the means of their groups
+    group_means = distances.dot(indicators) / group_sizes
+    residuals = distances - group_means[grouping]
+
+    test_stat_function = partial(_compute_f_stat, sample_size, num_groups,
+                                 indicators, group_sizes)
+    stat = test_stat_function(distances[np.newaxis])[0]
+    batch_size = max(1, _permutation_batch_elements //
+                     (sample_size * num_groups))
+    stat, p_value = _run_monte_carlo_stats(test_stat_function, residuals,
+                                           permutations, random_state, n_jobs,
+                                           batch_size, stat)
+
+    return _build_results('PERMDISP', 'F-value', sample_size, num_groups,
+                          stat, p_value, permutations)
+
+
+def _centroid_distances(distance_matrix, grouping, indicators, group_sizes):
+    """Compute the distance of each object to the centroid of its group"""
+    squared_distances = np.asarray(distance_matrix.data,
+                                   dtype=np.float64) ** 2
+
+    # the sums of squared distances of each object to the objects of each
+    # group, and between the objects of each group
+    to_groups = squared_distances.dot(indicators)
+    within = (indicators * to_groups).sum(axis=0)
+
+    sample_range = np.arange(len(grouping))
+    squared = (to_groups[sample_range, grouping] / group_sizes[grouping] -
+               within[grouping] / (2 * group_sizes[grouping] ** 2))
+    return np.sqrt(np.abs(squared))
+
+
+def _median_distances(distance_matrix, grouping, indicators):
+    """Compute the distance of each object to the spatial median of its
+    group"""
+    eigvals, eigvecs = eigh(_gower_center(distance_matrix))
+
+    # discard axes with eigenvalues close to zero, and scale the others
+    tolerance = np.sqrt(np.finfo(np.float64).eps) * np.abs(eigvals).max()
+    coordinates = eigvecs * np.sqrt(np.abs(eigvals))
+
+    # the spatial medians are computed separately for the axes with positive
+    # and negative eigenvalues, like vegan does
+    squared = np.zeros(len(grouping))
+    for sign, axes in ((1, eigvals > tolerance), (-1, eigvals < -tolerance)):
+        if axes.any():
+            points = coordinates[:, axes]
+            medians = _spatial_medians(points, grouping, indicators)
+            squared += sign * ((points - medians[grouping]) ** 2).sum(axis=1)
+    return np.sqrt(np.abs(squared))
+
+
+def _spatial_medians(points, grouping, indicators, max_iter=1000):
+    """Compute the spatial median of the points of each group
+
+    Weiszfeld's algorithm is run for all groups at once, starting from the
+    centroids of the groups.
+
+    """
+    group_sizes = indicators.sum(axis=0)
+    medians = indicators.T.dot(points) / group_sizes[:, np.newaxis]
+    tolerance = np.sqrt(np.finfo(np.float64).eps)
+    for _ in range(max_iter):
+        distances = np.sqrt(((points - medians[grouping]) ** 2).sum(axis=1))
+        # points that coincide with the median of their group would get an
+        # infinite weight
+        weights = 1 / np.maximum(distances, tolerance)
+        updated = (indicators.T.dot(points * weights[:, np.newaxis]) /
+                   indicators.T.dot(weights)[:, np.newaxis])
+        converged = (np.abs(updated - medians).max() <=
+                     tolerance * max(np.abs(medians).max(), 1))
+        medians = updated
+        if converged:
+            break
+    return medians
+
+
+def _compute_f_stat(sample_size, num_groups, indicators, group_sizes,
+                    values):
+    """Compute the one-way ANOVA F statistic of each row of values."""
+    grand_means = values.mean(axis=1, keepdims=True)
+    group_means = values.dot(indicators) / group_sizes
+
+    # sums of squares between and within groups
+    ss_total = ((values - grand_means) ** 2).sum(axis=1)
+    ss_between = (group_sizes * (group_means - grand_means) ** 2).sum(axis=1)
+    ss_within = ss_total - ss_between
+
+    return ((ss_between / (num_groups - 1)) /
+            (ss_within / (sample_size - num_groups)))
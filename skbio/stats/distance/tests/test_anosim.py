@@ -11,11 +11,15 @@ from functools import partial
 from unittest import TestCase, main
 
 import numpy as np
+import numpy.testing as npt
 import pandas as pd
 from pandas.util.testing import assert_series_equal
+from scipy.spatial.distance import squareform
+from scipy.stats import rankdata
 
 from skbio import DistanceMatrix
 from skbio.stats.distance import anosim
+from skbio.stats.distance._anosim import _compute_r_stat
 
 
 class TestANOSIM(TestCase):
@@ -114,6 +118,35 @@ class TestANOSIM(TestCase):
         obs = anosim(self.dm_unequal, self.grouping_unequal_relabeled)
         self.assert_series_equal(obs, exp)
 
+    def test_random_state(self):
+        args = (self.dm_unequal, self.grouping_unequal)
+        obs1 = anosim(*args, random_state=42)
+        obs2 = anosim(*args, random_state=42)
+        self.assert_series_equal(obs1, obs2)
+
+        # the result doesn't depend on the number of jobs
+        obs3 = anosim(*args, random_state=42, n_jobs=2)
+        self.assert_series_equal(obs3, obs1)
+
+    def test_compute_r_stat_batch(self):
+        grouping = np.array([0, 1, 2, 1, 0, 0])
+        groupings = np.array([np.random.RandomState(i).permutation(grouping)
+                              for i in range(5)])
+        ranks = rankdata(self.dm_unequal.condensed_form())
+        compute = partial(_compute_r_stat, 6, 3, squareform(ranks), 4, 7.5)
+        obs = compute(groupings)
+
+        # compare with the mean ranks within and between groups
+        rows, cols = np.triu_indices(6, k=1)
+        exp = []
+        for g in groupings:
+            within = g[rows] == g[cols]
+            exp.append((ranks[~within].mean() - ranks[within].mean()) / 7.5)
+        npt.assert_almost_equal(obs, exp)
+        self.assertAlmostEqual(
+            compute(grouping[np.newaxis])[0], -0.363636,
+            places=6)
+
 
 if __name__ == '__main__':
     main()
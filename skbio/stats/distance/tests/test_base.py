@@ -7,7 +7,11 @@
 # ----------------------------------------------------------------------------
 
 import io
-from unittest import TestCase, main
+import itertools
+import os
+import tempfile
+from functools import partial
+from unittest import TestCase, main, mock
 
 import matplotlib as mpl
 import numpy as np
@@ -22,7 +26,8 @@ from skbio.stats.distance import (
     DissimilarityMatrixError, DistanceMatrixError, MissingIDError,
     DissimilarityMatrix, randdm)
 from skbio.stats.distance._base import (_preprocess_input,
-                                        _run_monte_carlo_stats)
+                                        _run_monte_carlo_stats,
+                                        _permutation_batch_sizes)
 from skbio.util import assert_data_frame_almost_equal
 from skbio.util._testing import assert_series_almost_equal
 
@@ -393,6 +398,49 @@ class DissimilarityMatrixTests(DissimilarityMatrixTestData):
         with self.assertRaises(DissimilarityMatrixError):
             self.dm_3x3.filter([])
 
+    def test_lookup(self):
+        dm = self.dm_3x3
+        npt.assert_equal(dm.lookup([('a', 'b'), ('c', 'a'), ('b', 'b'),
+                                    ('b', 'c')]), [0.01, 4.2, 0.0, 12.0])
+        npt.assert_equal(dm.lookup(['a', 'c', 'b'], iter(['b', 'a', 'c'])),
+                         [0.01, 4.2, 12.0])
+        self.assertEqual(dm.lookup([]).shape, (0,))
+
+        asym = self.dm_2x2_asym
+        npt.assert_equal(asym.lookup(['a', 'b'], ['b', 'a']),
+                         [asym['a', 'b'], asym['b', 'a']])
+
+    def test_lookup_invalid_input(self):
+        with self.assertRaises(MissingIDError):
+            self.dm_3x3.lookup([('a', 'b'), ('a', 'x')])
+        with self.assertRaises(MissingIDError):
+            self.dm_3x3.lookup(['a', 'x'], ['b', 'c'])
+        with self.assertRaises(ValueError):
+            self.dm_3x3.lookup(['a', 'b'], ['c'])
+        with self.assertRaises(ValueError):
+            self.dm_3x3.lookup([('a', 'b', 'c')])
+
+    def test_filter_view(self):
+        dm = DistanceMatrix(
+            scipy.spatial.distance.squareform(np.arange(1.0, 22.0)))
+        for ids in (['1', '2', '3'], ['0', '2', '4', '6'], ['5'],
+                    ['0', '3', '6']):
+            obs = dm.filter(ids, copy=False)
+            self.assertTrue(np.shares_memory(obs.data, dm.data))
+            self.assertFalse(obs.data.flags.writeable)
+            self.assertEqual(obs, DistanceMatrix(dm.data[np.ix_(
+                [int(i) for i in ids], [int(i) for i in ids])], ids))
+
+            # the filtered dissimilarities are copied by default
+            obs = dm.filter(ids)
+            self.assertFalse(np.shares_memory(obs.data, dm.data))
+
+        for ids in (['0', '1', '3'], ['3', '2'], ['6', '0']):
+            obs = dm.filter(ids, copy=False)
+            self.assertFalse(np.shares_memory(obs.data, dm.data))
+            self.assertEqual(obs, DistanceMatrix(dm.data[np.ix_(
+                [int(i) for i in ids], [int(i) for i in ids])], ids))
+
     def test_plot_default(self):
         fig = self.dm_1x1.plot()
         self.assertIsInstance(fig, mpl.figure.Figure)
@@ -611,6 +659,61 @@ class DistanceMatrixTests(DissimilarityMatrixTestData):
     def test_init_nans(self):
         with self.assertRaisesRegex(DistanceMatrixError, 'NaNs'):
             DistanceMatrix([[0.0, np.nan], [np.nan, 0.0]], ['a', 'b'])
+        with self.assertRaisesRegex(DistanceMatrixError, 'NaNs'):
+            DistanceMatrix([1.0, np.nan, 3.0])
+
+    def test_init_validate_false(self):
+        # trusted read-only data are used without a copy or a check of their
+        # values
+        data = np.array([[0.0, 2.0], [1.0, 0.0]])
+        data.flags.writeable = False
+        obs = DistanceMatrix(data, ['a', 'b'], validate=False)
+        self.assertIs(obs.data, data)
+
+        # the shape and IDs are still checked
+        with self.assertRaises(DissimilarityMatrixError):
+            DistanceMatrix([[0.0, 1.0]], ['a'], validate=False)
+        with self.assertRaises(DissimilarityMatrixError):
+            DistanceMatrix(data, ['a', 'a'], validate=False)
+
+    def test_init_known_symmetric(self):
+        # the read-only values of distance matrices and condensed distances
+        # are known to be valid
+        dms = []
+        for dm in self.dms:
+            data = dm.data.copy()
+            data.flags.writeable = False
+            dms.append(DistanceMatrix(data, dm.ids))
+        with mock.patch.object(DistanceMatrix, '_validate_values',
+                               side_effect=AssertionError):
+            for dm, condensed in zip(dms, self.dm_condensed_forms):
+                self.assertEqual(DistanceMatrix(dm), dm)
+                self.assertEqual(DistanceMatrix(condensed, dm.ids), dm)
+                self.assertEqual(DistanceMatrix(DissimilarityMatrix(dm)), dm)
+                self.assertEqual(dm.copy(), dm)
+                self.assertEqual(dm.filter(dm.ids[::-1]).ids, dm.ids[::-1])
+                self.assertEqual(
+                    DistanceMatrix(dm.filter(dm.ids, copy=False)), dm)
+
+        # writeable values, and read-only views of them, are copied, so that
+        # they can't be modified after they are checked
+        data = np.array(self.dm_3x3_data)
+        view = data.view()
+        view.flags.writeable = False
+        for dm in (DistanceMatrix(data, ['a', 'b', 'c']),
+                   DistanceMatrix(view, ['a', 'b', 'c'])):
+            self.assertFalse(np.shares_memory(dm.data, data))
+            self.assertFalse(dm.data.flags.writeable)
+        data[0, 1] = 77.0
+        self.assertEqual(dm, self.dm_3x3)
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix(DissimilarityMatrix(data))
+
+        # a DissimilarityMatrix isn't assumed to be symmetric
+        dm = DissimilarityMatrix([[0.0, 2.0], [1.0, 0.0]])
+        self.assertFalse(dm._symmetric)
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix(dm)
 
     def test_from_iterable_no_key(self):
         iterable = (x for x in range(4))
@@ -662,6 +765,44 @@ class DistanceMatrixTests(DissimilarityMatrixTestData):
         with self.assertRaises(DistanceMatrixError):
             DistanceMatrix.from_iterable(iterable, lambda a, b: b - a)
 
+    def test_from_iterable_n_jobs(self):
+        iterable = [0, 1, 4, 9, 16, 25, 36]
+        exp = DistanceMatrix.from_iterable(iterable, lambda a, b: abs(b - a))
+        for validate in (True, False):
+            obs = DistanceMatrix.from_iterable(iterable, _abs_difference,
+                                               validate=validate, n_jobs=2)
+            self.assertEqual(obs, exp)
+
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_iterable(iterable, _difference, n_jobs=2)
+        with self.assertRaises(ValueError):
+            DistanceMatrix.from_iterable(iterable, _abs_difference, n_jobs=0)
+
+    def test_from_iterable_pairwise_metric(self):
+        seqs = [Sequence('ACGTAC'), Sequence('ACGAAC', metadata={'id': 'b'}),
+                Sequence('AAAAAC'), Sequence('TTGTAC')]
+        metrics = [skbio.sequence.distance.hamming,
+                   partial(skbio.sequence.distance.kmer_distance, k=2),
+                   partial(skbio.sequence.distance.kmer_distance, k=3,
+                           overlap=False)]
+        for metric in metrics:
+            exp = DistanceMatrix.from_iterable(
+                seqs, lambda a, b: metric(a, b))
+            obs = DistanceMatrix.from_iterable(seqs, metric)
+            self.assertEqual(obs, exp)
+
+        obs = DistanceMatrix.from_iterable(
+            seqs, skbio.sequence.distance.hamming, keys=['a', 'b', 'c', 'd'])
+        self.assertEqual(obs.ids, ('a', 'b', 'c', 'd'))
+        self.assertEqual(obs['a', 'c'], 0.5)
+
+        with self.assertRaises(ValueError):
+            DistanceMatrix.from_iterable(seqs + [Sequence('A')],
+                                         skbio.sequence.distance.hamming)
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_iterable([Sequence(''), Sequence('')],
+                                         skbio.sequence.distance.hamming)
+
     def test_from_iterable_with_key(self):
         iterable = (x for x in range(4))
 
@@ -748,6 +889,175 @@ class DistanceMatrixTests(DissimilarityMatrixTestData):
             obs = dm.condensed_form()
             self.assertTrue(np.array_equal(obs, condensed))
 
+    def test_condensed_form_cached(self):
+        data = np.array(self.dm_3x3_data)
+        dm = DistanceMatrix(data, ['a', 'b', 'c'])
+        obs = dm.condensed_form()
+        self.assertIs(dm.condensed_form(), obs)
+        npt.assert_equal(obs, [0.01, 4.2, 12.0])
+        self.assertFalse(obs.flags.writeable)
+
+        # the distances are a copy of the caller's array, which can still be
+        # modified without making the condensed form stale
+        self.assertTrue(data.flags.writeable)
+        data[0, 1] = data[1, 0] = 99.0
+        self.assertIs(dm.condensed_form(), obs)
+        npt.assert_equal(obs, [0.01, 4.2, 12.0])
+        npt.assert_equal(dm.data[0], [0.0, 0.01, 4.2])
+
+        # the condensed form of a view of the distances is cached too
+        view = dm.filter(['a', 'b'], copy=False)
+        self.assertIs(view.condensed_form(), view.condensed_form())
+
+    def test_data_read_only(self):
+        data = np.array(self.dm_3x3_data)
+        dm = DistanceMatrix(data, ['a', 'b', 'c'])
+        self.assertFalse(dm.data.flags.writeable)
+        with self.assertRaises(ValueError):
+            dm.data[0, 1] = 98.0
+
+        # read-only distances are used without a copy
+        data.flags.writeable = False
+        self.assertIs(DistanceMatrix(data).data, data)
+
+        # the data of a DissimilarityMatrix stay writeable
+        self.assertTrue(DissimilarityMatrix(self.dm_3x3_data).data.flags
+                        .writeable)
+
+    def test_from_condensed(self):
+        for dm, condensed in zip(self.dms, self.dm_condensed_forms):
+            obs = DistanceMatrix.from_condensed(condensed, dm.ids)
+            # the condensed distances are stored without a copy
+            self.assertIs(obs.condensed_form(), condensed)
+            self.assertEqual(obs.shape, dm.shape)
+            self.assertEqual(obs.size, dm.size)
+            self.assertEqual(obs.dtype, np.double)
+            self.assertEqual(obs, dm)
+            self.assertEqual(obs['a', obs.ids[-1]], dm['a', dm.ids[-1]])
+
+    def test_from_condensed_default_ids(self):
+        obs = DistanceMatrix.from_condensed([0.01, 4.2, 12.0])
+        self.assertEqual(obs.ids, ('0', '1', '2'))
+        self.assertEqual(obs.dtype, np.double)
+        npt.assert_equal(obs.data, self.dm_3x3.data)
+
+        obs = DistanceMatrix.from_condensed(np.array([]))
+        self.assertEqual(obs.ids, ('0',))
+        npt.assert_equal(obs.data, [[0.0]])
+
+    def test_from_condensed_float32(self):
+        condensed = np.array([0.01, 4.2, 12.0], dtype=np.float32)
+        obs = DistanceMatrix.from_condensed(condensed, ['a', 'b', 'c'])
+        self.assertEqual(obs.dtype, np.float32)
+        self.assertEqual(obs.condensed_form().dtype, np.float32)
+        npt.assert_almost_equal(obs.data, self.dm_3x3.data, decimal=5)
+        self.assertEqual(obs.data.dtype, np.float32)
+        self.assertIs(obs.redundant_form(), obs.data)
+
+        obs.ids = ['x', 'y', 'z']
+        self.assertEqual(obs.ids, ('x', 'y', 'z'))
+        with self.assertRaises(DissimilarityMatrixError):
+            obs.ids = ['x', 'y']
+
+    def test_from_condensed_dtype(self):
+        obs = DistanceMatrix.from_condensed([1, 2, 3], dtype=np.float32)
+        self.assertEqual(obs.dtype, np.float32)
+        npt.assert_equal(obs.condensed_form(), [1, 2, 3])
+
+        condensed = np.array([1.0, 2.0, 3.0], dtype=np.float32)
+        obs = DistanceMatrix.from_condensed(condensed, dtype=np.float64)
+        self.assertEqual(obs.dtype, np.float64)
+        npt.assert_equal(obs.condensed_form(), [1, 2, 3])
+
+    def test_from_condensed_memmap(self):
+        condensed = np.arange(1, 11, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'dm.dat')
+            obs = DistanceMatrix.from_condensed(condensed, filename=filename)
+            self.assertIsInstance(obs.condensed_form(), np.memmap)
+            self.assertEqual(obs.dtype, np.float32)
+            npt.assert_equal(obs.condensed_form(), condensed)
+            self.assertIsNone(obs._data)
+
+            # an existing memory-mapped file is used without a copy
+            mapped = np.memmap(filename, dtype=np.float32, mode='r')
+            obs2 = DistanceMatrix.from_condensed(mapped, obs.ids)
+            self.assertIs(obs2.condensed_form(), mapped)
+            self.assertEqual(obs2, obs)
+            npt.assert_equal(obs2.data,
+                             scipy.spatial.distance.squareform(condensed))
+            del obs, obs2, mapped
+
+    def test_from_condensed_rows(self):
+        for dm, condensed in zip(self.dms, self.dm_condensed_forms):
+            obs = DistanceMatrix.from_condensed(condensed, dm.ids)
+            for i, id_ in enumerate(dm.ids):
+                npt.assert_equal(obs[id_], dm[id_])
+                npt.assert_equal(obs[i], dm[i])
+                npt.assert_equal(obs[i - len(dm.ids)], dm[i])
+                for other in dm.ids:
+                    self.assertEqual(obs[id_, other], dm[id_, other])
+            # rows are looked up without constructing the redundant form
+            self.assertIsNone(obs._data)
+
+            npt.assert_equal(obs[:, 0], dm[:, 0])
+            self.assertIsNotNone(obs._data)
+
+        obs = DistanceMatrix.from_condensed([1, 2, 3], dtype=np.float32)
+        self.assertEqual(obs['1'].dtype, np.float32)
+        with self.assertRaises(IndexError):
+            obs[3]
+        with self.assertRaises(MissingIDError):
+            obs['a']
+
+    def test_from_condensed_lookup(self):
+        for dm, condensed in zip(self.dms, self.dm_condensed_forms):
+            obs = DistanceMatrix.from_condensed(condensed, dm.ids)
+            pairs = list(itertools.product(dm.ids, repeat=2))
+            npt.assert_equal(obs.lookup(pairs), dm.lookup(pairs))
+            self.assertIsNone(obs._data)
+
+    def test_from_condensed_copy_filter(self):
+        dm = self.dm_3x3
+        obs = DistanceMatrix.from_condensed(
+            dm.condensed_form().astype(np.float32), dm.ids)
+
+        copy = obs.copy()
+        self.assertIsNot(copy.condensed_form(), obs.condensed_form())
+        self.assertEqual(copy, obs)
+        self.assertEqual(copy.dtype, np.float32)
+
+        for ids in (['a', 'c'], ['c', 'a', 'b'], ['b'], ['b', 'c']):
+            filtered = obs.filter(ids)
+            self.assertIsNone(filtered._data)
+            self.assertEqual(filtered.dtype, np.float32)
+            self.assertEqual(filtered.ids, tuple(ids))
+            npt.assert_almost_equal(filtered.data, dm.filter(ids).data,
+                                    decimal=5)
+        self.assertIsNone(obs._data)
+
+    def test_from_condensed_invalid_input(self):
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_condensed(np.array([1.0, 2.0]),
+                                          ['a', 'b', 'c'])
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_condensed(np.array([1.0, 2.0]))
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_condensed(np.array([]), [])
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_condensed(np.ones((3, 1)), ['a', 'b', 'c'])
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_condensed([1.0, np.nan, 3.0])
+        with self.assertRaises(DistanceMatrixError):
+            DistanceMatrix.from_condensed([1, 2, 3], dtype=np.int32)
+        with self.assertRaises(DissimilarityMatrixError):
+            DistanceMatrix.from_condensed(np.array([1.0, 2.0, 3.0]),
+                                          ['a', 'b', 'a'])
+        # NaNs are accepted if validation is disabled
+        obs = DistanceMatrix.from_condensed([1.0, np.nan, 3.0],
+                                            validate=False)
+        self.assertTrue(np.isnan(obs['0', '2']))
+
     def test_permute_condensed(self):
         # Can't really permute a 1x1 or 2x2...
         for _ in range(2):
@@ -772,6 +1082,15 @@ class DistanceMatrixTests(DissimilarityMatrixTestData):
         # times.
         self.assertEqual(self.dm_3x3, dm_copy)
 
+        # the same permutation is applied as without condensed=True
+        dm = DistanceMatrix(scipy.spatial.distance.pdist(
+            np.random.RandomState(1).rand(9, 2)))
+        for seed in range(5):
+            np.random.seed(seed)
+            obs = dm.permute(condensed=True)
+            np.random.seed(seed)
+            npt.assert_equal(obs, dm.permute().condensed_form())
+
     def test_permute_not_condensed(self):
         obs = self.dm_1x1.permute()
         self.assertEqual(obs, self.dm_1x1)
@@ -914,9 +1233,7 @@ class CategoricalStatsHelperFunctionTests(TestCase):
 
     def test_preprocess_input_with_valid_input(self):
         # Should obtain same result using grouping vector or data frame.
-        exp = (3, 2, np.array([0, 1, 0]),
-               (np.array([0, 0, 1]), np.array([1, 2, 2])),
-               np.array([1., 2., 3.]))
+        exp = (3, 2, np.array([0, 1, 0]), np.array([1., 2., 3.]))
 
         obs = _preprocess_input(self.dm, self.grouping, None)
         npt.assert_equal(obs, exp)
@@ -960,16 +1277,142 @@ class CategoricalStatsHelperFunctionTests(TestCase):
             _preprocess_input(self.dm, [1, 1, 1], None)
 
     def test_run_monte_carlo_stats_with_permutations(self):
-        obs = _run_monte_carlo_stats(lambda e: 42, self.grouping, 50)
+        obs = _run_monte_carlo_stats(lambda e: np.full(len(e), 42),
+                                     self.grouping, 50)
         npt.assert_equal(obs, (42, 1.0))
 
     def test_run_monte_carlo_stats_no_permutations(self):
-        obs = _run_monte_carlo_stats(lambda e: 42, self.grouping, 0)
+        obs = _run_monte_carlo_stats(lambda e: np.full(len(e), 42),
+                                     self.grouping, 0)
         npt.assert_equal(obs, (42, np.nan))
 
     def test_run_monte_carlo_stats_invalid_permutations(self):
         with self.assertRaises(ValueError):
-            _run_monte_carlo_stats(lambda e: 42, self.grouping, -1)
+            _run_monte_carlo_stats(lambda e: np.full(len(e), 42),
+                                   self.grouping, -1)
+
+    def test_run_monte_carlo_stats_batches(self):
+        # the statistic is computed for batches of grouping vectors, which
+        # are all permutations of the original grouping vector
+        batches = []
+
+        def stat_f(groupings):
+            batches.append(groupings)
+            return groupings[:, 0]
+
+        grouping = np.array([0, 1, 1, 2, 2, 2])
+        for random_state in (None, 3):
+            batches.clear()
+            _run_monte_carlo_stats(stat_f, grouping, 20,
+                                   random_state=random_state)
+            npt.assert_array_equal(batches[0], [grouping])
+            permuted = np.concatenate(batches[1:])
+            self.assertEqual(permuted.shape, (20, 6))
+            npt.assert_array_equal(np.sort(permuted, axis=1),
+                                   np.tile(grouping, (20, 1)))
+
+    def test_run_monte_carlo_stats_batch_sizes(self):
+        self.assertEqual(_permutation_batch_sizes(5, 10), [10])
+        n = 2 ** 10
+        self.assertEqual(_permutation_batch_sizes(n, 17), [8, 8, 1])
+        self.assertEqual(_permutation_batch_sizes(2 ** 13, 3), [1, 1, 1])
+
+    def test_run_monte_carlo_stats_random_state(self):
+        grouping = np.arange(10)
+
+        def stat_f(groupings):
+            return (groupings * np.arange(10)).sum(axis=1)
+
+        obs1 = _run_monte_carlo_stats(stat_f, grouping, 99, random_state=42)
+        obs2 = _run_monte_carlo_stats(stat_f, grouping, 99, random_state=42)
+        self.assertEqual(obs1, obs2)
+
+        obs3 = _run_monte_carlo_stats(
+            stat_f, grouping, 99, random_state=np.random.RandomState(42))
+        obs4 = _run_monte_carlo_stats(
+            stat_f, grouping, 99, random_state=np.random.RandomState(42))
+        self.assertEqual(obs3, obs4)
+
+        np.random.seed(0)
+        obs5 = _run_monte_carlo_stats(stat_f, grouping, 99)
+        np.random.seed(0)
+        obs6 = _run_monte_carlo_stats(stat_f, grouping, 99)
+        self.assertEqual(obs5, obs6)
+
+        with self.assertRaises(ValueError):
+            _run_monte_carlo_stats(stat_f, grouping, 99, random_state=-1)
+        with self.assertRaises(ValueError):
+            _run_monte_carlo_stats(stat_f, grouping, 99, random_state='a')
+
+    def test_run_monte_carlo_stats_n_jobs(self):
+        grouping = np.arange(10)
+        stat_f = partial(_weighted_sums, np.arange(10))
+        exp = _run_monte_carlo_stats(stat_f, grouping, 99, random_state=7)
+        obs = _run_monte_carlo_stats(stat_f, grouping, 99, random_state=7,
+                                     n_jobs=2)
+        self.assertEqual(obs, exp)
+
+        with self.assertRaises(ValueError):
+            _run_monte_carlo_stats(stat_f, grouping, 99, n_jobs=0)
+
+    def test_run_monte_carlo_stats_ties(self):
+        # permuted statistics that only differ from the original statistic
+        # by rounding errors count as being as extreme
+        obs = _run_monte_carlo_stats(
+            lambda e: np.where(e[:, 0] == 1, 0.1 + 0.2, 0.3), self.grouping,
+            99)
+        npt.assert_equal(obs, (0.1 + 0.2, 1.0))
+
+    def test_run_monte_carlo_stats_multiple_stats(self):
+        def stat_f(groupings):
+            return np.column_stack([np.full(len(groupings), 2.0),
+                                    groupings[:, 0]])
+
+        stat, p_value = _run_monte_carlo_stats(stat_f, [5, 1, 1], 99,
+                                               random_state=0)
+        npt.assert_equal(stat, [2, 5])
+        self.assertEqual(p_value[0], 1)
+        self.assertTrue(p_value[1] < 1)
+
+        stat, p_value = _run_monte_carlo_stats(stat_f, [5, 1, 1], 0)
+        npt.assert_equal(p_value, [np.nan, np.nan])
+
+    def test_run_monte_carlo_stats_batch_size(self):
+        sizes = []
+
+        def stat_f(groupings):
+            sizes.append(len(groupings))
+            return groupings[:, 0]
+
+        _run_monte_carlo_stats(stat_f, self.grouping, 10, batch_size=4)
+        self.assertEqual(sizes, [1, 4, 4, 2])
+
+    def test_run_monte_carlo_stats_precomputed_stat(self):
+        # the test statistic isn't computed from the original grouping when
+        # it is provided
+        sizes = []
+
+        def stat_f(groupings):
+            sizes.append(len(groupings))
+            return groupings[:, 0]
+
+        stat, p_value = _run_monte_carlo_stats(stat_f, [5, 1, 1], 99,
+                                               random_state=0, stat=0.5)
+        self.assertEqual(stat, 0.5)
+        self.assertEqual(p_value, 1)
+        self.assertEqual(sum(sizes), 99)
+
+
+def _weighted_sums(weights, groupings):
+    return (groupings * weights).sum(axis=1)
+
+
+def _abs_difference(a, b):
+    return abs(b - a)
+
+
+def _difference(a, b):
+    return b - a
 
 
 if __name__ == '__main__':
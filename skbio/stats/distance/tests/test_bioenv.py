@@ -10,6 +10,7 @@ from unittest import TestCase, main
 
 import numpy as np
 import pandas as pd
+from scipy.spatial.distance import pdist, squareform
 
 from skbio import DistanceMatrix
 from skbio.stats.distance import bioenv
@@ -148,6 +149,47 @@ class BIOENVTests(TestCase):
         obs = bioenv(self.dm_vegan, self.df_vegan)
         assert_data_frame_almost_equal(obs, self.exp_results_vegan)
 
+    def test_bioenv_n_jobs(self):
+        obs = bioenv(self.dm, self.df, n_jobs=2)
+        assert_data_frame_almost_equal(obs, self.exp_results)
+
+    def test_bioenv_stepwise(self):
+        obs = bioenv(self.dm_vegan, self.df_vegan, search='stepwise')
+        exhaustive = bioenv(self.dm_vegan, self.df_vegan)
+        self.assertEqual(list(obs['size']), list(exhaustive['size']))
+
+        # the best single variable is the same as with the exhaustive search
+        self.assertEqual(obs.index[0], exhaustive.index[0])
+        self.assertAlmostEqual(obs['correlation'].iloc[0],
+                               exhaustive['correlation'].iloc[0])
+
+        # the exhaustive search finds subsets at least as good
+        self.assertTrue((exhaustive['correlation'].values >=
+                         obs['correlation'].values - 1e-12).all())
+        self.assertAlmostEqual(obs['correlation'].iloc[-1],
+                               exhaustive['correlation'].iloc[-1])
+
+        obs2 = bioenv(self.dm_vegan, self.df_vegan, search='stepwise',
+                      n_jobs=2)
+        assert_data_frame_almost_equal(obs2, obs)
+
+    def test_bioenv_stepwise_removal(self):
+        # variables are removed when this improves on the best smaller
+        # subset, so the best pair doesn't contain the best single variable
+        rs = np.random.RandomState(0)
+        dm = DistanceMatrix(squareform(pdist(rs.rand(8, 2))))
+        df = pd.DataFrame(rs.rand(8, 5), index=dm.ids,
+                          columns=['a', 'b', 'c', 'd', 'e'])
+        obs = bioenv(dm, df, search='stepwise')
+        self.assertEqual(list(obs.index),
+                         ['e', 'b, c', 'b, c, e', 'b, c, d, e',
+                          'a, b, c, d, e'])
+        assert_data_frame_almost_equal(obs, bioenv(dm, df))
+
+    def test_bioenv_invalid_search(self):
+        with self.assertRaises(ValueError):
+            bioenv(self.dm, self.df, search='backward')
+
     def test_bioenv_no_distance_matrix(self):
         with self.assertRaises(TypeError):
             bioenv('breh', self.df)
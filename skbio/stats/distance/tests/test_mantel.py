@@ -11,11 +11,13 @@ from unittest import TestCase, main
 import numpy as np
 import numpy.testing as npt
 import pandas as pd
+from scipy.stats import pearsonr
 
 from skbio import DistanceMatrix
 from skbio.stats.distance import (DissimilarityMatrixError,
                                   DistanceMatrixError, mantel, pwmantel)
-from skbio.stats.distance._mantel import _order_dms
+from skbio.stats.distance._mantel import (_order_dms, _permuted_corr,
+                                          _standardize)
 from skbio.util import get_data_path, assert_data_frame_almost_equal
 
 
@@ -238,6 +240,43 @@ class MantelTests(MantelTestData):
         self.assertAlmostEqual(obs[1], 0.003)
         self.assertEqual(obs[2], 24)
 
+    def test_random_state(self):
+        for method in self.methods:
+            for alt in self.alternatives:
+                obs1 = mantel(self.veg_dm_vegan, self.env_dm_vegan,
+                              method=method, alternative=alt,
+                              permutations=199, random_state=7)
+                obs2 = mantel(self.veg_dm_vegan, self.env_dm_vegan,
+                              method=method, alternative=alt,
+                              permutations=199, random_state=7, n_jobs=2)
+                self.assertEqual(obs1, obs2)
+                self.assertTrue(obs1[1] < 0.05 if alt != 'less' else
+                                obs1[1] > 0.95)
+
+    def test_permuted_corr(self):
+        x = DistanceMatrix(self.veg_dm_vegan)
+        y_flat = DistanceMatrix(self.env_dm_vegan).condensed_form()
+        x_std = DistanceMatrix(_standardize(x.condensed_form())).data
+        y_std = _standardize(y_flat)
+        rows, cols = np.triu_indices(24, k=1)
+
+        orders = np.array([np.random.RandomState(i).permutation(24)
+                           for i in range(5)])
+        exp = [pearsonr(x.filter([x.ids[i] for i in order]).condensed_form(),
+                        y_flat)[0]
+               for order in orders]
+        obs = _permuted_corr(x_std, y_std, rows, cols, 'greater', orders)
+        npt.assert_almost_equal(obs, exp)
+        obs = _permuted_corr(x_std, y_std, rows, cols, 'less', orders)
+        npt.assert_almost_equal(obs, -np.array(exp))
+        obs = _permuted_corr(x_std, y_std, rows, cols, 'two-sided', orders)
+        npt.assert_almost_equal(obs, np.abs(exp))
+
+    def test_standardize(self):
+        obs = _standardize(np.array([1.0, 2.0, 3.0]))
+        npt.assert_almost_equal(obs, [-0.5 ** 0.5, 0, 0.5 ** 0.5])
+        self.assertIsNone(_standardize(np.array([2.0, 2.0, 2.0])))
+
     def test_no_variation_pearson(self):
         # Output doesn't match vegan::mantel with method='pearson'. Consider
         # revising output and this test depending on outcome of
@@ -371,6 +410,15 @@ class PairwiseMantelTests(MantelTestData):
             obs,
             self.exp_results_minimal_with_labels)
 
+    def test_random_state(self):
+        obs1 = pwmantel(self.min_dms, alternative='greater', random_state=3)
+        obs2 = pwmantel(self.min_dms, alternative='greater', random_state=3,
+                        n_jobs=2)
+        assert_data_frame_almost_equal(obs1, obs2)
+        assert_data_frame_almost_equal(
+            obs1[['statistic', 'n']],
+            self.exp_results_minimal[['statistic', 'n']])
+
     def test_duplicate_dms(self):
         obs = pwmantel((self.minx_dm, self.minx_dm, self.minx_dm),
                        alternative='less')
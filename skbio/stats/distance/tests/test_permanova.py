@@ -11,11 +11,13 @@ from functools import partial
 from unittest import TestCase, main
 
 import numpy as np
+import numpy.testing as npt
 import pandas as pd
-from pandas.util.testing import assert_series_equal
+from pandas.util.testing import assert_series_equal, assert_frame_equal
 
 from skbio import DistanceMatrix
-from skbio.stats.distance import permanova
+from skbio.stats.distance import permanova, adonis
+from skbio.stats.distance._permanova import _compute_f_stat
 
 
 class TestPERMANOVA(TestCase):
@@ -114,6 +116,144 @@ class TestPERMANOVA(TestCase):
         obs = permanova(self.dm_unequal, self.grouping_unequal_relabeled)
         self.assert_series_equal(obs, exp)
 
+    def test_random_state(self):
+        args = (self.dm_unequal, self.grouping_unequal)
+        obs1 = permanova(*args, random_state=42)
+        obs2 = permanova(*args, random_state=42)
+        self.assert_series_equal(obs1, obs2)
+
+        # the result doesn't depend on the number of jobs
+        obs3 = permanova(*args, random_state=42, n_jobs=2)
+        self.assert_series_equal(obs3, obs1)
+
+    def test_compute_f_stat_batch(self):
+        # the statistic of each grouping vector of a batch is the same as if
+        # it were computed alone
+        grouping = np.array([0, 1, 2, 1, 0, 0])
+        groupings = np.array([np.random.RandomState(i).permutation(grouping)
+                              for i in range(5)])
+        compute = partial(_compute_f_stat, 6, 3, self.dm_unequal.data ** 2,
+                          np.bincount(grouping),
+                          (self.dm_unequal.condensed_form() ** 2).sum() / 6)
+        obs = compute(groupings)
+        exp = [compute(g[np.newaxis])[0] for g in groupings]
+        npt.assert_almost_equal(obs, exp)
+        self.assertAlmostEqual(
+            compute(grouping[np.newaxis])[0], 0.578848,
+            places=6)
+
+
+class TestAdonis(TestCase):
+    def setUp(self):
+        self.dm = DistanceMatrix([[0, 1, 5, 4, 3, 6],
+                                  [1, 0, 3, 2, 4, 5],
+                                  [5, 3, 0, 3, 2, 1],
+                                  [4, 2, 3, 0, 3, 2],
+                                  [3, 4, 2, 3, 0, 1],
+                                  [6, 5, 1, 2, 1, 0]], list('abcdef'))
+        # Ordering of IDs shouldn't matter, nor should extra IDs.
+        self.metadata = pd.DataFrame(
+            {'treatment': ['t', 't', 't', 'c', 'c', 't', 'c'],
+             'ph': [6.0, 5.5, 4.5, 7.0, 6.5, 5.0, 8.0],
+             'site': ['1', '2', '1', '1', '2', '2', '2']},
+            index=list('defabcg'))
+        self.columns = ['df', 'sum of squares', 'mean squares', 'pseudo-F',
+                        'R2', 'p-value']
+
+    def test_adonis(self):
+        obs = adonis(self.dm, self.metadata, ['treatment', 'ph'],
+                     permutations=0)
+        exp = pd.DataFrame(
+            [[1, 20.666667, 20.666667, 13.115311, 0.733728, np.nan],
+             [1, 2.773333, 2.773333, 1.760001, 0.098462, np.nan],
+             [3, 4.726667, 1.575556, np.nan, 0.167811, np.nan],
+             [5, 28.166667, np.nan, np.nan, 1.0, np.nan]],
+            index=['treatment', 'ph', 'Residuals', 'Total'],
+            columns=self.columns)
+        assert_frame_equal(obs, exp, check_dtype=False,
+                           check_less_precise=True)
+
+    def test_adonis_single_factor(self):
+        # same as permanova with a single factor
+        np.random.seed(0)
+        grouping = self.metadata.loc[list(self.dm.ids), 'treatment']
+        exp = permanova(self.dm, grouping.values)
+        np.random.seed(0)
+        obs = adonis(self.dm, self.metadata, 'treatment')
+        self.assertAlmostEqual(obs.loc['treatment', 'pseudo-F'],
+                               exp['test statistic'])
+        self.assertEqual(obs.loc['treatment', 'p-value'], exp['p-value'])
+
+    def test_adonis_sequential(self):
+        # the sums of squares of the terms depend on their order, but add up
+        # to the same total
+        obs1 = adonis(self.dm, self.metadata, ['treatment', 'ph', 'site'],
+                      permutations=0)
+        obs2 = adonis(self.dm, self.metadata, ['site', 'ph', 'treatment'],
+                      permutations=0)
+        self.assertNotAlmostEqual(obs1.loc['ph', 'sum of squares'],
+                                  obs2.loc['ph', 'sum of squares'])
+        self.assertAlmostEqual(obs1.loc['Residuals', 'sum of squares'],
+                               obs2.loc['Residuals', 'sum of squares'])
+        npt.assert_almost_equal(obs1['R2'][:4].sum(), 1)
+
+    def test_adonis_hat_matrices(self):
+        # compare to the sums of squares computed from the hat matrices of
+        # the nested models
+        rs = np.random.RandomState(0)
+        data = rs.rand(20, 20)
+        data = data + data.T
+        np.fill_diagonal(data, 0)
+        dm = DistanceMatrix(data)
+        metadata = pd.DataFrame({'a': rs.choice(list('xyz'), 20),
+                                 'b': rs.rand(20)}, index=dm.ids)
+
+        centering = np.eye(20) - 1 / 20
+        gower = -0.5 * centering.dot(data ** 2).dot(centering)
+        designs = [np.ones((20, 1))]
+        designs.append(np.hstack([designs[0],
+                                  pd.get_dummies(metadata['a']).values]))
+        designs.append(np.hstack([designs[1], metadata[['b']].values]))
+        hats = [X.dot(np.linalg.pinv(X)) for X in designs]
+        exp = [np.trace((hats[1] - hats[0]).dot(gower)),
+               np.trace((hats[2] - hats[1]).dot(gower)),
+               np.trace((np.eye(20) - hats[2]).dot(gower))]
+
+        obs = adonis(dm, metadata, ['a', 'b'], permutations=0)
+        npt.assert_almost_equal(obs['sum of squares'][:3], exp)
+        npt.assert_array_equal(obs['df'], [2, 1, 16, 19])
+        npt.assert_almost_equal(obs['pseudo-F'][:2],
+                                [exp[0] / 2 / (exp[2] / 16),
+                                 exp[1] / (exp[2] / 16)])
+
+    def test_adonis_random_state(self):
+        args = (self.dm, self.metadata, ['treatment', 'ph'])
+        obs1 = adonis(*args, permutations=99, random_state=3)
+        obs2 = adonis(*args, permutations=99, random_state=3, n_jobs=2)
+        assert_frame_equal(obs1, obs2)
+        self.assertTrue((obs1['p-value'][:2] > 0).all())
+        self.assertTrue(obs1['p-value'][2:].isnull().all())
+
+    def test_adonis_invalid_input(self):
+        with self.assertRaises(TypeError):
+            adonis(self.dm.data, self.metadata, 'ph')
+        with self.assertRaises(ValueError):
+            adonis(self.dm, self.metadata, [])
+        with self.assertRaises(ValueError):
+            adonis(self.dm, self.metadata, ['ph', 'ph'])
+        with self.assertRaises(ValueError):
+            adonis(self.dm, self.metadata, 'foo')
+        with self.assertRaises(ValueError):
+            adonis(self.dm, self.metadata.drop('a'), 'ph')
+        # a term can't be explained by the previous terms
+        metadata = self.metadata.assign(ph2=self.metadata['ph'] * 2)
+        with self.assertRaisesRegex(ValueError, 'ph2'):
+            adonis(self.dm, metadata, ['ph', 'ph2'])
+        # a saturated model has no residual degrees of freedom
+        metadata = self.metadata.assign(id=self.metadata.index)
+        with self.assertRaisesRegex(ValueError, 'residual'):
+            adonis(self.dm, metadata, ['id'])
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,142 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+from pandas.util.testing import assert_series_equal
+from scipy.spatial.distance import pdist, squareform
+from scipy.stats import f_oneway
+
+from skbio import DistanceMatrix
+from skbio.stats.distance import permdisp
+from skbio.stats.distance._permdisp import (_centroid_distances,
+                                            _median_distances,
+                                            _spatial_medians)
+
+
+class TestPERMDISP(TestCase):
+    def setUp(self):
+        self.points = np.array([[1, 0], [-1, 1], [0, 1], [1, -1], [0, 0],
+                                [12, 1], [8, 0], [10, 3], [9, -2], [11, -1]],
+                               dtype=float)
+        self.grouping = np.array([0] * 5 + [1] * 5)
+        self.ids = ['s%d' % i for i in range(10)]
+        self.dm = DistanceMatrix(squareform(pdist(self.points)), self.ids)
+        self.indicators = np.zeros((10, 2))
+        self.indicators[np.arange(10), self.grouping] = 1
+
+        # a non-Euclidean distance matrix, whose principal coordinates have
+        # negative eigenvalues
+        self.dm_non_euclidean = DistanceMatrix(
+            squareform(pdist(self.points, 'cityblock')) ** 0.5 * 3)
+
+        self.exp_index = ['method name', 'test statistic name', 'sample size',
+                          'number of groups', 'test statistic', 'p-value',
+                          'number of permutations']
+
+    def test_centroid_distances(self):
+        centroids = np.array([self.points[:5].mean(axis=0),
+                              self.points[5:].mean(axis=0)])
+        exp = np.sqrt(((self.points - centroids[self.grouping]) ** 2).sum(
+            axis=1))
+        obs = _centroid_distances(self.dm, self.grouping, self.indicators,
+                                  np.array([5, 5]))
+        npt.assert_almost_equal(obs, exp)
+
+    def test_median_distances_euclidean(self):
+        medians = _spatial_medians(self.points, self.grouping,
+                                   self.indicators)
+        exp = np.sqrt(((self.points - medians[self.grouping]) ** 2).sum(
+            axis=1))
+        obs = _median_distances(self.dm, self.grouping, self.indicators)
+        npt.assert_almost_equal(obs, exp, decimal=5)
+
+    def test_spatial_medians(self):
+        # the spatial median minimizes the sum of distances to the points
+        medians = _spatial_medians(self.points, self.grouping,
+                                   self.indicators)
+        for group, median in enumerate(medians):
+            points = self.points[self.grouping == group]
+            total = np.sqrt(((points - median) ** 2).sum(axis=1)).sum()
+            for shift in ([1e-3, 0], [0, 1e-3], [-1e-3, 0], [0, -1e-3]):
+                shifted = np.sqrt(((points - median - shift) ** 2).sum(
+                    axis=1)).sum()
+                self.assertLessEqual(total, shifted)
+
+    def test_centroid_distances_non_euclidean(self):
+        # without the principal coordinates, the same distances are obtained
+        # with both approaches when all objects of a group are their own
+        # spatial median, i.e. with groups of at most two objects
+        grouping = np.arange(10) // 2
+        indicators = np.zeros((10, 5))
+        indicators[np.arange(10), grouping] = 1
+        centroid = _centroid_distances(self.dm_non_euclidean, grouping,
+                                       indicators, np.bincount(grouping))
+        median = _median_distances(self.dm_non_euclidean, grouping,
+                                   indicators)
+        npt.assert_almost_equal(centroid, median)
+        exp = self.dm_non_euclidean.data[np.arange(0, 10, 2),
+                                         np.arange(1, 10, 2)] / 2
+        npt.assert_almost_equal(centroid, np.repeat(exp, 2))
+
+    def test_f_stat(self):
+        for test in ('centroid', 'median'):
+            if test == 'centroid':
+                distances = _centroid_distances(
+                    self.dm_non_euclidean, self.grouping, self.indicators,
+                    np.array([5, 5]))
+            else:
+                distances = _median_distances(
+                    self.dm_non_euclidean, self.grouping, self.indicators)
+            exp = f_oneway(distances[:5], distances[5:]).statistic
+            obs = permdisp(self.dm_non_euclidean, self.grouping, test=test,
+                           permutations=0)
+            self.assertAlmostEqual(obs['test statistic'], exp)
+
+    def test_permdisp(self):
+        exp = pd.Series(index=self.exp_index,
+                        data=['PERMDISP', 'F-value', 10, 2, 16.572485, 0.007,
+                              999],
+                        name='PERMDISP results')
+        obs = permdisp(self.dm, self.grouping, random_state=42)
+        self.assertAlmostEqual(obs['test statistic'], 16.572485, places=6)
+        obs['test statistic'] = 16.572485
+        assert_series_equal(obs, exp)
+
+    def test_permdisp_median(self):
+        obs = permdisp(self.dm, self.grouping, test='median',
+                       random_state=42)
+        self.assertAlmostEqual(obs['test statistic'], 10.306236, places=5)
+        self.assertAlmostEqual(obs['p-value'], 0.001)
+
+    def test_permdisp_random_state(self):
+        obs1 = permdisp(self.dm_non_euclidean, self.grouping,
+                        permutations=199, random_state=3)
+        obs2 = permdisp(self.dm_non_euclidean, self.grouping,
+                        permutations=199, random_state=3, n_jobs=2)
+        assert_series_equal(obs1, obs2)
+
+    def test_permdisp_no_permutations(self):
+        obs = permdisp(self.dm, self.grouping, permutations=0)
+        self.assertTrue(np.isnan(obs['p-value']))
+        self.assertEqual(obs['number of permutations'], 0)
+
+    def test_permdisp_invalid_input(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown test'):
+            permdisp(self.dm, self.grouping, test='mean')
+        with self.assertRaises(ValueError):
+            permdisp(self.dm, self.grouping[:5])
+        with self.assertRaises(ValueError):
+            permdisp(self.dm, self.grouping, permutations=-1)
+
+
+if __name__ == '__main__':
+    main()
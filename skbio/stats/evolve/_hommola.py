@@ -6,15 +6,22 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import multiprocessing
+from functools import partial
+
 import numpy as np
 from scipy.stats import pearsonr
 
 from skbio import DistanceMatrix
+from skbio.stats.distance._base import (_base_seed, _permutation_batch_sizes,
+                                        _permutation_batch_elements)
 from skbio.util._decorator import experimental
+from skbio.util._parallel import _resolve_n_jobs
 
 
 @experimental(as_of="0.4.0")
-def hommola_cospeciation(host_dist, par_dist, interaction, permutations=999):
+def hommola_cospeciation(host_dist, par_dist, interaction, permutations=999,
+                         random_state=None, n_jobs=1):
     """Perform Hommola et al (2009) host/parasite cospeciation test.
 
     This test for host/parasite cospeciation is as described in [1]_. This test
@@ -74,6 +81,13 @@ def hommola_cospeciation(host_dist, par_dist, interaction, permutations=999):
         Number of permutations used to compute p-value. Must be greater than or
         equal to zero. If zero, statistical significance calculations will be
         skipped and the p-value will be ``np.nan``.
+    random_state : int or np.random.RandomState, optional
+        Seed or random state used to draw the permutations. If ``None`` (the
+        default), permutations are drawn from NumPy's global random state.
+    n_jobs : int, optional
+        Number of processes used to evaluate the permutations. ``-1`` uses all
+        CPUs. For a given `random_state`, the result doesn't depend on
+        `n_jobs`.
 
     Returns
     -------
@@ -100,6 +114,27 @@ def hommola_cospeciation(host_dist, par_dist, interaction, permutations=999):
 
     This code is loosely based on the original R code from [1]_.
 
+    Permutations are evaluated in batches: the permuted indices of hosts and
+    parasites of a batch are stacked into index matrices (one row per
+    permutation), and the correlation coefficients of all permutations of the
+    batch are computed at once. When there are many interactions relative to
+    the numbers of hosts and parasites, the pairs of interactions aren't
+    enumerated: the sums of distances are computed from the numbers of
+    interactions of each host and parasite, and the sum of the products of
+    host and parasite distances from products of the distance matrices with
+    the permuted interaction matrices. Otherwise, the distances of all pairs
+    of interactions are gathered for the batch, and the correlation
+    coefficients are computed from the centered rows.
+
+    If `random_state` is ``None`` and a single job is used, the indices are
+    shuffled with ``np.random.shuffle``, so results are reproducible with
+    ``np.random.seed``. Otherwise, each batch is drawn from
+    its own random state, derived from `random_state` and the index of the
+    batch, and batches can be evaluated by several processes.
+
+    A permuted correlation coefficient that only differs from the observed
+    one by rounding errors is counted as being as large as the observed one.
+
     References
     ----------
     .. [1] Hommola K, Smith JE, Qiu Y, Gilks WR (2009) A Permutation Test of
@@ -176,35 +211,160 @@ def hommola_cospeciation(host_dist, par_dist, interaction, permutations=999):
 
     # calculate the observed correlation coefficient for these hosts/symbionts
     corr_coeff = pearsonr(x, y)[0]
-
-    # now do permutatitons. initialize index lists of the appropriate size
-    mp = np.arange(num_pars)
-    mh = np.arange(num_hosts)
-
-    # initialize list of shuffled correlation vals
-    perm_stats = np.empty(permutations)
+    n_jobs = _resolve_n_jobs(n_jobs)
 
     if permutations == 0 or np.isnan(corr_coeff):
         p_value = np.nan
-        perm_stats.fill(np.nan)
+        perm_stats = np.full(permutations, np.nan)
     else:
-        for i in range(permutations):
-            # generate a shuffled list of indexes for each permutation. this
-            # effectively randomizes which host is associated with which
-            # symbiont, but maintains the distribution of genetic distances
-            np.random.shuffle(mp)
-            np.random.shuffle(mh)
+        num_pairs = len(hosts_k_labels)
+        if (num_hosts * num_pars * (num_hosts + num_pars) <=
+                _products_cost_ratio * num_pairs):
+            corr_function = partial(_permuted_corr_products, host_dist.data,
+                                    par_dist.data, hosts, pars)
+            batch_size = max(1, _permutation_batch_elements //
+                             (num_hosts * num_pars))
+        else:
+            corr_function = partial(_permuted_corr, host_dist.data,
+                                    par_dist.data, hosts_k_labels,
+                                    hosts_t_labels, pars_k_labels,
+                                    pars_t_labels)
+            batch_size = None
+        batch_sizes = _permutation_batch_sizes(len(pars), permutations,
+                                               batch_size)
+
+        if random_state is None and n_jobs == 1:
+            # now do permutations. initialize index lists of the appropriate
+            # size
+            mp = np.arange(num_pars)
+            mh = np.arange(num_hosts)
+            perm_stats = []
+            for size in batch_sizes:
+                mps = np.empty((size, num_pars), dtype=int)
+                mhs = np.empty((size, num_hosts), dtype=int)
+                for i in range(size):
+                    # generate a shuffled list of indexes for each
+                    # permutation. this effectively randomizes which host is
+                    # associated with which symbiont, but maintains the
+                    # distribution of genetic distances
+                    np.random.shuffle(mp)
+                    np.random.shuffle(mh)
+                    mps[i] = mp
+                    mhs[i] = mh
+                perm_stats.append(corr_function(mhs, mps))
+        else:
+            base_seed = _base_seed(random_state)
+            batches = [(base_seed, i, size)
+                       for i, size in enumerate(batch_sizes)]
+            if n_jobs == 1:
+                perm_stats = [_shuffled_corr(corr_function, num_hosts,
+                                             num_pars, *batch)
+                              for batch in batches]
+            else:
+                pool = multiprocessing.Pool(
+                    n_jobs, initializer=_hommola_worker_init,
+                    initargs=(corr_function, num_hosts, num_pars))
+                try:
+                    perm_stats = pool.starmap(_hommola_worker, batches)
+                finally:
+                    pool.terminate()
+        perm_stats = np.concatenate(perm_stats)
+
+        # compare with the observed coefficient computed in the same way as
+        # the permuted ones, with a tolerance for rounding errors
+        stat = corr_function(np.arange(num_hosts)[np.newaxis],
+                             np.arange(num_pars)[np.newaxis])[0]
+        tolerance = np.sqrt(np.finfo(np.float64).eps) * max(abs(stat), 1)
+        p_value = (((perm_stats >= stat - tolerance).sum() + 1) /
+                   (permutations + 1))
+
+    return corr_coeff, p_value, perm_stats
 
-            # get pairwise distances in shuffled order
-            y_p = _get_dist(pars_k_labels, pars_t_labels, par_dist.data, mp)
-            x_p = _get_dist(hosts_k_labels, hosts_t_labels, host_dist.data, mh)
 
-            # calculate shuffled correlation coefficient
-            perm_stats[i] = pearsonr(x_p, y_p)[0]
+# Relative cost of an element of the products of distance and interaction
+# matrices, compared to gathering the distances of a pair of interactions.
+_products_cost_ratio = 1000
 
-        p_value = ((perm_stats >= corr_coeff).sum() + 1) / (permutations + 1)
 
-    return corr_coeff, p_value, perm_stats
+def _permuted_corr_products(host_dists, par_dists, hosts, pars, host_orders,
+                            par_orders):
+    """Compute the correlation coefficient of each permutation of a batch
+    from products of the distance matrices and the interaction matrices
+
+    The interactions are given by the host and parasite of each interaction,
+    as returned by ``np.nonzero``.
+
+    """
+    num_perms = len(host_orders)
+    num_pairs = len(hosts) * (len(hosts) - 1) / 2
+
+    # interaction matrix of each permutation
+    interactions = np.zeros((num_perms, len(par_dists), len(host_dists)))
+    interactions[np.arange(num_perms)[:, np.newaxis], par_orders[:, pars],
+                 host_orders[:, hosts]] = 1
+
+    # Each pair of interactions is counted twice by the sums below, and
+    # pairs of an interaction with itself have a distance of zero.
+    host_counts = interactions.sum(axis=1)
+    par_counts = interactions.sum(axis=2)
+    sum_x = (host_counts.dot(host_dists) * host_counts).sum(axis=1) / 2
+    sum_xx = (host_counts.dot(host_dists ** 2) * host_counts).sum(axis=1) / 2
+    sum_y = (par_counts.dot(par_dists) * par_counts).sum(axis=1) / 2
+    sum_yy = (par_counts.dot(par_dists ** 2) * par_counts).sum(axis=1) / 2
+    # the products of the distance matrices with each interaction matrix,
+    # with tensordot rather than matmul (numpy >= 1.10), which puts the
+    # batch axis second
+    products = np.tensordot(par_dists,
+                            np.tensordot(interactions, host_dists, axes=1),
+                            axes=([1], [1]))
+    sum_xy = (products *
+              interactions.transpose(1, 0, 2)).sum(axis=(0, 2)) / 2
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ((sum_xy - sum_x * sum_y / num_pairs) /
+                np.sqrt((sum_xx - sum_x ** 2 / num_pairs) *
+                        (sum_yy - sum_y ** 2 / num_pairs)))
+
+
+def _permuted_corr(host_dists, par_dists, hosts_k_labels, hosts_t_labels,
+                   pars_k_labels, pars_t_labels, host_orders, par_orders):
+    """Compute the correlation coefficient of each permutation of a batch
+
+    ``host_orders`` and ``par_orders`` have a row of permuted indices per
+    permutation.
+
+    """
+    x = host_dists[host_orders[:, hosts_k_labels],
+                   host_orders[:, hosts_t_labels]]
+    y = par_dists[par_orders[:, pars_k_labels], par_orders[:, pars_t_labels]]
+    x -= x.mean(axis=1, keepdims=True)
+    y -= y.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ((x * y).sum(axis=1) /
+                np.sqrt((x * x).sum(axis=1) * (y * y).sum(axis=1)))
+
+
+def _shuffled_corr(corr_function, num_hosts, num_pars, base_seed, index,
+                   size):
+    """Compute the correlation coefficients of a batch of permutations"""
+    random_state = np.random.RandomState([base_seed, index])
+    host_orders = np.argsort(random_state.random_sample((size, num_hosts)),
+                             axis=1)
+    par_orders = np.argsort(random_state.random_sample((size, num_pars)),
+                            axis=1)
+    return corr_function(host_orders, par_orders)
+
+
+_worker_state = {}
+
+
+def _hommola_worker_init(corr_function, num_hosts, num_pars):
+    _worker_state['args'] = (corr_function, num_hosts, num_pars)
+
+
+def _hommola_worker(base_seed, index, size):
+    return _shuffled_corr(*(_worker_state['args'] +
+                            (base_seed, index, size)))
 
 
 def _get_dist(k_labels, t_labels, dists, index):
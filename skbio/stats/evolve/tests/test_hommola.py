@@ -10,10 +10,14 @@ import unittest
 
 import numpy as np
 import numpy.testing as npt
+from scipy.stats import pearsonr
 
+from skbio import DistanceMatrix
 from skbio.stats.distance import mantel
 from skbio.stats.evolve import hommola_cospeciation
-from skbio.stats.evolve._hommola import _get_dist, _gen_lists
+from skbio.stats.evolve._hommola import (_get_dist, _gen_lists,
+                                         _permuted_corr,
+                                         _permuted_corr_products)
 
 
 class HommolaCospeciationTests(unittest.TestCase):
@@ -125,6 +129,71 @@ class HommolaCospeciationTests(unittest.TestCase):
         self.assertAlmostEqual(obs_r, exp_r)
         npt.assert_equal(obs_perm_stats, exp_perm_stats)
 
+    def test_hommola_cospeciation_random_state(self):
+        obs1 = hommola_cospeciation(self.hdist, self.pdist, self.interact,
+                                    99, random_state=3)
+        obs2 = hommola_cospeciation(self.hdist, self.pdist, self.interact,
+                                    99, random_state=3, n_jobs=2)
+        self.assertAlmostEqual(obs1[0], 0.83170965463247915)
+        self.assertEqual(obs1[1], obs2[1])
+        npt.assert_equal(obs1[2], obs2[2])
+        self.assertTrue(obs1[1] <= 0.05)
+
+        # permuted coefficients as large as the observed one are counted
+        obs = hommola_cospeciation(self.hdist, self.pdist, self.interact_1to1,
+                                   99, random_state=3)
+        exp_p = ((obs[2] >= obs[0] - 1e-8).sum() + 1) / 100
+        self.assertAlmostEqual(obs[1], exp_p)
+
+    def test_permuted_corr(self):
+        hdist = DistanceMatrix(self.hdist).data
+        pdist = DistanceMatrix(self.pdist).data
+        pars, hosts = np.nonzero(self.interact)
+        pars_k_labels, pars_t_labels = _gen_lists(pars)
+        hosts_k_labels, hosts_t_labels = _gen_lists(hosts)
+
+        random_state = np.random.RandomState(0)
+        host_orders = np.array([random_state.permutation(5)
+                                for _ in range(4)])
+        par_orders = np.array([random_state.permutation(5)
+                               for _ in range(4)])
+        obs = _permuted_corr(hdist, pdist, hosts_k_labels, hosts_t_labels,
+                             pars_k_labels, pars_t_labels, host_orders,
+                             par_orders)
+        exp = [pearsonr(
+            _get_dist(hosts_k_labels, hosts_t_labels, hdist, mh),
+            _get_dist(pars_k_labels, pars_t_labels, pdist, mp))[0]
+            for mh, mp in zip(host_orders, par_orders)]
+        npt.assert_almost_equal(obs, exp)
+
+        obs = _permuted_corr_products(hdist, pdist, hosts, pars, host_orders,
+                                      par_orders)
+        npt.assert_almost_equal(obs, exp)
+
+    def test_permuted_corr_products_many_to_many(self):
+        random_state = np.random.RandomState(1)
+        hdist = DistanceMatrix.from_iterable(
+            random_state.rand(7, 2),
+            lambda a, b: np.sqrt(((a - b) ** 2).sum())).data
+        pdist = DistanceMatrix.from_iterable(
+            random_state.rand(6, 2),
+            lambda a, b: np.abs(a - b).sum()).data
+        interaction = random_state.rand(6, 7) < 0.4
+        pars, hosts = np.nonzero(interaction)
+        pars_k_labels, pars_t_labels = _gen_lists(pars)
+        hosts_k_labels, hosts_t_labels = _gen_lists(hosts)
+
+        host_orders = np.array([random_state.permutation(7)
+                                for _ in range(5)])
+        par_orders = np.array([random_state.permutation(6)
+                               for _ in range(5)])
+        exp = _permuted_corr(hdist, pdist, hosts_k_labels, hosts_t_labels,
+                             pars_k_labels, pars_t_labels, host_orders,
+                             par_orders)
+        obs = _permuted_corr_products(hdist, pdist, hosts, pars, host_orders,
+                                      par_orders)
+        npt.assert_almost_equal(obs, exp)
+
     def test_get_dist(self):
         labels = np.array([0, 1, 1, 2, 3])
         k_labels, t_labels = _gen_lists(labels)
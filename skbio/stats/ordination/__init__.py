@@ -25,6 +25,7 @@ Functions
    svd_rank
    e_matrix
    f_matrix
+   center_distance_matrix
 
 Classes
 -------
@@ -128,10 +129,11 @@ from ._correspondence_analysis import ca
 from ._canonical_correspondence_analysis import cca
 from ._principal_coordinate_analysis import pcoa
 from ._ordination_results import OrdinationResults
-from ._utils import (mean_and_std, scale, svd_rank, corr, e_matrix, f_matrix)
+from ._utils import (mean_and_std, scale, svd_rank, corr, e_matrix, f_matrix,
+                     center_distance_matrix)
 
 __all__ = ['ca', 'rda', 'cca', 'pcoa', 'OrdinationResults',
            'mean_and_std', 'scale', 'svd_rank', 'corr',
-           'e_matrix', 'f_matrix']
+           'e_matrix', 'f_matrix', 'center_distance_matrix']
 
 test = TestRunner(__file__).test
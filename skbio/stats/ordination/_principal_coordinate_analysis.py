@@ -11,11 +11,12 @@ from warnings import warn
 import pandas as pd
 import numpy as np
 from scipy.linalg import eigh
+from scipy.sparse.linalg import eigsh
 
 from skbio.stats.distance import DistanceMatrix
 from skbio.util._decorator import experimental
 from ._ordination_results import OrdinationResults
-from ._utils import e_matrix, f_matrix
+from ._utils import center_distance_matrix, _centered_distance_operator
 
 # - In cogent, after computing eigenvalues/vectors, the imaginary part
 #   is dropped, if any. We know for a fact that the eigenvalues are
@@ -27,7 +28,8 @@ from ._utils import e_matrix, f_matrix
 
 
 @experimental(as_of="0.4.0")
-def pcoa(distance_matrix):
+def pcoa(distance_matrix, method='eigh', number_of_dimensions=None,
+         inplace=False):
     r"""Perform Principal Coordinate Analysis.
 
     Principal Coordinate Analysis (PCoA) is a method similar to PCA
@@ -47,7 +49,26 @@ def pcoa(distance_matrix):
     Parameters
     ----------
     distance_matrix : DistanceMatrix
-        A distance matrix.
+        A distance matrix. Its data can be memory-mapped (e.g., a
+        ``DistanceMatrix`` created with ``DistanceMatrix.from_condensed`` and
+        a `filename`).
+    method : {'eigh', 'eigsh'}, optional
+        Eigendecomposition method. ``'eigh'`` (the default) computes all
+        eigenvalues and eigenvectors with ``scipy.linalg.eigh``. ``'eigsh'``
+        computes only the `number_of_dimensions` largest eigenvalues and their
+        eigenvectors with the Lanczos method (``scipy.sparse.linalg.eigsh``),
+        which is much faster for large distance matrices.
+    number_of_dimensions : int, optional
+        Number of principal coordinates to return. If ``None`` (the default),
+        all of them are returned. Must be provided, and smaller than the
+        number of objects, if `method` is ``'eigsh'``.
+    inplace : bool, optional
+        If ``True``, the centering is performed in place on `distance_matrix`,
+        which must be a writeable ``numpy.ndarray`` of floats (the data of a
+        ``DistanceMatrix`` are read-only), and is overwritten, so that the
+        centered matrix doesn't need a new array. Ignored if `method` is
+        ``'eigsh'`` and `distance_matrix` is a ``DistanceMatrix`` that stores
+        its distances in condensed form.
 
     Returns
     -------
@@ -56,9 +77,17 @@ def pcoa(distance_matrix):
         proportion explained by each of them, and transformed sample
         coordinates.
 
+    Raises
+    ------
+    ValueError
+        If `method` isn't ``'eigh'`` or ``'eigsh'``, if
+        `number_of_dimensions` isn't valid for `method`, or if `inplace` is
+        ``True`` and `distance_matrix` can't be overwritten.
+
     See Also
     --------
     OrdinationResults
+    center_distance_matrix
 
     Notes
     -----
@@ -76,20 +105,67 @@ def pcoa(distance_matrix):
        However, a warning is raised whenever negative eigenvalues
        appear, allowing the user to decide if they can be safely
        ignored.
-    """
-    distance_matrix = DistanceMatrix(distance_matrix)
 
-    E_matrix = e_matrix(distance_matrix.data)
+    With ``method='eigsh'``, only the largest eigenvalues are computed, so
+    a warning is only raised if some of them are negative, and the
+    proportion explained by each of them is relative to the trace of the
+    centered matrix (i.e., to the sum of all eigenvalues, including the
+    negative ones) rather than to the sum of the positive eigenvalues. The
+    two are equal if the distances are euclidean.
+
+    With ``method='eigsh'`` and ``inplace=False``, the centered matrix is
+    never formed: the eigensolver is given an operator that computes its
+    product with a vector from blocks of squared distances, computed on the
+    fly from the distance matrix (in either redundant or condensed form),
+    so that PCoA doesn't need memory beyond the distance matrix, which is
+    only read. Otherwise, the distances are squared and centered a block of
+    rows at a time, into a single new matrix (or into the distance matrix
+    itself if `inplace` is ``True``), see ``center_distance_matrix``.
+    """
+    if method not in ('eigh', 'eigsh'):
+        raise ValueError("Unknown method: %r. Supported methods are 'eigh' "
+                         "and 'eigsh'." % method)
+
+    # the distances are validated by a DistanceMatrix, which copies a
+    # writeable array, so the caller's array is the one centered in place
+    overwritten = distance_matrix
+    if not isinstance(distance_matrix, DistanceMatrix):
+        distance_matrix = DistanceMatrix(distance_matrix)
+    num_objects = distance_matrix.shape[0]
+    if number_of_dimensions is not None:
+        max_dimensions = num_objects if method == 'eigh' else num_objects - 1
+        if not 1 <= number_of_dimensions <= max_dimensions:
+            raise ValueError(
+                "number_of_dimensions must be between 1 and %d with method "
+                "%r, not %r." % (max_dimensions, method,
+                                 number_of_dimensions))
+    elif method == 'eigsh':
+        raise ValueError("number_of_dimensions must be provided with method "
+                         "'eigsh'.")
 
     # If the used distance was euclidean, pairwise distances
     # needn't be computed from the data table Y because F_matrix =
     # Y.dot(Y.T) (if Y has been centred).
-    F_matrix = f_matrix(E_matrix)
-
-    # If the eigendecomposition ever became a bottleneck, it could
-    # be replaced with an iterative version that computes the
-    # largest k eigenvectors.
-    eigvals, eigvecs = eigh(F_matrix)
+    if method == 'eigh':
+        F_matrix = center_distance_matrix(
+            overwritten if inplace else distance_matrix.data, inplace=inplace)
+        eigvals, eigvecs = eigh(F_matrix)
+        # the sum of the eigenvalues is taken after the negative ones are
+        # set to zero below
+        sum_eigvals = None
+    else:
+        # the trace of the centered matrix is the sum of all its eigenvalues
+        if distance_matrix._data is None:
+            F_matrix, sum_eigvals = _centered_distance_operator(
+                distance_matrix.condensed_form())
+        elif inplace:
+            F_matrix = center_distance_matrix(overwritten, inplace=True)
+            sum_eigvals = np.trace(F_matrix)
+        else:
+            F_matrix, sum_eigvals = _centered_distance_operator(
+                distance_matrix.data)
+        eigvals, eigvecs = eigsh(F_matrix, k=number_of_dimensions,
+                                 which='LA')
 
     # eigvals might not be ordered, so we order them (at least one
     # is zero). cogent makes eigenvalues positive by taking the
@@ -130,8 +206,14 @@ def pcoa(distance_matrix):
     eigvecs[:, num_positive:] = np.zeros(eigvecs[:, num_positive:].shape)
     eigvals[num_positive:] = np.zeros(eigvals[num_positive:].shape)
 
+    if sum_eigvals is None:
+        sum_eigvals = eigvals.sum()
+    if number_of_dimensions is not None:
+        eigvals = eigvals[:number_of_dimensions]
+        eigvecs = eigvecs[:, :number_of_dimensions]
+
     coordinates = eigvecs * np.sqrt(eigvals)
-    proportion_explained = eigvals / eigvals.sum()
+    proportion_explained = eigvals / sum_eigvals
 
     axis_labels = ['PC%d' % i for i in range(1, eigvals.size + 1)]
     return OrdinationResults(
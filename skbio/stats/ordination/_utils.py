@@ -6,7 +6,10 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+from functools import partial
+
 import numpy as np
+from scipy.sparse.linalg import LinearOperator
 
 from skbio.util._decorator import experimental
 
@@ -196,3 +199,171 @@ def f_matrix(E_matrix):
     col_means = E_matrix.mean(axis=0, keepdims=True)
     matrix_mean = E_matrix.mean()
     return E_matrix - row_means - col_means + matrix_mean
+
+
+@experimental(as_of="0.5.1")
+def center_distance_matrix(distance_matrix, inplace=False):
+    """Compute the F matrix of a distance matrix, optionally in place.
+
+    Equivalent to ``f_matrix(e_matrix(distance_matrix))``, but only
+    allocates a single array (or none if `inplace` is ``True``), rather than
+    one for each step. Eqs. 9.20 and 9.21 in Legendre & Legendre 1998.
+
+    Parameters
+    ----------
+    distance_matrix : 2-D array_like
+        Symmetric distance matrix. Can be a ``np.memmap``, which is then read
+        (and written, if `inplace` is ``True``) a block of rows at a time.
+    inplace : bool, optional
+        If ``True``, `distance_matrix` must be a writeable ``numpy.ndarray``
+        of floats, and is overwritten with the F matrix.
+
+    Returns
+    -------
+    np.ndarray
+        The F matrix (`distance_matrix` itself if `inplace` is ``True``).
+
+    Raises
+    ------
+    ValueError
+        If `inplace` is ``True`` and `distance_matrix` isn't a writeable
+        ``numpy.ndarray`` of floats.
+
+    Notes
+    -----
+    The elements are squared and halved, and then centered, a block of rows
+    at a time, so that temporary arrays are limited to a few blocks of rows
+    of the matrix. As the matrix is symmetric, its column means are its row
+    means, which are computed while squaring.
+
+    """
+    if inplace:
+        if not (isinstance(distance_matrix, np.ndarray) and
+                np.issubdtype(distance_matrix.dtype, np.floating) and
+                distance_matrix.flags.writeable):
+            raise ValueError("Centering can only be performed in place on a "
+                             "writeable numpy.ndarray of floats.")
+        centered = distance_matrix
+    else:
+        distance_matrix = np.asarray(distance_matrix)
+        centered = np.empty(distance_matrix.shape, dtype=np.float64)
+
+    n = centered.shape[0]
+    blocks = _row_blocks(n)
+    means = np.empty(n)
+    for start, stop in blocks:
+        block = centered[start:stop]
+        if not inplace:
+            block[...] = distance_matrix[start:stop]
+        block *= block
+        block *= -0.5
+        means[start:stop] = block.mean(axis=1)
+
+    grand_mean = means.mean()
+    for start, stop in blocks:
+        block = centered[start:stop]
+        block -= means[start:stop, np.newaxis]
+        block -= means
+        block += grand_mean
+
+    if isinstance(centered, np.memmap):
+        centered.flush()
+    return centered
+
+
+# Number of elements of the distance matrix processed at once when it is
+# centered or multiplied a block of rows at a time
+_block_elements = 2 ** 22
+
+
+def _row_blocks(n):
+    """Bounds of blocks of rows of an n x n matrix"""
+    rows = max(1, _block_elements // max(n, 1))
+    return [(start, min(start + rows, n)) for start in range(0, n, rows)]
+
+
+def _centered_distance_operator(distances):
+    """Return the F matrix of distances as a matrix-free operator
+
+    Parameters
+    ----------
+    distances : np.ndarray
+        Hollow, symmetric distance matrix in redundant form (2-D) or in
+        condensed form (1-D), e.g., a ``np.memmap``. It is only read, a block
+        at a time, each time the operator is applied.
+
+    Returns
+    -------
+    scipy.sparse.linalg.LinearOperator
+        Operator computing the product of the F matrix with a vector.
+    float
+        Trace of the F matrix.
+
+    Notes
+    -----
+    With E the matrix of halved, negated squared distances, r its row (and
+    column) means and g their mean, the F matrix is
+    ``E - r 1' - 1 r' + g 1 1'``, so its product with ``v`` is computed as
+    ``E v - r sum(v) - (r . v) + g sum(v)``, and its trace is ``-n g``
+    because the diagonal of E is zero.
+
+    """
+    if distances.ndim == 1:
+        n = int(round((1 + np.sqrt(1 + 8 * len(distances))) / 2))
+        e_dot = partial(_condensed_e_dot, distances, n)
+    else:
+        n = distances.shape[0]
+        e_dot = partial(_redundant_e_dot, distances)
+
+    means = e_dot(np.ones(n)) / n
+    grand_mean = means.mean()
+
+    def matvec(v):
+        v = np.ravel(v)
+        total = v.sum()
+        return (e_dot(v) - means * total - means.dot(v) +
+                grand_mean * total)
+
+    operator = LinearOperator((n, n), matvec=matvec, dtype=np.float64)
+    return operator, -n * grand_mean
+
+
+def _redundant_e_dot(distances, v):
+    """Product of the E matrix of a square distance matrix with a vector"""
+    product = np.empty(distances.shape[0])
+    for start, stop in _row_blocks(distances.shape[0]):
+        block = np.square(distances[start:stop], dtype=np.float64)
+        product[start:stop] = block.dot(v)
+    product *= -0.5
+    return product
+
+
+def _condensed_e_dot(distances, n, v):
+    """Product of the E matrix of condensed distances with a vector
+
+    The condensed distances are read sequentially, in chunks of whole rows
+    of the upper triangle. Each distance contributes to the products of the
+    two rows it belongs to.
+
+    """
+    product = np.zeros(n)
+    row = 0
+    position = 0
+    while row < n - 1:
+        # the rows of the upper triangle whose distances fit in a chunk
+        first_row, chunk_start = row, position
+        while row < n - 1 and (row == first_row or position + n - row - 1 -
+                               chunk_start <= _block_elements):
+            position += n - row - 1
+            row += 1
+        chunk = np.square(distances[chunk_start:position], dtype=np.float64)
+
+        offset = 0
+        for i in range(first_row, row):
+            length = n - i - 1
+            squared = chunk[offset:offset + length]
+            product[i] += squared.dot(v[i + 1:])
+            product[i + 1:] += v[i] * squared
+            offset += length
+    product *= -0.5
+    return product
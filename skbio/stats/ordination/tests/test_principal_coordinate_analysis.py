@@ -6,6 +6,9 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import os
+import tempfile
+
 import pandas as pd
 import numpy as np
 import numpy.testing as npt
@@ -121,9 +124,85 @@ class TestPCoA(TestCase):
         assert_ordination_results_equal(results, expected_results,
                                         ignore_directionality=True)
 
+    def test_number_of_dimensions(self):
+        data = np.loadtxt(get_data_path('PCoA_sample_data_2'))
+        exp = pcoa(data)
+        for method in ('eigh', 'eigsh'):
+            for number_of_dimensions in (1, 3, 5):
+                results = pcoa(data, method=method,
+                               number_of_dimensions=number_of_dimensions)
+                axis_labels = ['PC%d' % i
+                               for i in range(1, number_of_dimensions + 1)]
+                self.assertEqual(list(results.samples.columns), axis_labels)
+                npt.assert_almost_equal(
+                    results.eigvals.values,
+                    exp.eigvals.values[:number_of_dimensions])
+                npt.assert_almost_equal(
+                    results.proportion_explained.values,
+                    exp.proportion_explained.values[:number_of_dimensions])
+                npt.assert_almost_equal(
+                    np.abs(results.samples.values),
+                    np.abs(exp.samples.values[:, :number_of_dimensions]))
+
+    def test_eigsh_negative_eigenvalues(self):
+        # only the largest eigenvalues are computed, which are positive
+        results = pcoa(self.dm, method='eigsh', number_of_dimensions=3)
+        exp = npt.assert_warns(RuntimeWarning, pcoa, self.dm)
+        npt.assert_almost_equal(results.eigvals.values,
+                                exp.eigvals.values[:3])
+        npt.assert_almost_equal(np.abs(results.samples.values),
+                                np.abs(exp.samples.values[:, :3]))
+
+    def test_inplace(self):
+        data = np.loadtxt(get_data_path('PCoA_sample_data_2'))
+        exp = pcoa(data)
+        copy = data.copy()
+        results = pcoa(data, inplace=True)
+        assert_ordination_results_equal(results, exp)
+        # the data were overwritten with the centered matrix
+        self.assertFalse(np.allclose(data, copy))
+        npt.assert_almost_equal(data.sum(axis=0), 0)
+
+        # the data of a DistanceMatrix are read-only
+        with self.assertRaises(ValueError):
+            pcoa(DistanceMatrix(copy), inplace=True)
+
+    def test_eigsh_matrix_free(self):
+        data = np.loadtxt(get_data_path('PCoA_sample_data_2'))
+        exp = pcoa(data, number_of_dimensions=4)
+        dm = DistanceMatrix(data)
+        condensed = DistanceMatrix.from_condensed(dm.condensed_form(),
+                                                  dm.ids)
+        with tempfile.TemporaryDirectory() as tmp:
+            mapped = DistanceMatrix.from_condensed(
+                dm.condensed_form(), dm.ids,
+                filename=os.path.join(tmp, 'dm.dat'))
+            for obj in (data, condensed, mapped):
+                results = pcoa(obj, method='eigsh', number_of_dimensions=4)
+                npt.assert_almost_equal(results.eigvals.values,
+                                        exp.eigvals.values)
+                npt.assert_almost_equal(results.proportion_explained.values,
+                                        exp.proportion_explained.values)
+                npt.assert_almost_equal(np.abs(results.samples.values),
+                                        np.abs(exp.samples.values))
+            del mapped, results
+        # the distances were only read
+        npt.assert_array_equal(data, dm.data)
+        self.assertIsNone(condensed._data)
+
     def test_invalid_input(self):
         with npt.assert_raises(DissimilarityMatrixError):
             pcoa([[1, 2], [3, 4]])
+        with self.assertRaises(ValueError):
+            pcoa(self.dm, method='svd')
+        with self.assertRaises(ValueError):
+            pcoa(self.dm, method='eigsh')
+        with self.assertRaises(ValueError):
+            pcoa(self.dm, method='eigsh', number_of_dimensions=14)
+        with self.assertRaises(ValueError):
+            pcoa(self.dm, number_of_dimensions=15)
+        with self.assertRaises(ValueError):
+            pcoa(self.dm, number_of_dimensions=0)
 
 
 if __name__ == "__main__":
@@ -6,12 +6,19 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import os
+import tempfile
+
 import numpy as np
 import numpy.testing as npt
+from scipy.spatial.distance import pdist, squareform
 
-from unittest import TestCase, main
+from unittest import TestCase, main, mock
 
-from skbio.stats.ordination import corr, mean_and_std, e_matrix, f_matrix
+from skbio.stats.ordination import (corr, mean_and_std, e_matrix, f_matrix,
+                                    center_distance_matrix)
+from skbio.stats.ordination import _utils
+from skbio.stats.ordination._utils import _centered_distance_operator
 
 
 class TestUtils(TestCase):
@@ -61,6 +68,71 @@ class TestUtils(TestCase):
         # Note that `test_make_F_matrix` in cogent is wrong
         npt.assert_almost_equal(F, expected_F)
 
+    def test_center_distance_matrix(self):
+        dm = np.array([[0.0, 1.0, 4.0, 2.5],
+                       [1.0, 0.0, 3.0, 2.0],
+                       [4.0, 3.0, 0.0, 1.5],
+                       [2.5, 2.0, 1.5, 0.0]])
+        exp = f_matrix(e_matrix(dm))
+        npt.assert_almost_equal(center_distance_matrix(dm), exp)
+        npt.assert_almost_equal(center_distance_matrix(dm.tolist()), exp)
+
+        copy = dm.copy()
+        obs = center_distance_matrix(copy, inplace=True)
+        self.assertIs(obs, copy)
+        npt.assert_almost_equal(obs, exp)
+
+    def test_center_distance_matrix_inplace_invalid_input(self):
+        with self.assertRaises(ValueError):
+            center_distance_matrix([[0.0, 1.0], [1.0, 0.0]], inplace=True)
+        with self.assertRaises(ValueError):
+            center_distance_matrix(np.array([[0, 1], [1, 0]]), inplace=True)
+        dm = np.array([[0.0, 1.0], [1.0, 0.0]])
+        dm.flags.writeable = False
+        with self.assertRaises(ValueError):
+            center_distance_matrix(dm, inplace=True)
+
+    def test_center_distance_matrix_blocks(self):
+        dm = squareform(pdist(np.random.RandomState(0).rand(23, 3)))
+        exp = f_matrix(e_matrix(dm))
+        # blocks of one, a few and all rows
+        for block_elements in (1, 50, 2 ** 22):
+            with mock.patch.object(_utils, '_block_elements',
+                                   block_elements):
+                npt.assert_almost_equal(center_distance_matrix(dm), exp)
+
+    def test_center_distance_matrix_memmap(self):
+        dm = squareform(pdist(np.random.RandomState(1).rand(17, 3)))
+        exp = f_matrix(e_matrix(dm))
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'dm.dat')
+            mapped = np.memmap(filename, dtype=np.float64, mode='w+',
+                               shape=dm.shape)
+            mapped[:] = dm
+            with mock.patch.object(_utils, '_block_elements', 40):
+                npt.assert_almost_equal(center_distance_matrix(mapped), exp)
+                obs = center_distance_matrix(mapped, inplace=True)
+            self.assertIs(obs, mapped)
+            del obs, mapped
+            npt.assert_almost_equal(
+                np.fromfile(filename).reshape(dm.shape), exp)
+
+    def test_centered_distance_operator(self):
+        condensed = pdist(np.random.RandomState(2).rand(19, 4))
+        exp = f_matrix(e_matrix(squareform(condensed)))
+        vectors = np.random.RandomState(3).rand(3, 19)
+        for block_elements in (1, 30, 2 ** 22):
+            with mock.patch.object(_utils, '_block_elements',
+                                   block_elements):
+                for distances in (condensed, squareform(condensed),
+                                  condensed.astype(np.float32)):
+                    operator, trace = _centered_distance_operator(distances)
+                    self.assertEqual(operator.shape, (19, 19))
+                    self.assertAlmostEqual(trace, np.trace(exp), places=5)
+                    for v in vectors:
+                        npt.assert_almost_equal(operator.matvec(v),
+                                                exp.dot(v), decimal=5)
+
 
 if __name__ == '__main__':
     main()
@@ -12,7 +12,8 @@ import warnings
 import numpy as np
 import numpy.testing as npt
 
-from skbio.stats import subsample_counts, isubsample
+from skbio.stats import subsample_counts, isubsample, rarefy
+from skbio.stats._subsample import _subsample_rows
 
 
 def setup():
@@ -110,6 +111,122 @@ class SubsampleCountsTests(unittest.TestCase):
             subsample_counts([0, 5, 0], 6)
 
 
+class RarefyTests(unittest.TestCase):
+    def setUp(self):
+        self.counts = np.array([[4, 5, 0, 2, 1],
+                                [0, 3, 3, 0, 9],
+                                [0, 0, 0, 12, 0]])
+
+    def test_rarefy_without_replacement(self):
+        obs = rarefy(self.counts, 6, iterations=20, seed=0)
+        self.assertEqual(obs.shape, (20, 3, 5))
+        npt.assert_array_equal(obs.sum(axis=2), np.full((20, 3), 6))
+        # Cannot draw more items than exist, or items that don't exist.
+        self.assertTrue((obs <= self.counts).all())
+        npt.assert_array_equal(obs[:, 2], np.tile([0, 0, 0, 6, 0], (20, 1)))
+
+    def test_rarefy_with_replacement(self):
+        obs = rarefy(self.counts, 12, iterations=5, replace=True, seed=0)
+        self.assertEqual(obs.shape, (5, 3, 5))
+        npt.assert_array_equal(obs.sum(axis=2), np.full((5, 3), 12))
+        self.assertTrue((obs[:, self.counts == 0] == 0).all())
+
+    def test_rarefy_full_depth(self):
+        obs = rarefy([[0, 3, 0, 1], [2, 1, 1, 0]], 4, iterations=2)
+        npt.assert_array_equal(obs, [[[0, 3, 0, 1], [2, 1, 1, 0]]] * 2)
+
+    def test_rarefy_zero_depth(self):
+        obs = rarefy(self.counts, 0, iterations=2)
+        npt.assert_array_equal(obs, np.zeros((2, 3, 5), dtype=int))
+
+    def test_rarefy_deep_sample(self):
+        # The items of a sample are never unpacked, so deep samples are
+        # cheap.
+        counts = np.array([[10 ** 10, 3 * 10 ** 10, 0, 1]])
+        obs = rarefy(counts, 10 ** 6, iterations=3, seed=1)
+        npt.assert_array_equal(obs.sum(axis=2), [[10 ** 6]] * 3)
+        npt.assert_allclose(obs[:, 0, 0] / 10 ** 6, 0.25, atol=0.01)
+
+    def test_rarefy_distribution(self):
+        # Each OTU is drawn following a hypergeometric distribution.
+        counts = np.array([[10, 20, 30, 40]])
+        obs = rarefy(counts, 50, iterations=5000, seed=2)[:, 0]
+        npt.assert_allclose(obs.mean(axis=0), [5, 10, 15, 20], rtol=0.05)
+        exp_var = 50 * (counts[0] / 100) * (1 - counts[0] / 100) * 50 / 99
+        npt.assert_allclose(obs.var(axis=0), exp_var, rtol=0.1)
+
+    def test_subsample_rows_hypergeometric_arguments(self):
+        # Older versions of numpy reject hypergeometric draws from an empty
+        # OTU or once the other OTUs are exhausted, which are resolved
+        # without drawing.
+        class CheckedRandomState(np.random.RandomState):
+            def hypergeometric(self, ngood, nbad, nsample):
+                assert (np.asarray(ngood) > 0).all()
+                assert (np.asarray(nbad) > 0).all()
+                return super().hypergeometric(ngood, nbad, nsample)
+
+        counts = np.array([[0, 4, 0, 2, 6],
+                           [3, 0, 0, 5, 0],
+                           [1, 1, 0, 0, 0],
+                           [0, 0, 0, 0, 9]])
+        obs = _subsample_rows(counts, 2, CheckedRandomState(0))
+        npt.assert_array_equal(obs.sum(axis=1), 2)
+        self.assertTrue((obs <= counts).all())
+        npt.assert_array_equal(obs[2], [1, 1, 0, 0, 0])
+        npt.assert_array_equal(obs[3], [0, 0, 0, 0, 2])
+
+    def test_rarefy_seed(self):
+        obs1 = rarefy(self.counts, 6, iterations=4, seed=42)
+        obs2 = rarefy(self.counts, 6, iterations=4, seed=42)
+        npt.assert_array_equal(obs1, obs2)
+
+        np.random.seed(0)
+        obs1 = rarefy(self.counts, 6, iterations=4)
+        np.random.seed(0)
+        obs2 = rarefy(self.counts, 6, iterations=4)
+        npt.assert_array_equal(obs1, obs2)
+
+    def test_rarefy_per_sample_seeds(self):
+        # The draws of a sample depend only on its own seed.
+        obs = rarefy(self.counts, 6, iterations=4, seed=[7, 8, 9])
+        sub = rarefy(self.counts[[1]], 6, iterations=4, seed=[8])
+        npt.assert_array_equal(obs[:, [1]], sub)
+
+    def test_rarefy_n_jobs(self):
+        exp = rarefy(self.counts, 6, iterations=4, seed=42)
+        obs = rarefy(self.counts, 6, iterations=4, seed=42, n_jobs=2)
+        npt.assert_array_equal(obs, exp)
+
+    def test_rarefy_invalid_input(self):
+        # Negative depth.
+        with self.assertRaises(ValueError):
+            rarefy(self.counts, -1)
+
+        # Floats.
+        with self.assertRaises(TypeError):
+            rarefy([[1, 2.3, 3]], 2)
+
+        # Wrong number of dimensions.
+        with self.assertRaises(ValueError):
+            rarefy([1, 2, 3], 2)
+
+        # Negative counts.
+        with self.assertRaises(ValueError):
+            rarefy([[1, -2, 3]], 1)
+
+        # A sample has too few counts.
+        with self.assertRaisesRegex(ValueError, '2 sample'):
+            rarefy(self.counts, 13)
+
+        # No iterations.
+        with self.assertRaises(ValueError):
+            rarefy(self.counts, 2, iterations=0)
+
+        # Wrong number of seeds.
+        with self.assertRaises(ValueError):
+            rarefy(self.counts, 2, seed=[1, 2])
+
+
 class ISubsampleTests(unittest.TestCase):
     def setUp(self):
         np.random.seed(123)
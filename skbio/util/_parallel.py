@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import ctypes
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+
+
+def _resolve_n_jobs(n_jobs):
+    """Resolve the number of workers to use
+
+    Parameters
+    ----------
+    n_jobs : int or None
+        The requested number of workers. ``None`` and ``1`` request serial
+        execution. Negative values are interpreted relative to the number of
+        CPUs, so ``-1`` uses all of them, ``-2`` all but one, and so on.
+
+    Returns
+    -------
+    int
+        The number of workers, always at least one.
+
+    Raises
+    ------
+    ValueError
+        If ``n_jobs`` is zero or is not an integer.
+
+    """
+    if n_jobs is None:
+        return 1
+
+    if isinstance(n_jobs, bool) or not isinstance(n_jobs, (int, np.integer)):
+        raise ValueError("`n_jobs` must be an integer, not %r." % n_jobs)
+    if n_jobs == 0:
+        raise ValueError("`n_jobs` cannot be zero.")
+
+    if n_jobs < 0:
+        return max(1, multiprocessing.cpu_count() + 1 + n_jobs)
+    return int(n_jobs)
+
+
+def _to_shared_array(array):
+    """Copy an array into memory that can be shared with worker processes
+
+    Parameters
+    ----------
+    array : np.ndarray
+        A numeric array.
+
+    Returns
+    -------
+    tuple
+        A picklable description of the array that can be passed to a
+        ``multiprocessing`` worker (e.g., through a pool initializer) and
+        turned back into an array with ``_from_shared_array`` without copying
+        the data.
+
+    """
+    array = np.asarray(array)
+    # RawArray cannot be empty, so always allocate at least a single byte
+    buffer = RawArray(ctypes.c_char, max(array.nbytes, 1))
+    shared = np.frombuffer(buffer, dtype=np.uint8, count=array.nbytes)
+    shared[:] = np.ascontiguousarray(array).view(np.uint8).ravel()
+    return buffer, array.dtype.str, array.shape
+
+
+def _from_shared_array(shared):
+    """Wrap memory created by ``_to_shared_array`` in an array
+
+    Parameters
+    ----------
+    shared : tuple
+        The result of ``_to_shared_array``.
+
+    Returns
+    -------
+    np.ndarray
+        An array backed by the shared memory.
+
+    """
+    buffer, dtype, shape = shared
+    dtype = np.dtype(dtype)
+    count = int(np.prod(shape, dtype=np.int64))
+    return np.frombuffer(buffer, dtype=dtype, count=count).reshape(shape)
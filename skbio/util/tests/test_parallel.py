@@ -0,0 +1,63 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2013--, scikit-bio development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import multiprocessing
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from skbio.util._parallel import (_resolve_n_jobs, _to_shared_array,
+                                  _from_shared_array)
+
+
+class TestResolveNJobs(unittest.TestCase):
+    def test_serial(self):
+        self.assertEqual(_resolve_n_jobs(None), 1)
+        self.assertEqual(_resolve_n_jobs(1), 1)
+
+    def test_positive(self):
+        self.assertEqual(_resolve_n_jobs(3), 3)
+        self.assertEqual(_resolve_n_jobs(np.int64(2)), 2)
+
+    def test_negative(self):
+        n_cpus = multiprocessing.cpu_count()
+        self.assertEqual(_resolve_n_jobs(-1), n_cpus)
+        self.assertEqual(_resolve_n_jobs(-2), max(1, n_cpus - 1))
+        self.assertEqual(_resolve_n_jobs(-n_cpus - 10), 1)
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(ValueError, 'zero'):
+            _resolve_n_jobs(0)
+        with self.assertRaisesRegex(ValueError, 'integer'):
+            _resolve_n_jobs(1.5)
+        with self.assertRaisesRegex(ValueError, 'integer'):
+            _resolve_n_jobs(True)
+
+
+class TestSharedArray(unittest.TestCase):
+    def test_roundtrip(self):
+        for array in (np.arange(12).reshape(3, 4),
+                      np.array([0.5, 1.5, -2.0], dtype=np.float32),
+                      np.arange(12).reshape(3, 4)[:, ::2],
+                      np.zeros((0, 5))):
+            obs = _from_shared_array(_to_shared_array(array))
+            npt.assert_equal(obs, array)
+            self.assertEqual(obs.dtype, array.dtype)
+            self.assertEqual(obs.shape, array.shape)
+
+    def test_shares_memory(self):
+        shared = _to_shared_array(np.arange(4))
+        a = _from_shared_array(shared)
+        b = _from_shared_array(shared)
+        a[0] = 42
+        self.assertEqual(b[0], 42)
+
+
+if __name__ == '__main__':
+    unittest.main()